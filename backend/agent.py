@@ -4,37 +4,81 @@
 """
 import json
 import os
-from typing import Dict, List, Any
-from openai import OpenAI
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, List, Any, Callable, Iterator, Tuple
 
-# 导入记忆和知识库模块
+# 导入存储、记忆和知识库模块
+from storage import get_storage
+from task_queue import get_task_queue, LeaseLost
+from llm_client import get_openai_client
+from intent_rules import intent_classifier
+from llm_cache import llm_cache, cached_completion
 from memory import conversation_manager, memory_system
 from knowledge_base import knowledge_base
 
 
 def load_config():
     """加载用户配置"""
-    config_path = os.path.join(os.path.dirname(__file__), 'user_config.json')
-    if os.path.exists(config_path):
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+    return get_storage().load_config()
+
+
+def get_llm():
+    """按当前配置取共享的 DeepSeek 客户端（连接池全进程复用）"""
+    config = load_config()
+    return get_openai_client(config.get('deepseekApiKey', os.getenv('DEEPSEEK_API_KEY', '')),
+                             config.get('deepseekBaseUrl', 'https://api.deepseek.com'))
+
+
+INTENT_TYPES = "apply_job/search_job/optimize_resume/interview_prep/general_chat/knowledge_query/preference_update"
+
+
+def reply_cache_opt_in():
+    """回复类调用温度较高，默认不缓存；配置 cacheChatReplies 为真时开启"""
+    return True if load_config().get('cacheChatReplies') else None
+
+
+def is_json_reply(text: str) -> bool:
+    try:
+        parse_json_reply(text)
+        return True
+    except ValueError:
+        return False
+
+
+def parse_json_reply(text: str) -> Dict:
+    """解析模型返回的 JSON（兼容 ```json 代码块包裹）"""
+    text = text.strip()
+    if '```json' in text:
+        text = text.split('```json')[1].split('```')[0]
+    elif '```' in text:
+        text = text.split('```')[1].split('```')[0]
+    return json.loads(text)
 
 
 class SemanticUnderstanding:
     """语义理解层 - 使用 DeepSeek 进行深度语义分析"""
     
-    def __init__(self):
-        config = load_config()
-        self.api_key = config.get('deepseekApiKey', os.getenv('DEEPSEEK_API_KEY', ''))
-        self.base_url = config.get('deepseekBaseUrl', 'https://api.deepseek.com')
-    
     def _get_llm(self):
-        return OpenAI(api_key=self.api_key, base_url=self.base_url)
+        return get_llm()
     
-    def understand(self, user_input: str, conversation_history: List[Dict] = None, user_profile: str = "") -> Dict:
-        """深度理解用户输入"""
+    def understand(self, user_input: str, conversation_history: List[Dict] = None, user_profile: str = "",
+                   use_rules: bool = True) -> Dict:
+        """深度理解用户输入：先走规则分类，置信度不足时调用 LLM"""
         config = load_config()
+        if use_rules:
+            result = intent_classifier.classify(user_input, config)
+            if result:
+                return result
+        
+        start = time.perf_counter()
+        try:
+            return self._understand_llm(user_input, conversation_history, user_profile, config)
+        finally:
+            intent_classifier.record_llm((time.perf_counter() - start) * 1000)
+    
+    def _understand_llm(self, user_input: str, conversation_history: List[Dict], user_profile: str,
+                        config: Dict) -> Dict:
         llm = self._get_llm()
         
         system_prompt = f"""你是一个语义理解专家。分析用户输入并提取结构化信息。
@@ -49,7 +93,7 @@ class SemanticUnderstanding:
 
 请分析用户输入，返回JSON格式：
 {{
-    "intent": "意图类型: apply_job/search_job/optimize_resume/interview_prep/general_chat/knowledge_query/preference_update",
+    "intent": "意图类型: {INTENT_TYPES}",
     "entities": {{
         "keyword": "职位关键词（如有）",
         "city": "城市（如有，否则用默认）",
@@ -70,15 +114,8 @@ class SemanticUnderstanding:
         messages.append({"role": "user", "content": user_input})
         
         try:
-            response = llm.chat.completions.create(model="deepseek-chat", messages=messages, temperature=0)
-            result_text = response.choices[0].message.content.strip()
-            
-            if '```json' in result_text:
-                result_text = result_text.split('```json')[1].split('```')[0]
-            elif '```' in result_text:
-                result_text = result_text.split('```')[1].split('```')[0]
-            
-            return json.loads(result_text)
+            content = cached_completion(llm, "deepseek-chat", messages, temperature=0, validate=is_json_reply)
+            return parse_json_reply(content)
         except Exception as e:
             print(f"语义理解出错: {e}")
             return {"intent": "general_chat", "entities": {}, "sentiment": "neutral", "confidence": 0.5}
@@ -88,27 +125,29 @@ class TaskExecutor:
     """任务执行层"""
     
     def __init__(self):
-        self.tasks_file = os.path.join(os.path.dirname(__file__), 'user_tasks.json')
+        self.storage = get_storage()
     
     def execute_apply_task(self, keyword: str, city: str, count: int = 5) -> Dict:
-        """创建投递任务"""
+        """创建投递任务（对话中的投递意图只在这里入队一次，API 层直接复用返回的任务）"""
         import uuid
         from datetime import datetime
         
+        # 字段与 app.create_task 一致，Worker 根据标题和描述解析投递参数
         task = {
-            "id": str(uuid.uuid4()),
+            "id": str(uuid.uuid4())[:8],
             "type": "apply",
+            "status": "pending",
+            "title": f"投递-{keyword}",
+            "description": f"城市：{city}，数量：{count}",
+            "created_at": datetime.now().strftime('%Y-%m-%d %H:%M'),
+            "progress": 0,
+            "log": "等待执行...",
             "keyword": keyword,
             "city": city,
-            "count": count,
-            "status": "pending",
-            "created_at": datetime.now().isoformat(),
-            "progress": 0
+            "count": count
         }
         
-        tasks = self._load_tasks()
-        tasks.append(task)
-        self._save_tasks(tasks)
+        get_task_queue().submit(task)
         
         return {"success": True, "task_id": task["id"], "message": f"已创建投递任务：在{city}投递{count}个{keyword}岗位", "task": task}
     
@@ -121,69 +160,125 @@ class TaskExecutor:
         """更新用户偏好"""
         memory_system.update_preference(key, value)
         return {"success": True, "message": f"已记住你的偏好：{key} = {value}"}
-    
-    def _load_tasks(self) -> List[Dict]:
-        if os.path.exists(self.tasks_file):
-            with open(self.tasks_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return []
-    
-    def _save_tasks(self, tasks: List[Dict]):
-        with open(self.tasks_file, 'w', encoding='utf-8') as f:
-            json.dump(tasks, f, ensure_ascii=False, indent=2)
+
+
+# 与 LLM 调用并行执行的 I/O 任务（历史、画像、知识库检索）
+_pipeline_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='agent-pipeline')
+
+
+def _timed(timings: Dict[str, float], stage: str, fn: Callable, *args):
+    """执行 fn 并把耗时（毫秒）记入 timings[stage]"""
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        timings[stage] = round((time.perf_counter() - start) * 1000, 1)
 
 
 class DualAgent:
-    """双重架构 Agent - 结合语义理解和任务执行"""
+    """双重架构 Agent - 结合语义理解和任务执行
+    
+    流水线模式：知识库检索只依赖用户输入，与历史、画像读取一起提交到线程池，
+    和第一次 LLM 调用（语义理解）重叠执行，端到端延迟基本只剩两次 LLM 往返。
+    """
     
     def __init__(self):
         self.semantic = SemanticUnderstanding()
         self.executor = TaskExecutor()
     
     def _get_llm(self):
-        config = load_config()
-        return OpenAI(
-            api_key=config.get('deepseekApiKey', os.getenv('DEEPSEEK_API_KEY', '')),
-            base_url=config.get('deepseekBaseUrl', 'https://api.deepseek.com')
-        )
+        return get_llm()
     
     def run(self, user_input: str, conversation_id: str = None) -> str:
         """运行双重架构处理"""
         result = self.run_with_details(user_input, conversation_id)
         return result.get("response", "抱歉，我无法处理这个请求。")
     
-    def run_with_details(self, user_input: str, conversation_id: str = None) -> Dict:
-        """运行并返回详细结果"""
+    def _submit(self, pipelined: bool, timings: Dict[str, float], stage: str, fn: Callable, *args) -> Future:
+        """流水线模式提交到线程池，串行模式就地执行"""
+        if pipelined:
+            return _pipeline_pool.submit(_timed, timings, stage, fn, *args)
+        future = Future()
+        future.set_result(_timed(timings, stage, fn, *args))
+        return future
+    
+    @staticmethod
+    def _kb_context(user_input: str) -> str:
+        """知识库检索；出错时返回空上下文，回复照常生成"""
         try:
-            # 获取对话历史
-            history = []
-            if conversation_id:
-                history = conversation_manager.get_messages(conversation_id)
+            return knowledge_base.get_context_for_ai(user_input)
+        except Exception as e:
+            print(f"知识库检索失败: {e}")
+            return ""
+    
+    def _gather_context(self, user_input: str, conversation_id: str, pipelined: bool,
+                        timings: Dict[str, float]) -> Tuple[Future, List[Dict], str]:
+        """提交知识库检索，读取对话历史和用户画像；返回 (知识库 Future, 历史, 画像)"""
+        # 知识库检索与意图无关，最先提交，与语义理解并行
+        kb_future = self._submit(pipelined, timings, "knowledge", self._kb_context, user_input)
+        
+        # 获取对话历史和用户画像
+        history_future = self._submit(pipelined, timings, "history", conversation_manager.get_messages,
+                                      conversation_id) if conversation_id else None
+        profile_future = self._submit(pipelined, timings, "profile", memory_system.get_user_profile_summary)
+        history = history_future.result() if history_future else []
+        return kb_future, history, profile_future.result()
+    
+    def _execute_intent(self, understanding: Dict) -> Dict:
+        """根据意图执行任务，返回创建的任务（没有则为 None）"""
+        intent = understanding.get("intent", "general_chat")
+        entities = understanding.get("entities", {})
+        
+        # 处理投递任务
+        if intent == "apply_job":
+            config = load_config()
+            keyword = entities.get("keyword") or config.get("targetRole", "产品经理")
+            city = entities.get("city") or config.get("targetCity", "北京")
+            count = int(entities.get("count", 5))
             
-            # 获取用户画像
-            user_profile = memory_system.get_user_profile_summary()
+            task_result = self.executor.execute_apply_task(keyword, city, count)
+            return task_result.get("task")
+        return None
+    
+    def run_with_details(self, user_input: str, conversation_id: str = None, pipelined: bool = True,
+                         single_call: bool = None) -> Dict:
+        """运行并返回详细结果（含各阶段耗时 timings，单位毫秒）
+        
+        single_call：一次 LLM 调用同时完成语义理解和回复（默认取配置 singleCallChat），
+        结果解析失败时退回两次调用。
+        """
+        if single_call is None:
+            single_call = bool(load_config().get('singleCallChat', False))
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        try:
+            kb_future, history, user_profile = self._gather_context(user_input, conversation_id, pipelined, timings)
+            
+            # 第一层：规则分类，命中时跳过语义理解的 LLM 调用
+            understanding = _timed(timings, "rules", intent_classifier.classify, user_input, load_config())
+            
+            # 快速路径：理解与回复合并为一次调用（需要知识库上下文，先等检索完成）
+            response = None
+            if understanding is None and single_call:
+                combined = _timed(timings, "combined", self._understand_and_respond,
+                                  user_input, history, user_profile, kb_future.result())
+                if combined:
+                    response = combined.pop("reply")
+                    understanding = combined
             
-            # 第一层：语义理解
-            understanding = self.semantic.understand(user_input, history, user_profile)
+            # 语义理解（LLM）
+            if understanding is None:
+                understanding = _timed(timings, "understand", self.semantic.understand,
+                                       user_input, history, user_profile, False)
             print(f"语义理解结果: {understanding}")
             
             # 第二层：根据意图执行任务
-            task_created = None
-            intent = understanding.get("intent", "general_chat")
-            entities = understanding.get("entities", {})
+            task_created = self._execute_intent(understanding)
             
-            # 处理投递任务
-            if intent == "apply_job":
-                config = load_config()
-                keyword = entities.get("keyword") or config.get("targetRole", "产品经理")
-                city = entities.get("city") or config.get("targetCity", "北京")
-                count = int(entities.get("count", 5))
-                
-                task_result = self.executor.execute_apply_task(keyword, city, count)
-                task_created = task_result.get("task")
-            
-            # 生成回复
-            response = self._generate_response(user_input, understanding, history, task_created)
+            # 生成回复（知识库检索通常已在语义理解期间完成）
+            if response is None:
+                response = _timed(timings, "response", self._generate_response,
+                                  user_input, understanding, history, task_created, kb_future.result())
             
             # 生成智能推荐（问题和动作）
             suggestions = self._generate_suggestions(user_input, understanding, task_created)
@@ -193,11 +288,13 @@ class DualAgent:
                 conversation_manager.add_message(conversation_id, "user", user_input)
                 conversation_manager.add_message(conversation_id, "assistant", response)
             
+            timings["total"] = round((time.perf_counter() - started) * 1000, 1)
             return {
                 "response": response,
                 "understanding": understanding,
                 "task_created": task_created,
-                "suggestions": suggestions
+                "suggestions": suggestions,
+                "timings": timings
             }
             
         except Exception as e:
@@ -207,27 +304,131 @@ class DualAgent:
             return {
                 "response": f"抱歉，处理请求时出错了：{str(e)}",
                 "understanding": {},
-                "task_created": None
+                "task_created": None,
+                "timings": timings
             }
     
-    def _generate_response(self, user_input: str, understanding: Dict, history: List[Dict], task_created: Dict = None) -> str:
-        """生成自然语言回复"""
+    def stream_with_details(self, user_input: str, conversation_id: str = None) -> Iterator[Tuple[str, Any]]:
+        """流式处理，依次产出 (事件, 数据)：
+        understanding → task（如有）→ token（逐段回复）→ suggestions → done；出错时产出 error。
+        回复完整生成后才写入会话，只写一次。
+        """
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
         try:
-            llm = self._get_llm()
-            config = load_config()
+            kb_future, history, user_profile = self._gather_context(user_input, conversation_id, True, timings)
             
-            # 构建上下文
-            context_parts = []
+            understanding = _timed(timings, "understand", self.semantic.understand, user_input, history, user_profile)
+            yield "understanding", understanding
             
+            task_created = self._execute_intent(understanding)
             if task_created:
-                context_parts.append(f"[已创建任务] 类型: {task_created.get('type')}, 关键词: {task_created.get('keyword')}, 城市: {task_created.get('city')}, 数量: {task_created.get('count')}")
+                yield "task", task_created
             
-            # 获取知识库上下文
-            kb_context = knowledge_base.get_context_for_ai(user_input)
-            if kb_context:
-                context_parts.append(f"[知识库] {kb_context[:500]}")
+            kb_context = kb_future.result()
+            parts = []
+            response_started = time.perf_counter()
+            for text in self._stream_response(user_input, understanding, history, task_created, kb_context):
+                if not parts:
+                    timings["first_token"] = round((time.perf_counter() - started) * 1000, 1)
+                parts.append(text)
+                yield "token", text
+            timings["response"] = round((time.perf_counter() - response_started) * 1000, 1)
+            response = "".join(parts).strip()
+            
+            yield "suggestions", self._generate_suggestions(user_input, understanding, task_created)
+            
+            if conversation_id:
+                conversation_manager.add_message(conversation_id, "user", user_input)
+                conversation_manager.add_message(conversation_id, "assistant", response)
             
-            system_prompt = f"""你是智职通AI助手，一个专业友好的求职顾问。
+            timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+            yield "done", {"response": response, "timings": timings}
+            
+        except Exception as e:
+            print(f"Agent 流式执行出错: {e}")
+            import traceback
+            traceback.print_exc()
+            yield "error", {"message": f"抱歉，处理请求时出错了：{str(e)}", "timings": timings}
+    
+    def _understand_and_respond(self, user_input: str, history: List[Dict], user_profile: str,
+                                kb_context: str) -> Dict:
+        """一次调用返回意图、实体和回复（JSON 输出模式），解析失败返回 None"""
+        config = load_config()
+        system_prompt = f"""你是智职通AI助手，一个专业友好的求职顾问。先分析用户输入的意图，再直接回复用户。
+
+用户画像：{user_profile}
+
+用户信息：
+- 姓名：{config.get('name', '用户')}
+- 目标城市：{config.get('targetCity', '北京')}
+- 目标岗位：{config.get('targetRole', '')}
+- 期望薪资：{config.get('salary', '')}
+
+{f"[知识库] {kb_context}" if kb_context else ''}
+
+返回JSON格式：
+{{
+    "intent": "意图类型: {INTENT_TYPES}",
+    "entities": {{
+        "keyword": "职位关键词（如有）",
+        "city": "城市（如有，否则用默认）",
+        "count": "数量（默认5）"
+    }},
+    "sentiment": "情感: positive/negative/neutral",
+    "confidence": 0.9,
+    "reply": "给用户的回复：友好专业、简洁明了、使用中文；意图为 apply_job 时确认投递任务已创建、正在后台执行，可在「任务」页面查看进度"
+}}
+
+只返回JSON，不要其他内容。"""
+
+        messages = [{"role": "system", "content": system_prompt}]
+        for msg in history[-6:]:
+            messages.append({"role": msg.get("role", "user"), "content": msg.get("content", "")})
+        messages.append({"role": "user", "content": user_input})
+        
+        try:
+            content = cached_completion(
+                self._get_llm(),
+                "deepseek-chat",
+                messages,
+                temperature=0.7,
+                cache=reply_cache_opt_in(),
+                validate=is_json_reply,
+                max_tokens=700,
+                response_format={"type": "json_object"}
+            )
+            result = parse_json_reply(content)
+        except Exception as e:
+            print(f"合并调用出错，退回两次调用: {e}")
+            return None
+        
+        reply = result.get("reply") if isinstance(result, dict) else None
+        if not isinstance(reply, str) or not reply.strip() or not result.get("intent"):
+            print("合并调用结果不完整，退回两次调用")
+            return None
+        result["reply"] = reply.strip()
+        result.setdefault("entities", {})
+        return result
+    
+    def _response_messages(self, user_input: str, understanding: Dict, history: List[Dict],
+                           task_created: Dict = None, kb_context: str = None) -> List[Dict]:
+        """构建生成回复的消息列表"""
+        config = load_config()
+        
+        # 构建上下文
+        context_parts = []
+        
+        if task_created:
+            context_parts.append(f"[已创建任务] 类型: {task_created.get('type')}, 关键词: {task_created.get('keyword')}, 城市: {task_created.get('city')}, 数量: {task_created.get('count')}")
+        
+        # 获取知识库上下文（流水线模式下已预先检索）
+        if kb_context is None:
+            kb_context = knowledge_base.get_context_for_ai(user_input)
+        if kb_context:
+            context_parts.append(f"[知识库] {kb_context}")
+        
+        system_prompt = f"""你是智职通AI助手，一个专业友好的求职顾问。
 
 用户信息：
 - 姓名：{config.get('name', '用户')}
@@ -240,31 +441,83 @@ class DualAgent:
 
 请根据以上信息，用友好专业的语气回复用户。如果已创建任务，请确认并说明后续步骤。回复请简洁明了，使用中文。"""
 
-            messages = [{"role": "system", "content": system_prompt}]
-            
-            # 添加对话历史
-            for msg in history[-4:]:
-                messages.append({"role": msg.get("role", "user"), "content": msg.get("content", "")})
-            
-            messages.append({"role": "user", "content": user_input})
-            
-            response = llm.chat.completions.create(
-                model="deepseek-chat",
-                messages=messages,
+        messages = [{"role": "system", "content": system_prompt}]
+        
+        # 添加对话历史
+        for msg in history[-4:]:
+            messages.append({"role": msg.get("role", "user"), "content": msg.get("content", "")})
+        
+        messages.append({"role": "user", "content": user_input})
+        return messages
+    
+    @staticmethod
+    def _fallback_response(task_created: Dict = None) -> str:
+        """LLM 不可用时的降级回复"""
+        if task_created:
+            return f"好的，我已经为你创建了投递任务！将在{task_created.get('city')}投递{task_created.get('count')}个{task_created.get('keyword')}岗位。任务正在后台执行中，你可以在「任务」页面查看进度。"
+        
+        return "收到你的消息了！有什么我可以帮你的吗？"
+    
+    def _generate_response(self, user_input: str, understanding: Dict, history: List[Dict], task_created: Dict = None,
+                           kb_context: str = None) -> str:
+        """生成自然语言回复"""
+        try:
+            messages = self._response_messages(user_input, understanding, history, task_created, kb_context)
+            content = cached_completion(
+                self._get_llm(),
+                "deepseek-chat",
+                messages,
                 temperature=0.7,
+                cache=reply_cache_opt_in(),
                 max_tokens=500
             )
             
-            return response.choices[0].message.content.strip()
+            return content.strip()
             
         except Exception as e:
             print(f"生成回复出错: {e}")
+            return self._fallback_response(task_created)
+    
+    def _stream_response(self, user_input: str, understanding: Dict, history: List[Dict], task_created: Dict = None,
+                         kb_context: str = None) -> Iterator[str]:
+        """流式生成回复，逐段产出文本；尚未产出内容就出错时产出降级回复"""
+        produced = False
+        try:
+            messages = self._response_messages(user_input, understanding, history, task_created, kb_context)
+            llm = self._get_llm()
             
-            # 降级回复
-            if task_created:
-                return f"好的，我已经为你创建了投递任务！将在{task_created.get('city')}投递{task_created.get('count')}个{task_created.get('keyword')}岗位。任务正在后台执行中，你可以在「任务」页面查看进度。"
+            # 命中缓存时一次性产出完整回复；未命中则边流式输出边收集，结束后写入缓存
+            key = None
+            if llm_cache.should_cache(0.7, reply_cache_opt_in()):
+                key = llm_cache.make_key("deepseek-chat", messages, 0.7, endpoint=str(llm.base_url), max_tokens=500)
+                cached = llm_cache.get(key)
+                if cached is not None:
+                    produced = True
+                    yield cached
+                    return
             
-            return "收到你的消息了！有什么我可以帮你的吗？"
+            stream = llm.chat.completions.create(
+                model="deepseek-chat",
+                messages=messages,
+                temperature=0.7,
+                max_tokens=500,
+                stream=True
+            )
+            parts = []
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content
+                if text:
+                    produced = True
+                    parts.append(text)
+                    yield text
+            if key is not None:
+                llm_cache.put(key, "".join(parts))
+        except Exception as e:
+            print(f"流式生成回复出错: {e}")
+            if not produced:
+                yield self._fallback_response(task_created)
     
     def _generate_suggestions(self, user_input: str, understanding: Dict, task_created: Dict = None) -> Dict:
         """根据用户意图生成智能推荐"""
@@ -373,6 +626,11 @@ def run_agent_with_details(user_input: str, conversation_id: str = None) -> Dict
     return dual_agent.run_with_details(user_input, conversation_id)
 
 
+def stream_agent_with_details(user_input: str, conversation_id: str = None):
+    """流式运行 Agent，产出 (事件, 数据)"""
+    return dual_agent.stream_with_details(user_input, conversation_id)
+
+
 def parse_user_intent(user_input: str) -> Dict:
     """解析用户意图（供 Worker 使用）"""
     config = load_config()
@@ -384,49 +642,26 @@ def parse_user_intent(user_input: str) -> Dict:
         "count": 5
     }
     
-    # 尝试从输入中提取信息
-    import re
-    
-    # 提取城市
-    cities = ["北京", "上海", "广州", "深圳", "杭州", "成都", "武汉", "南京", "西安", "苏州"]
-    for city in cities:
-        if city in user_input:
-            result["city"] = city
-            break
-    
-    # 提取数量
-    count_match = re.search(r'(\d+)\s*(个|份)', user_input)
-    if count_match:
-        result["count"] = int(count_match.group(1))
-    
-    # 提取关键词（简单逻辑）
-    keywords = ["产品经理", "前端", "后端", "全栈", "运营", "设计", "测试", "数据分析", "算法", "Java", "Python"]
-    for kw in keywords:
-        if kw.lower() in user_input.lower():
-            result["keyword"] = kw
-            break
+    # 从输入中提取城市、岗位、数量（与规则意图分类共用词典）
+    result.update(intent_classifier.extract_entities(user_input, config))
     
     return result
 
 
-def execute_apply_task(keyword: str, city: str, count: int) -> int:
-    """执行投递任务（供 Worker 使用）"""
+def execute_apply_task(keyword: str, city: str, count: int, progress_callback=None, pool=None,
+                       profile: str = None, should_stop=None) -> int:
+    """执行投递任务（供 Worker 使用）；pool 为 Worker 持有的浏览器池，profile 为浏览器配置（headed / headless），
+    should_stop 返回 True 时停止投递（任务租约丢失）"""
     try:
-        from boss_automation import BossAutomation
-        
-        config = load_config()
-        
-        bot = BossAutomation(
-            keywords=keyword,
-            city=city,
-            phone=config.get('phone', ''),
-            max_apply=count
-        )
+        from boss_automation import run_task
         
         # 执行投递
-        applied_count = bot.run()
+        applied_count = run_task(keyword, city, int(count or 5), progress_callback, pool=pool, profile=profile,
+                                 should_stop=should_stop)
         return applied_count
         
+    except LeaseLost:
+        raise
     except Exception as e:
         print(f"执行投递失败: {e}")
         import traceback
@@ -5,10 +5,11 @@ AI服务模块
 
 import os
 from typing import Optional, Dict, List
-import openai
-import anthropic
 import requests
 
+from llm_client import get_openai_client, get_anthropic_client
+from llm_cache import llm_cache
+
 
 class AIService:
     """AI服务统一接口"""
@@ -34,19 +35,13 @@ class AIService:
         if not self.api_key:
             raise ValueError(f'未设置 {provider} API Key')
         
-        # 初始化客户端（使用新版 OpenAI SDK）
+        # 客户端取自进程级连接池，同一 (端点, 密钥) 复用 keep-alive 连接
         if self.provider == 'openai':
-            self.client = openai.OpenAI(
-                api_key=self.api_key,
-                base_url=api_endpoint
-            )
+            self.client = get_openai_client(self.api_key, api_endpoint)
         elif self.provider == 'anthropic':
-            self.client = anthropic.Anthropic(api_key=self.api_key)
+            self.client = get_anthropic_client(self.api_key, api_endpoint)
         elif self.provider == 'deepseek':
-            self.client = openai.OpenAI(
-                api_key=self.api_key,
-                base_url=api_endpoint or 'https://api.deepseek.com'
-            )
+            self.client = get_openai_client(self.api_key, api_endpoint or 'https://api.deepseek.com')
     
     def _get_default_model(self) -> str:
         """获取默认模型"""
@@ -60,7 +55,8 @@ class AIService:
     
     def chat(self, messages: List[Dict[str, str]], 
              temperature: float = 0.7,
-             max_tokens: int = 2000) -> str:
+             max_tokens: int = 2000,
+             cache: Optional[bool] = None) -> str:
         """
         发送对话请求
         
@@ -68,17 +64,30 @@ class AIService:
             messages: 对话历史，格式：[{"role": "user", "content": "..."}]
             temperature: 温度参数
             max_tokens: 最大token数
+            cache: 是否使用响应缓存（默认只缓存低温度请求）
             
         Returns:
             AI回复内容
         """
+        key = None
+        if llm_cache.should_cache(temperature, cache):
+            key = llm_cache.make_key(self.model, messages, temperature, provider=self.provider,
+                                     endpoint=self.api_endpoint, max_tokens=max_tokens)
+            cached = llm_cache.get(key)
+            if cached is not None:
+                return cached
+        
         try:
             if self.provider == 'anthropic':
-                return self._chat_anthropic(messages, temperature, max_tokens)
+                reply = self._chat_anthropic(messages, temperature, max_tokens)
             else:
-                return self._chat_openai_compatible(messages, temperature, max_tokens)
+                reply = self._chat_openai_compatible(messages, temperature, max_tokens)
         except Exception as e:
             raise Exception(f'AI服务调用失败: {str(e)}')
+        
+        if key is not None:
+            llm_cache.put(key, reply)
+        return reply
     
     def _chat_openai_compatible(self, messages: List[Dict], 
                                 temperature: float,
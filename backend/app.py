@@ -4,20 +4,21 @@ BOSS直聘数字员工 - 后端API
 
 架构：
 ├─ /api/chat - 智能对话（双重架构Agent）
+├─ /api/chat/stream - 智能对话（SSE 流式）
 ├─ /api/conversations - 会话历史管理
 ├─ /api/knowledge - 个人知识库
 ├─ /api/memory - 长期记忆与偏好
 ├─ /api/config - 用户配置
+├─ /api/resume - 简历上传（后台解析）
 └─ /api/tasks - 任务管理
 """
 import os
 import json
 import uuid
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 from datetime import datetime
-from werkzeug.utils import secure_filename
 
 load_dotenv()
 
@@ -25,8 +26,6 @@ app = Flask(__name__)
 CORS(app)
 
 # ============ 配置 ============
-CONFIG_FILE = 'user_config.json'
-TASKS_FILE = 'user_tasks.json'
 UPLOAD_FOLDER = 'uploads'
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -34,9 +33,16 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
 # ============ 导入核心模块 ============
 from ai_service import AIService
+from storage import get_storage
+from task_queue import get_task_queue
+from applied_ledger import get_applied_ledger
+from progress import watch_tasks
+from resume_parser import get_resume_queue, store_upload
 from memory import conversation_manager, memory_system
 from knowledge_base import knowledge_base, DOC_TYPES
-from agent import dual_agent, run_agent_with_details
+from agent import dual_agent, run_agent_with_details, stream_agent_with_details
+from intent_rules import intent_classifier
+from llm_cache import llm_cache
 
 # AI 服务初始化
 try:
@@ -51,18 +57,12 @@ except Exception as e:
     print(f'⚠️ AI 服务初始化失败: {e}')
     ai_service = None
 
-# ============ 工具函数 ============
-def load_json(f, d): 
-    try: 
-        return json.load(open(f, 'r', encoding='utf-8')) if os.path.exists(f) else d
-    except: 
-        return d
-
-def save_json(f, d): 
-    json.dump(d, open(f, 'w', encoding='utf-8'), ensure_ascii=False, indent=2)
+# 配置、任务与 Worker 共用 SQLite 存储（WAL 模式可并发读写）
+storage = get_storage()
+task_queue = get_task_queue()
 
+# ============ 工具函数 ============
 def create_task(task_type, title, desc, extra=None):
-    tasks = load_json(TASKS_FILE, [])
     t = {
         'id': str(uuid.uuid4())[:8],
         'type': task_type,
@@ -74,53 +74,31 @@ def create_task(task_type, title, desc, extra=None):
         'log': '等待执行...',
         **(extra or {})
     }
-    tasks.insert(0, t)
-    save_json(TASKS_FILE, tasks)
+    # 写入任务并入队，Worker 立即被唤醒
+    task_queue.submit(t)
     return t
 
-def extract_resume(path):
-    try:
-        import pdfplumber, docx, pypdf
-        _, ext = os.path.splitext(path)
-        ext = ext.lower().replace('.', '')
-        text = ""
-        if ext == 'pdf':
-            try:
-                with pdfplumber.open(path) as pdf:
-                    for p in pdf.pages: 
-                        text += (p.extract_text() or "") + "\n"
-            except: 
-                pass
-            if not text.strip():
-                try:
-                    for p in pypdf.PdfReader(path).pages: 
-                        text += (p.extract_text() or "") + "\n"
-                except: 
-                    pass
-        elif ext in ['docx', 'doc']:
-            for p in docx.Document(path).paragraphs: 
-                text += p.text + "\n"
-        elif ext in ['txt', 'md']:
-            text = open(path, 'r', encoding='utf-8').read()
-        return text.strip() if text.strip() else "(无法解析)"
-    except Exception as e:
-        return f"(解析错误: {e})"
+def chat_task_note(task):
+    """对话中已创建的投递任务（Agent 已入队）附加到回复末尾的提示"""
+    return f"\n\n✅ 任务已创建 (ID: {task['id']})\n\n**请确保 Worker 窗口正在运行，任务将自动执行。**"
+
+def sse_event(event, data):
+    """格式化一条 Server-Sent Events 消息"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 # ============ 配置 API ============
 @app.route('/api/config', methods=['GET', 'POST'])
 def handle_config():
     if request.method == 'GET':
-        return jsonify(load_json(CONFIG_FILE, {}))
-    config = load_json(CONFIG_FILE, {})
-    config.update(request.json)
-    save_json(CONFIG_FILE, config)
+        return jsonify(storage.load_config())
+    storage.update_config(request.json)
     return jsonify({'message': '保存成功'})
 
 # ============ 任务 API ============
 @app.route('/api/tasks', methods=['GET', 'POST'])
 def handle_tasks():
     if request.method == 'GET':
-        return jsonify(load_json(TASKS_FILE, []))
+        return jsonify(storage.list_tasks())
     d = request.json
     t = create_task(
         d.get('type', 'apply'), 
@@ -130,42 +108,71 @@ def handle_tasks():
     )
     return jsonify(t)
 
+@app.route('/api/tasks/stream')
+def stream_tasks():
+    """任务进度推送（SSE）：先发全量列表，之后只推送变化的任务"""
+    def generate():
+        for event, data in watch_tasks():
+            if event == 'ping':
+                yield ': ping\n\n'
+            else:
+                yield sse_event(event, data)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/tasks/queue', methods=['GET'])
+def task_queue_stats():
+    """队列状态：排队 / 执行中数量、各 Worker 的租约、并发上限"""
+    return jsonify(task_queue.stats())
+
+@app.route('/api/tasks/applied-stats', methods=['GET'])
+def applied_jobs_stats():
+    """投递台账：已投递 / 已沟通职位数、台账过滤省下的详情页加载次数"""
+    return jsonify(get_applied_ledger().stats())
+
 @app.route('/api/tasks/<task_id>', methods=['DELETE'])
 def delete_task(task_id):
-    tasks = load_json(TASKS_FILE, [])
-    tasks = [t for t in tasks if t['id'] != task_id]
-    save_json(TASKS_FILE, tasks)
+    task_queue.cancel(task_id)
     return jsonify({'message': '删除成功'})
 
 # ============ 简历上传 API ============
 @app.route('/api/resume', methods=['POST'])
 def upload_resume():
+    """按内容哈希保存文件后立即返回解析任务；同一内容已解析过时任务直接是完成状态"""
     if 'file' not in request.files:
         return jsonify({'error': '无文件'}), 400
     file = request.files['file']
-    filename = secure_filename(file.filename) or "resume.pdf"
-    path = os.path.join(UPLOAD_FOLDER, f"{datetime.now().strftime('%Y%m%d%H%M%S')}_{filename}")
-    file.save(path)
-    content = extract_resume(path)
-    
-    # 保存到配置
-    config = load_json(CONFIG_FILE, {})
-    config.update({
-        'resume_path': path, 
-        'resume_name': file.filename, 
-        'resume_content': content[:3000]
-    })
-    save_json(CONFIG_FILE, config)
+    sha256, path = store_upload(file, UPLOAD_FOLDER)
+    job = get_resume_queue().submit(path, file.filename or os.path.basename(path), sha256)
+    if job['status'] == 'done':
+        return jsonify({'message': '上传成功', 'job_id': job['id'], 'job': job})
+    return jsonify({'message': '已上传，正在解析', 'job_id': job['id'], 'job': job}), 202
+
+@app.route('/api/resume/jobs/<job_id>', methods=['GET'])
+def resume_job(job_id):
+    """查询解析任务：pending / running / done / failed"""
+    job = get_resume_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': '解析任务不存在'}), 404
+    return jsonify(job)
+
+@app.route('/api/resume/jobs/<job_id>/stream')
+def stream_resume_job(job_id):
+    """解析任务状态推送（SSE），任务结束后关闭"""
+    queue = get_resume_queue()
+    if queue.get(job_id) is None:
+        return jsonify({'error': '解析任务不存在'}), 404
     
-    # 同时添加到知识库
-    knowledge_base.add_document(
-        title=f"简历 - {file.filename}",
-        content=content,
-        doc_type="resume",
-        tags=["简历", "个人资料"]
-    )
+    def generate():
+        for event, data in queue.watch(job_id):
+            if event == 'ping':
+                yield ': ping\n\n'
+            else:
+                yield sse_event(event, data)
     
-    return jsonify({'message': '上传成功', 'parsed': '无法解析' not in content})
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 # ============ 会话管理 API ============
 @app.route('/api/conversations', methods=['GET', 'POST'])
@@ -221,7 +228,8 @@ def handle_knowledge():
 @app.route('/api/knowledge/<doc_id>', methods=['GET', 'PUT', 'DELETE'])
 def handle_knowledge_doc(doc_id):
     if request.method == 'GET':
-        doc = knowledge_base.get_document(doc_id)
+        # 详情页要显示和编辑整篇正文
+        doc = knowledge_base.get_document(doc_id, include_content=True)
         if doc:
             return jsonify(doc)
         return jsonify({'error': '文档不存在'}), 404
@@ -238,8 +246,9 @@ def handle_knowledge_doc(doc_id):
 @app.route('/api/knowledge/search', methods=['GET'])
 def search_knowledge():
     query = request.args.get('q', '')
+    doc_type = request.args.get('type')
     limit = request.args.get('limit', 10, type=int)
-    results = knowledge_base.search(query, limit)
+    results = knowledge_base.search(query, doc_type, limit)
     return jsonify(results)
 
 @app.route('/api/knowledge/stats', methods=['GET'])
@@ -321,21 +330,16 @@ def chat():
         response = result.get('response', '无回复')
         task_created = result.get('task_created')
         
-        # 如果需要创建任务
+        # 任务已由 Agent 创建并入队，这里只附上提示
         if task_created:
-            task = create_task(
-                task_created.get('type', 'apply'),
-                f"投递-{task_created.get('keyword', '未知')}",
-                f"城市：{task_created.get('city', '未知')}，数量：{task_created.get('count', 5)}",
-                {'keyword': task_created.get('keyword'), 'city': task_created.get('city'), 'count': task_created.get('count')}
-            )
-            response += f"\n\n✅ 任务已创建 (ID: {task['id']})\n\n**请确保 Worker 窗口正在运行，任务将自动执行。**"
+            response += chat_task_note(task_created)
         
         return jsonify({
             'reply': response,
             'conversation_id': conv_id,
             'understanding': result.get('understanding'),
-            'suggestions': result.get('suggestions', [])
+            'suggestions': result.get('suggestions', []),
+            'timings': result.get('timings', {})
         })
         
     except Exception as e:
@@ -346,7 +350,7 @@ def chat():
         # 降级到简单模式
         if ai_service:
             try:
-                config = load_json(CONFIG_FILE, {})
+                config = storage.load_config()
                 system = f'''你是BOSS直聘求职助手。用户：{config.get('name', '用户')}'''
                 history = [
                     {'role': 'system', 'content': system},
@@ -359,6 +363,44 @@ def chat():
         
         return jsonify({'reply': f'处理出错: {e}', 'conversation_id': conv_id})
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """智能对话（流式）- 以 Server-Sent Events 逐段推送回复
+    
+    事件顺序：conversation → understanding → task（如有）→ token… → suggestions → done；出错时推送 error
+    """
+    msg = request.json.get('message', '')
+    conv_id = request.json.get('conversation_id')
+    
+    if not msg:
+        return jsonify({'error': '空消息'}), 400
+    
+    if not conv_id:
+        conv = conversation_manager.create_conversation()
+        conv_id = conv['id']
+    
+    def generate():
+        yield sse_event('conversation', {'conversation_id': conv_id})
+        for event, data in stream_agent_with_details(msg, conv_id):
+            if event == 'token':
+                data = {'text': data}
+            elif event == 'task':
+                data = {'task': data, 'message': chat_task_note(data)}
+            yield sse_event(event, data)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/chat/intent-stats')
+def chat_intent_stats():
+    """意图识别分层统计：规则层命中率、各层平均耗时、估算节省的时间"""
+    return jsonify(intent_classifier.stats())
+
+@app.route('/api/chat/cache-stats')
+def chat_cache_stats():
+    """LLM 响应缓存统计：命中（内存/磁盘）、未命中、跳过次数"""
+    return jsonify(llm_cache.stats())
+
 # ============ 健康检查 ============
 @app.route('/api/health')
 def health():
@@ -0,0 +1,137 @@
+"""
+投递台账 - 记录已投递 / 已沟通过的职位，搜索结果里直接过滤
+以前要打开详情页看到“继续沟通”才知道投过，每个重复职位都浪费一次页面加载。
+
+├─ applied_jobs 表：职位 ID 主键 + 公司/职位名/城市/薪资指纹索引（同一职位换了 ID 重新发布也能识别）；
+│                   职位名或公司没解析出来（占位文本）的职位不算指纹，只按 ID 匹配
+├─ 内存集合：本进程见过的 ID 和指纹，命中时 O(1) 返回，不查库
+└─ 内存未命中时按主键 / 指纹索引查一次库（其他 Worker 进程写入的记录也能看到）
+"""
+import re
+import time
+import hashlib
+import threading
+from typing import Optional, Dict
+
+from storage import get_storage, SQLiteStorage
+from job_listing import UNKNOWN_TITLE, UNKNOWN_COMPANY
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS applied_jobs (
+    job_id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    company TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'applied',
+    applied_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_applied_jobs_fingerprint ON applied_jobs (fingerprint);
+"""
+
+STATS_NAMESPACE = 'applied_ledger'
+PUNCT_RE = re.compile(r'[\s\-_/|·•()（）【】\[\]]+')
+
+
+def fingerprint(company: str, title: str, city: str = '', salary: str = '') -> str:
+    """公司 + 职位名 + 城市 + 薪资的指纹（忽略大小写、空白和常见标点）
+
+    职位名或公司为空 / 占位文本时返回 ''：所有没解析出字段的职位会得到同一个指纹，不能用来判重。
+    """
+    if not title or not company or title == UNKNOWN_TITLE or company == UNKNOWN_COMPANY:
+        return ''
+    raw = PUNCT_RE.sub('', '\x1f'.join((company, title, city or '', salary or '')).lower())
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def job_fingerprint(job) -> str:
+    return fingerprint(job.company, job.title, getattr(job, 'city', ''), getattr(job, 'salary', ''))
+
+
+class AppliedLedger:
+    """已投递职位台账"""
+
+    def __init__(self, storage: Optional[SQLiteStorage] = None):
+        self.storage = storage or get_storage()
+        self.storage.ensure_schema(SCHEMA)
+        self._lock = threading.Lock()
+        self._ids = set()
+        self._fingerprints = set()
+        self._counters = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+    def _remember(self, job_id: str, fp: str):
+        with self._lock:
+            if job_id:
+                self._ids.add(job_id)
+            if fp:
+                self._fingerprints.add(fp)
+
+    # ========== 查询 ==========
+
+    def contains(self, job) -> bool:
+        """job 为 JobRecord；投递或沟通过返回 True"""
+        key = job.id or job.url
+        fp = job_fingerprint(job)
+        with self._lock:
+            if (key and key in self._ids) or (fp and fp in self._fingerprints):
+                self._counters["memory_hits"] += 1
+                return True
+
+        row = None
+        if fp:
+            row = self.storage.query_one('SELECT job_id FROM applied_jobs WHERE job_id = ? OR fingerprint = ? LIMIT 1',
+                                         (key or '', fp))
+        elif key:
+            # 没有指纹时只按 ID 查，避免空指纹互相命中
+            row = self.storage.query_one('SELECT job_id FROM applied_jobs WHERE job_id = ?', (key,))
+        with self._lock:
+            self._counters["db_hits" if row else "misses"] += 1
+        if row:
+            self._remember(key, fp)
+        return row is not None
+
+    # ========== 记录 ==========
+
+    def record(self, job, status: str = 'applied'):
+        """记录一次投递（status='applied'）或发现已沟通过（status='contacted'）"""
+        fp = job_fingerprint(job)
+        key = job.id or job.url or fp
+        if not key:
+            # 既没有 ID / 链接也没有可靠指纹，记了也无法匹配
+            return
+        self.storage.execute('INSERT OR REPLACE INTO applied_jobs (job_id, fingerprint, title, company, status, applied_at) '
+                             'VALUES (?, ?, ?, ?, ?, ?)',
+                             (key, fp, job.title, job.company, status, time.time()))
+        self._remember(key, fp)
+
+    def add_avoided(self, count: int):
+        """累计因台账过滤而省下的详情页加载次数（跨进程持久化）"""
+        if count <= 0:
+            return
+        with self.storage.transaction():
+            total = self.storage.kv_get(STATS_NAMESPACE, 'avoided_page_loads', 0)
+            self.storage.kv_set(STATS_NAMESPACE, 'avoided_page_loads', total + count)
+
+    # ========== 统计 ==========
+
+    def stats(self) -> Dict:
+        rows = self.storage.query('SELECT status, COUNT(*) AS n FROM applied_jobs GROUP BY status')
+        with self._lock:
+            counters = dict(self._counters)
+        return {
+            "jobs": {r['status']: r['n'] for r in rows},
+            "avoided_page_loads": self.storage.kv_get(STATS_NAMESPACE, 'avoided_page_loads', 0),
+            "lookups": counters,
+        }
+
+
+_ledger: Optional[AppliedLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_applied_ledger() -> AppliedLedger:
+    """进程级单例"""
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = AppliedLedger()
+        return _ledger
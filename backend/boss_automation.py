@@ -1,84 +1,202 @@
 """
 BOSS直聘自动化 - 核心执行器
 """
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 import time
 import json
 import os
+import threading
+from collections import deque
+from urllib.parse import urlencode, urlsplit
+
+from storage import get_storage
+from job_listing import ListingCapture, read_listing, CARD_COUNT_JS
+from applied_ledger import get_applied_ledger
+from browser_profiles import resolve_profile, launch_options, apply_profile
+from pacing import (RateLimiter, AdaptiveTimeout, PacingPolicy, WaitStats,
+                    APPLY_CONCURRENCY, APPLY_RATE)
+
+BOSS_BASE_URL = 'https://www.zhipin.com'
+COOKIE_PATH = os.path.join(os.path.dirname(__file__), 'cookies.json')
+# 多个浏览器会话共用 cookies.json，写入需要串行
+_cookie_lock = threading.Lock()
+
+CHAT_BUTTON_SELECTOR = '.btn-startchat, .op-btn-chat, button:has-text("立即沟通")'
+JOB_CARD_SELECTOR = 'li.job-card-box, .job-card-wrapper'
+PHONE_INPUT_SELECTOR = 'input[name="phone"], input[placeholder*="手机"], input[type="tel"]'
+LOGIN_FORM_SELECTOR = f'{PHONE_INPUT_SELECTOR}, [ka="smslogin"], .sms-login'
+# 已登录或未登录的标志，出现任意一个即可判断登录状态
+LOGIN_STATE_SELECTOR = '.user-nav, .nav-figure, .user-info, .job-list, .job-card-wrapper, li.job-card-box, [ka="header-login"]'
+# 离开登录页或出现头像即视为登录完成（在浏览器内轮询，不占用 Python 线程）
+LOGIN_DONE_JS = """() => (!location.href.includes('login') && !location.href.includes('user'))
+    || !!document.querySelector('.user-nav img, .nav-figure img')"""
+
+# 各阶段就绪等待的超时上限（毫秒），实际超时按观测到的耗时自适应
+READY_TIMEOUTS = {
+    'page': 15000,
+    'login_page': 15000,
+    'login_form': 5000,
+    'login_check': 5000,
+    'job_list': 10000,
+    'detail': 10000,
+    'chat_sent': 5000,
+    'more': 5000,
+}
+
+MAX_SEARCH_PAGES = 10   # 一次搜索最多翻的页数
+MAX_SCAN_FACTOR = 3     # 最多查看 count × 该倍数个职位（已沟通的会跳过，需要多看一些）
 
 class BossAutomation:
-    def __init__(self):
+    def __init__(self, profile=None):
+        self.profile = resolve_profile(profile)  # headed / headless，见 browser_profiles.py
+        self.blocker = None
         self.browser = None
         self.page = None
         self.context = None
         self.playwright = None
-        self.config_path = os.path.join(os.path.dirname(__file__), 'user_config.json')
-        self.cookie_path = os.path.join(os.path.dirname(__file__), 'cookies.json')
+        self.cookie_path = COOKIE_PATH
+        self.base_url = BOSS_BASE_URL  # 离线回放时指向本地模拟站点
+        self.context_hooks = []        # context 创建后依次调用（如回放时挂载 HAR 路由）
+        self.logged_in = False  # 本会话已确认登录（浏览器池复用时跳过登录检查）
+        self.timeouts = {stage: AdaptiveTimeout(ms) for stage, ms in READY_TIMEOUTS.items()}
+        self.pacing = PacingPolicy()
+        self.wait_stats = WaitStats()
+        self.ledger = get_applied_ledger()
         
     def load_config(self):
-        if os.path.exists(self.config_path):
-            with open(self.config_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+        return get_storage().load_config()
         
     def save_config(self, config):
-        with open(self.config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, ensure_ascii=False, indent=2)
+        get_storage().update_config(config)
 
     def start(self):
         """启动浏览器"""
-        print('\n🚀 启动浏览器...')
+        print(f'\n🚀 启动浏览器（{self.profile}）...')
         self.playwright = sync_playwright().start()
         
-        self.browser = self.playwright.chromium.launch(
-            headless=False,
-            args=[
-                '--start-maximized',
-                '--disable-blink-features=AutomationControlled',
-                '--no-sandbox'
-            ]
-        )
+        self.browser = self.playwright.chromium.launch(**launch_options(self.profile))
         
         self.context = self.browser.new_context(
             viewport={'width': 1280, 'height': 900},
             user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36'
         )
+        # 无头配置拦截图片、字体和统计脚本
+        self.blocker = apply_profile(self.context, self.profile)
+        for hook in self.context_hooks:
+            hook(self.context)
         
         # 加载已保存的 Cookie
         if os.path.exists(self.cookie_path):
             try:
-                with open(self.cookie_path, 'r') as f:
+                with _cookie_lock, open(self.cookie_path, 'r') as f:
                     cookies = json.load(f)
-                    if cookies:
-                        self.context.add_cookies(cookies)
-                        print('✅ 已加载登录凭证')
+                if cookies:
+                    self.context.add_cookies(cookies)
+                    print('✅ 已加载登录凭证')
             except:
                 pass
                 
+        # 注册在 context 上，之后打开的详情页同样生效
+        self.context.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         self.page = self.context.new_page()
-        self.page.add_init_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         print('✅ 浏览器已就绪\n')
         
     def stop(self):
         """关闭浏览器"""
         try:
             if self.context:
-                cookies = self.context.cookies()
-                with open(self.cookie_path, 'w') as f:
-                    json.dump(cookies, f)
+                self.save_cookies()
                 print('💾 登录状态已保存')
         except:
             pass
-        if self.browser:
-            self.browser.close()
+        try:
+            # 先关 context：录制中的 HAR 在 context 关闭时写出
+            if self.context:
+                self.context.close()
+            if self.browser:
+                self.browser.close()
+        except:
+            pass
         if self.playwright:
             self.playwright.stop()
+        self.logged_in = False
         print('✅ 浏览器已关闭')
 
+    def save_cookies(self):
+        """保存 Cookie（先写临时文件再替换，多个会话同时保存不会写坏文件）"""
+        cookies = self.context.cookies()
+        tmp_path = f'{self.cookie_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with _cookie_lock:
+            with open(tmp_path, 'w') as f:
+                json.dump(cookies, f)
+            os.replace(tmp_path, self.cookie_path)
+
+    def is_healthy(self):
+        """浏览器仍连接且页面可以执行脚本"""
+        try:
+            return bool(self.browser and self.browser.is_connected()
+                        and not self.page.is_closed() and self.page.evaluate('1') == 1)
+        except Exception:
+            return False
+
+    def memory_mb(self):
+        """页面 JS 堆占用（MB），取不到时返回 0"""
+        try:
+            used = self.page.evaluate('performance.memory ? performance.memory.usedJSHeapSize : 0')
+            return (used or 0) / (1024 * 1024)
+        except Exception:
+            return 0
+
+    def _wait_ready(self, stage, selector=None, page=None, replaced=0.0, load_state='domcontentloaded',
+                    function=None):
+        """等待页面就绪：selector 出现、function（页面内 JS）返回真，或到达 load_state；超时不抛异常
+
+        返回匹配的元素（只等加载状态时返回 True），超时返回 None。
+        replaced 为这次等待替换掉的原固定 sleep 秒数，用于统计节省的时间。
+        """
+        page = page or self.page
+        timeout = self.timeouts[stage]
+        start = time.perf_counter()
+        result = None
+        try:
+            if selector:
+                result = page.wait_for_selector(selector, timeout=timeout.value)
+            elif function:
+                result = page.wait_for_function(function, timeout=timeout.value)
+            else:
+                page.wait_for_load_state(load_state, timeout=timeout.value)
+                result = True
+            timeout.observe((time.perf_counter() - start) * 1000)
+        except PlaywrightTimeoutError:
+            timeout.timed_out()
+        except Exception:
+            pass
+        self.wait_stats.record(stage, time.perf_counter() - start, replaced)
+        return result
+
+    def _goto(self, url, stage='page', ready_selector=None, replaced=0.0):
+        """打开页面并等待就绪（DOM 加载完成，且 ready_selector 出现）
+
+        replaced 只在有 ready_selector 时计入统计：节省的时间只按实际计时过的就绪等待计算。
+        """
+        start = time.perf_counter()
+        self.page.goto(url, wait_until='domcontentloaded', timeout=30000)
+        self.wait_stats.record('goto', time.perf_counter() - start)
+        if ready_selector:
+            return self._wait_ready(stage, ready_selector, replaced=replaced)
+        return True
+
+    def timing_summary(self):
+        """就绪等待与固定 sleep 的耗时对比，以及节奏停顿总时长"""
+        summary = self.wait_stats.summary()
+        summary['paced'] = round(self.pacing.paused, 2)
+        return summary
+
     def is_logged_in(self):
         """检查是否已登录"""
         try:
-            time.sleep(1)
+            # 等到能判断登录状态的元素出现
+            self._wait_ready('login_check', LOGIN_STATE_SELECTOR, replaced=1.0)
             
             # 方法1: 检查是否有用户头像
             avatar = self.page.query_selector('.user-nav img, .nav-figure img, .user-info')
@@ -119,11 +237,16 @@ class BossAutomation:
         print('🔐 开始 BOSS 直聘登录流程')
         print('='*55)
         
+        if launch_options(self.profile)['headless']:
+            # 无头浏览器无法扫码 / 输入验证码
+            print('\n❌ 无头模式无法完成登录，请先用有界面模式（headed）登录一次保存 Cookie')
+            return False
+        
         # 跳转到登录页
         print('\n📍 正在打开登录页面...')
         try:
-            self.page.goto('https://www.zhipin.com/web/user/?ka=header-login', timeout=30000)
-            time.sleep(3)
+            self._goto(f'{self.base_url}/web/user/?ka=header-login', 'login_page',
+                       LOGIN_FORM_SELECTOR, replaced=3.0)
             print('   ✅ 登录页面已打开')
         except Exception as e:
             print(f'   ❌ 无法加载登录页面: {e}')
@@ -134,24 +257,23 @@ class BossAutomation:
             print(f'\n📱 自动填入手机号: {phone[:3]}****{phone[-4:]}')
             try:
                 # 尝试点击"短信验证码登录"标签
-                time.sleep(1)
                 sms_tabs = self.page.query_selector_all('[ka="smslogin"], .sms-login, text=短信登录')
                 for tab in sms_tabs:
                     try:
                         tab.click()
-                        time.sleep(1)
+                        self._wait_ready('login_form', PHONE_INPUT_SELECTOR, replaced=1.0)
                         print('   ✅ 已切换到短信登录')
                         break
                     except:
                         pass
                 
                 # 填入手机号
-                phone_inputs = self.page.query_selector_all('input[name="phone"], input[placeholder*="手机"], input[type="tel"]')
+                phone_inputs = self.page.query_selector_all(PHONE_INPUT_SELECTOR)
                 for phone_input in phone_inputs:
                     try:
                         phone_input.fill(phone)
                         print('   ✅ 手机号已填入')
-                        time.sleep(1)
+                        self.pacing.pause()
                         break
                     except:
                         pass
@@ -181,10 +303,21 @@ class BossAutomation:
         print('│' + ' '*53 + '│')
         print('└' + '─'*53 + '┘\n')
         
-        # 等待登录成功
+        # 等待登录成功：浏览器内检测页面跳转或头像出现，每 30 秒提示一次
         max_wait = 180  # 3分钟
-        for i in range(max_wait // 2):
-            time.sleep(2)
+        start = time.monotonic()
+        while time.monotonic() - start < max_wait:
+            remaining_ms = (max_wait - (time.monotonic() - start)) * 1000
+            try:
+                self.page.wait_for_function(LOGIN_DONE_JS, timeout=min(30000, remaining_ms))
+            except Exception:
+                # 超时，或登录后跳转打断了检测
+                if self.page.is_closed():
+                    break
+                elapsed = int(time.monotonic() - start)
+                if elapsed >= 30 and 'login' in self.page.url:
+                    print(f'   ⏳ 已等待 {elapsed} 秒，请尽快完成登录...')
+                continue
             
             try:
                 current_url = self.page.url
@@ -192,14 +325,12 @@ class BossAutomation:
                 # 检查是否跳转离开登录页
                 if 'login' not in current_url and 'user' not in current_url:
                     print('\n🔍 检测到页面跳转，验证登录状态...')
-                    time.sleep(2)
                     
                     if self.is_logged_in():
                         print('\n✅ 登录成功！')
                         # 保存 Cookie
-                        cookies = self.context.cookies()
-                        with open(self.cookie_path, 'w') as f:
-                            json.dump(cookies, f)
+                        self.save_cookies()
+                        self.logged_in = True
                         print('💾 登录凭证已保存，下次无需再登录')
                         
                         config['boss_logged_in'] = True
@@ -207,31 +338,34 @@ class BossAutomation:
                         return True
                 
                 # 检查是否在首页且已登录
-                if 'zhipin.com' in current_url:
+                if urlsplit(self.base_url).hostname.replace('www.', '') in current_url:
                     avatar = self.page.query_selector('.user-nav img, .nav-figure img')
                     if avatar:
                         print('\n✅ 登录成功！')
-                        cookies = self.context.cookies()
-                        with open(self.cookie_path, 'w') as f:
-                            json.dump(cookies, f)
+                        self.save_cookies()
+                        self.logged_in = True
                         return True
                 
             except:
                 pass
             
-            if i > 0 and i % 15 == 0:
-                print(f'   ⏳ 已等待 {i * 2} 秒，请尽快完成登录...')
+            # 已离开登录页但未确认登录（如跳到了其他页面），稍后再检测
+            self.page.wait_for_timeout(1000)
                 
         print('\n❌ 登录超时（3分钟）')
         return False
 
     def ensure_logged_in(self):
         """确保已登录"""
+        if self.logged_in:
+            # 浏览器池中的热会话，已在本会话内确认过登录；掉线时 search_jobs 会重新登录
+            print('🌐 复用已登录的浏览器会话')
+            return True
+        
         print('🌐 正在访问 BOSS 直聘...')
         
         try:
-            self.page.goto('https://www.zhipin.com/web/geek/job', timeout=30000)
-            time.sleep(3)
+            self._goto(f'{self.base_url}/web/geek/job', 'page', LOGIN_STATE_SELECTOR, replaced=3.0)
             print('   ✅ 页面已加载')
         except Exception as e:
             print(f'   ⚠️ 页面加载异常: {e}')
@@ -243,136 +377,247 @@ class BossAutomation:
             return self.login()
         else:
             print('   ✅ 已登录，可以继续')
+            self.logged_in = True
             return True
 
-    def search_jobs(self, keyword, city='北京'):
-        """搜索职位"""
+    def _search_url(self, keyword, city='北京', filters=None, page_no=1):
         city_codes = {
             '北京': '101010100', '上海': '101020100', '广州': '101280100',
             '深圳': '101280600', '杭州': '101210100', '成都': '101270100',
             '武汉': '101200100', '南京': '101190100', '西安': '101110100',
             '苏州': '101190400'
         }
-        city_code = city_codes.get(city, '101010100')
-        
-        url = f'https://www.zhipin.com/web/geek/job?query={keyword}&city={city_code}'
-        print(f'\n🔍 搜索职位: {keyword} @ {city}')
-        print(f'   URL: {url}')
-        
+        params = {'query': keyword, 'city': city_codes.get(city, '101010100')}
+        # 其他筛选条件（如 experience / salary / degree）原样作为查询参数
+        params.update({k: v for k, v in (filters or {}).items() if v not in (None, '')})
+        if page_no > 1:
+            params['page'] = page_no
+        return f'{self.base_url}/web/geek/job?{urlencode(params)}'
+
+    def _open_search(self, url):
+        """打开搜索页并等待职位列表，必要时先登录；返回是否出现了职位列表"""
+        listed = None
         try:
-            self.page.goto(url, timeout=30000)
-            time.sleep(3)
+            listed = self._goto(url, 'job_list', JOB_CARD_SELECTOR, replaced=3.0)
             print('   ✅ 搜索页面已加载')
         except Exception as e:
             print(f'   ⚠️ 加载异常: {e}')
         
-        # 等待职位列表
-        try:
-            self.page.wait_for_selector('li.job-card-box, .job-card-wrapper', timeout=10000)
-        except:
+        if not listed:
             # 可能需要登录
             if not self.is_logged_in():
                 print('   ⚠️ 需要登录才能查看职位')
+                self.logged_in = False
                 if not self.login():
-                    return []
+                    return False
                 # 重新搜索
-                self.page.goto(url, timeout=30000)
-                time.sleep(3)
                 try:
-                    self.page.wait_for_selector('li.job-card-box, .job-card-wrapper', timeout=10000)
-                except:
+                    listed = self._goto(url, 'job_list', JOB_CARD_SELECTOR, replaced=3.0)
+                except Exception as e:
+                    print(f'   ⚠️ 加载异常: {e}')
+                if not listed:
                     print('   ❌ 未找到职位列表')
-                    return []
+                    return False
+        return bool(listed)
+
+    def _load_more(self, next_url):
+        """加载下一页：先滚动到底触发无限加载，卡片没有增加时按页码翻页；返回是否可能有新职位"""
+        before = self.page.evaluate(CARD_COUNT_JS)
+        self.page.evaluate('window.scrollTo(0, document.body.scrollHeight)')
+        if self._wait_ready('more', function=f'() => ({CARD_COUNT_JS}) > {before}'):
+            return True
+        # 旧版列表页没有无限滚动，按页码翻页
+        try:
+            return bool(self._goto(next_url, 'job_list', JOB_CARD_SELECTOR))
+        except Exception as e:
+            print(f'   ⚠️ 翻页失败: {e}')
+            return False
+
+    def iter_jobs(self, keyword, city='北京', filters=None, max_pages=MAX_SEARCH_PAGES):
+        """逐页产出搜索结果中的 JobRecord（按需加载下一页，调用方停止迭代即不再翻页）"""
+        url = self._search_url(keyword, city, filters)
+        print(f'\n🔍 搜索职位: {keyword} @ {city}')
+        print(f'   URL: {url}')
         
-        # 使用新的选择器
-        jobs = self.page.query_selector_all('li.job-card-box')
-        if not jobs:
-            jobs = self.page.query_selector_all('.job-card-wrapper')
-        print(f'   📋 找到 {len(jobs)} 个职位')
-        return jobs
+        # 等待职位列表；同时监听列表接口，抓到响应就直接读 JSON
+        capture = ListingCapture(self.page)
+        try:
+            if not self._open_search(url):
+                return
+            seen = set()
+            page_no = 1
+            while True:
+                jobs, source = read_listing(self.page, capture)
+                fresh = [job for job in jobs if job.key not in seen]
+                print(f"   📋 第 {page_no} 页: {len(fresh)} 个职位（{'接口数据' if source == 'api' else '页面解析'}）")
+                if not fresh:
+                    return
+                for job in fresh:
+                    seen.add(job.key)
+                    yield job
+                if page_no >= max_pages:
+                    return
+                page_no += 1
+                if not self._load_more(self._search_url(keyword, city, filters, page_no)):
+                    return
+        finally:
+            capture.detach()
 
-    def apply_jobs(self, keyword, city='北京', count=5, progress_callback=None):
-        """投递职位"""
+    def search_jobs(self, keyword, city='北京', filters=None):
+        """搜索职位（只取第一页），返回 JobRecord 列表"""
+        return list(self.iter_jobs(keyword, city, filters, max_pages=1))
+
+    def _open_detail(self, job, limiter):
+        """开始加载详情页，不等加载完成（多个详情页同时加载）；失败返回 None"""
+        try:
+            if job.url:
+                limiter.acquire_url(job.url)
+                page = self.context.new_page()
+                # 只等到导航提交，页面在浏览器里继续加载
+                page.goto(job.url, wait_until='commit', timeout=30000)
+                return page
+            # 没有链接时退回按位置点击卡片打开
+            cards = self.page.query_selector_all('li.job-card-box') or self.page.query_selector_all('.job-card-wrapper')
+            with self.context.expect_page() as new_page_info:
+                cards[job.index].click()
+            return new_page_info.value
+        except Exception as e:
+            print(f'   ❌ 打开详情页出错: {e}')
+            return None
+
+    def _finish_detail(self, page, job):
+        """在已打开的详情页上点击沟通，返回是否投递成功；结果记入投递台账"""
+        try:
+            # 查找沟通按钮
+            chat_btn = self._wait_ready('detail', CHAT_BUTTON_SELECTOR, page=page, replaced=2.0)
+            
+            if chat_btn:
+                btn_text = chat_btn.inner_text()
+                if '继续沟通' in btn_text or '已沟通' in btn_text:
+                    print(f'   ⏭️ 已沟通过，跳过')
+                    self.ledger.record(job, 'contacted')
+                else:
+                    chat_btn.click()
+                    print(f'   ✅ 投递成功！')
+                    self.ledger.record(job, 'applied')
+                    # 等打招呼请求发完再关页面
+                    self._wait_ready('chat_sent', page=page, replaced=2.0, load_state='networkidle')
+                    return True
+            else:
+                print(f'   ⚠️ 未找到沟通按钮')
+            return False
+        except Exception as e:
+            print(f'   ❌ 出错: {e}')
+            return False
+        finally:
+            try:
+                page.close()
+            except Exception:
+                pass
+
+    def apply_jobs(self, keyword, city='北京', count=5, progress_callback=None, concurrency=None, filters=None,
+                   rate=None, should_stop=None):
+        """投递职位，成功 count 个即停止
+
+        搜索结果逐页流入：第一页一出来就开始投递，不够时再加载下一页。
+        以 concurrency 个详情页为窗口流水线处理：窗口内的页面同时加载，按顺序逐个点击沟通；
+        打开页面受按域名的速率限制。
+        should_stop：每打开 / 点击一个职位前检查，返回 True 时立即停止（如任务租约已丢失）。
+        """
         print('\n' + '='*55)
         print(f'🎯 开始投递: {keyword} @ {city}')
         print('='*55)
         
+        # 本次任务的等待统计
+        self.wait_stats.reset()
+        self.pacing.paused = 0.0
+        
         if not self.ensure_logged_in():
             print('\n❌ 无法登录，任务终止')
             return 0
         
-        jobs = self.search_jobs(keyword, city)
-        if not jobs:
-            print('\n❌ 没有找到职位')
-            return 0
-        
-        total = min(len(jobs), count)
+        concurrency = max(1, concurrency or APPLY_CONCURRENCY)
+        limiter = RateLimiter(APPLY_RATE if rate is None else rate, burst=concurrency)
+        max_scan = count * MAX_SCAN_FACTOR
         success = 0
+        scanned = 0
+        skipped = 0
+        stopped = False
+        in_flight = deque()
         
-        print(f'\n📝 开始投递前 {total} 个职位...\n')
+        print(f'\n📝 目标投递 {count} 个职位（同时打开 {concurrency} 个详情页）...\n')
         
-        for i, card in enumerate(jobs[:total]):
-            try:
-                if progress_callback:
-                    progress_callback(int((i + 1) / total * 100), f'正在投递第 {i + 1}/{total} 个职位')
-                
-                # 获取职位信息
-                title_el = card.query_selector('.job-name, .job-title')
-                company_el = card.query_selector('.company-name, .info-company')
-                salary_el = card.query_selector('.salary, .job-salary')
-                
-                title = title_el.inner_text() if title_el else '未知职位'
-                company = company_el.inner_text() if company_el else '未知公司'
-                salary = salary_el.inner_text() if salary_el else ''
-                
-                print(f'[{i+1}/{total}] {title} @ {company} {salary}')
-                
-                # 点击打开详情页
-                with self.context.expect_page() as new_page_info:
-                    card.click()
-                
-                new_page = new_page_info.value
-                new_page.wait_for_load_state('domcontentloaded')
-                time.sleep(2)
-                
-                # 查找沟通按钮
-                chat_btn = new_page.query_selector('.btn-startchat, .op-btn-chat, button:has-text("立即沟通")')
-                
-                if chat_btn:
-                    btn_text = chat_btn.inner_text()
-                    if '继续沟通' in btn_text or '已沟通' in btn_text:
-                        print(f'   ⏭️ 已沟通过，跳过')
-                    else:
-                        chat_btn.click()
-                        success += 1
-                        print(f'   ✅ 投递成功！')
-                        time.sleep(2)
-                else:
-                    print(f'   ⚠️ 未找到沟通按钮')
-                
-                new_page.close()
-                time.sleep(1)
-                
-            except Exception as e:
-                print(f'   ❌ 出错: {e}')
-                try:
-                    # 尝试关闭可能打开的新页面
-                    pages = self.context.pages
-                    if len(pages) > 1:
-                        pages[-1].close()
-                except:
-                    pass
+        def finish_next():
+            nonlocal stopped
+            i, job, page = in_flight.popleft()
+            if should_stop and should_stop():
+                # 已无权继续执行，不再点击沟通
+                stopped = True
+                if page is not None:
+                    page.close()
+                return 0
+            print(f'[{i+1}] {job.title} @ {job.company} {job.salary}')
+            ok = page is not None and self._finish_detail(page, job)
+            if progress_callback:
+                progress_callback(int((success + ok) / count * 100),
+                                  f'已查看 {i + 1} 个职位，成功投递 {success + ok}/{count}')
+            return 1 if ok else 0
+        
+        jobs = self.iter_jobs(keyword, city, filters)
+        try:
+            for job in jobs:
+                # 在途的页面全部成功就已够数，等它们处理完再决定是否继续
+                while in_flight and success + len(in_flight) >= count:
+                    success += finish_next()
+                if success >= count or scanned >= max_scan or stopped:
+                    break
+                if should_stop and should_stop():
+                    stopped = True
+                    break
+                if self.ledger.contains(job):
+                    # 台账里已有记录，不用打开详情页
+                    skipped += 1
+                    continue
+                if scanned:
+                    # 原先每个职位之间固定 sleep(1)，现在由节奏策略决定（停顿时长单独统计为 paced）
+                    self.pacing.pause()
+                in_flight.append((scanned, job, self._open_detail(job, limiter)))
+                scanned += 1
+                if len(in_flight) >= concurrency:
+                    success += finish_next()
+            while in_flight:
+                success += finish_next()
+        finally:
+            jobs.close()
+            for _, _, page in in_flight:
+                if page is not None:
+                    page.close()
+        
+        self.ledger.add_avoided(skipped)
+        if stopped:
+            print(f'\n⛔ 任务已被要求停止，已成功投递 {success} 个')
+            return success
+        if not scanned and not skipped:
+            print('\n❌ 没有找到职位')
+            return 0
         
-        print(f'\n🎉 投递完成！成功 {success}/{total}')
+        print(f'\n🎉 投递完成！成功 {success}/{count}（查看了 {scanned} 个职位，'
+              f'台账过滤 {skipped} 个已投递职位）')
+        timing = self.timing_summary()
+        print(f"⏱️ 就绪等待 {timing['waited']}s（原固定等待 {timing['replaced']}s，节省 {timing['saved']}s），"
+              f"节奏停顿 {timing['paced']}s")
         return success
 
-
-def run_task(keyword, city, count=5, progress_callback=None):
-    """执行投递任务"""
-    bot = BossAutomation()
+def run_task(keyword, city, count=5, progress_callback=None, pool=None, profile=None, should_stop=None):
+    """执行投递任务；传入浏览器池时复用池中的已登录会话，profile 选择 headed / headless"""
+    if pool is not None:
+        with pool.session(profile) as bot:
+            return bot.apply_jobs(keyword, city, count, progress_callback, should_stop=should_stop)
+    
+    bot = BossAutomation(profile)
     try:
         bot.start()
-        result = bot.apply_jobs(keyword, city, count, progress_callback)
+        result = bot.apply_jobs(keyword, city, count, progress_callback, should_stop=should_stop)
         return result
     finally:
         bot.stop()
@@ -0,0 +1,103 @@
+"""
+浏览器池 - Worker 持有的长期浏览器会话
+每个任务都冷启动 Chromium 并检查登录要 5-10 秒，池里的会话启动一次、登录一次，之后的任务直接复用。
+
+Playwright 同步 API 的对象只能在创建它的线程里使用，所以每个 Worker 线程各持有会话
+（每种浏览器配置一个，见 browser_profiles.py）：
+├─ session()     取出本线程该配置的热会话（不健康则重建），用完归还
+├─ 归还时        保存 Cookie；使用次数达到上限或页面内存超限则关闭，下次重建
+└─ close()       关闭本线程的会话
+
+环境变量：
+├─ CAREERPILOT_BROWSER_MAX_USES        单个会话最多执行的任务数（默认 20）
+└─ CAREERPILOT_BROWSER_MAX_MEMORY_MB   页面 JS 堆超过该值时回收（默认 512）
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+from boss_automation import BossAutomation
+from browser_profiles import resolve_profile
+
+
+class BrowserPool:
+    """按线程复用已登录的 BossAutomation 会话"""
+
+    def __init__(self, max_uses: int = None, max_memory_mb: float = None):
+        self.max_uses = max_uses or int(os.getenv('CAREERPILOT_BROWSER_MAX_USES', 20))
+        self.max_memory_mb = max_memory_mb or float(os.getenv('CAREERPILOT_BROWSER_MAX_MEMORY_MB', 512))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {"created": 0, "reused": 0, "recycled": 0, "unhealthy": 0, "start_ms": 0.0}
+
+    def _count(self, key: str, value: float = 1):
+        with self._lock:
+            self._stats[key] += value
+
+    # ========== 借出与归还 ==========
+
+    def _bots(self) -> Dict[str, BossAutomation]:
+        bots = getattr(self._local, 'bots', None)
+        if bots is None:
+            bots = self._local.bots = {}
+        return bots
+
+    @contextmanager
+    def session(self, profile: str = None) -> Iterator[BossAutomation]:
+        bot = self._checkout(resolve_profile(profile))
+        try:
+            yield bot
+        finally:
+            self._checkin(bot)
+
+    def _checkout(self, profile: str) -> BossAutomation:
+        bot = self._bots().get(profile)
+        if bot is not None:
+            if bot.is_healthy():
+                self._count("reused")
+                return bot
+            print('⚠️ 浏览器会话已失效，重新启动')
+            self._count("unhealthy")
+            self._discard(bot)
+
+        start = time.perf_counter()
+        bot = BossAutomation(profile)
+        bot.start()
+        bot.uses = 0
+        self._bots()[profile] = bot
+        self._count("created")
+        self._count("start_ms", (time.perf_counter() - start) * 1000)
+        return bot
+
+    def _checkin(self, bot: BossAutomation):
+        bot.uses += 1
+        try:
+            bot.save_cookies()
+        except Exception as e:
+            print(f'⚠️ 保存登录状态失败: {e}')
+
+        memory = bot.memory_mb()
+        if bot.uses >= self.max_uses or memory > self.max_memory_mb:
+            print(f'♻️ 回收浏览器会话（已执行 {bot.uses} 个任务，页面内存 {memory:.0f} MB）')
+            self._count("recycled")
+            self._discard(bot)
+
+    def _discard(self, bot: BossAutomation):
+        self._bots().pop(bot.profile, None)
+        try:
+            bot.stop()
+        except Exception as e:
+            print(f'⚠️ 关闭浏览器出错: {e}')
+
+    def close(self):
+        """关闭本线程持有的会话"""
+        for bot in list(self._bots().values()):
+            self._discard(bot)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["avg_start_ms"] = round(stats.pop("start_ms") / stats["created"], 1) if stats["created"] else 0.0
+        return stats
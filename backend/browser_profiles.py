@@ -0,0 +1,150 @@
+"""
+浏览器运行配置 - 有界面 / 无头两种执行方式
+├─ headed     有界面，加载全部资源（需要扫码、输验证码登录时使用）
+└─ headless   无头，通过 context.route 拦截图片、媒体、字体和统计脚本（服务器上跑 Worker 用）
+
+无头模式不能完成交互式登录，需要先用有界面模式登录一次保存 Cookie。
+默认配置由环境变量 CAREERPILOT_BROWSER_PROFILE 指定（默认 headed），任务可单独指定 profile。
+
+对比两种配置的内存和页面加载耗时：
+    python browser_profiles.py bench [URL ...] [--rounds 3]
+"""
+import os
+import sys
+import time
+import argparse
+from typing import Dict, List, Iterable
+
+DEFAULT_PROFILE = os.getenv('CAREERPILOT_BROWSER_PROFILE', 'headed')
+
+# 统计、埋点类请求（按 URL 子串匹配）
+TRACKER_PATTERNS = (
+    'hm.baidu.com', 'google-analytics.com', 'googletagmanager.com', 'cnzz.com', 'growingio.com',
+    'sensorsdata', 'umeng.com', 'doubleclick.net', 'bdstatic.com/linksubmit', '/wapi/zpCommon/actionLog',
+)
+
+PROFILES = {
+    'headed': {
+        'headless': False,
+        'args': ['--start-maximized'],
+        'block_types': (),
+        'block_trackers': False,
+    },
+    'headless': {
+        'headless': True,
+        'args': [],
+        'block_types': ('image', 'media', 'font'),
+        'block_trackers': True,
+    },
+}
+
+BASE_ARGS = ['--disable-blink-features=AutomationControlled', '--no-sandbox']
+
+
+def resolve_profile(name: str = None) -> str:
+    """未指定或未知的配置名退回默认配置"""
+    name = (name or DEFAULT_PROFILE).lower()
+    return name if name in PROFILES else 'headed'
+
+
+def launch_options(name: str) -> Dict:
+    profile = PROFILES[resolve_profile(name)]
+    return {'headless': profile['headless'], 'args': profile['args'] + BASE_ARGS}
+
+
+class ResourceBlocker:
+    """按资源类型和统计脚本拦截请求，记录拦截数"""
+
+    def __init__(self, block_types: Iterable[str], block_trackers: bool):
+        self.block_types = frozenset(block_types)
+        self.block_trackers = block_trackers
+        self.blocked = 0
+        self.allowed = 0
+
+    def __call__(self, route):
+        request = route.request
+        if request.resource_type in self.block_types or \
+                (self.block_trackers and any(p in request.url for p in TRACKER_PATTERNS)):
+            self.blocked += 1
+            route.abort()
+        else:
+            self.allowed += 1
+            route.continue_()
+
+
+def apply_profile(context, name: str):
+    """给 context 装上该配置的请求拦截，返回 ResourceBlocker（不拦截时返回 None）"""
+    profile = PROFILES[resolve_profile(name)]
+    if not profile['block_types'] and not profile['block_trackers']:
+        return None
+    blocker = ResourceBlocker(profile['block_types'], profile['block_trackers'])
+    context.route('**/*', blocker)
+    return blocker
+
+
+# ========== 基准测试 ==========
+
+def _browser_rss_mb() -> float:
+    """当前进程派生的浏览器进程树的常驻内存（MB），未安装 psutil 时返回 0"""
+    try:
+        import psutil
+    except ImportError:
+        return 0.0
+    total = 0
+    for child in psutil.Process().children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total / (1024 * 1024)
+
+
+def benchmark(urls: List[str], profiles: Iterable[str] = ('headed', 'headless'), rounds: int = 3) -> Dict:
+    """依次用各配置打开 urls，返回每个配置的平均加载耗时、JS 堆和浏览器进程内存"""
+    from playwright.sync_api import sync_playwright
+
+    results = {}
+    with sync_playwright() as p:
+        for name in profiles:
+            browser = p.chromium.launch(**launch_options(name))
+            context = browser.new_context(viewport={'width': 1280, 'height': 900})
+            blocker = apply_profile(context, name)
+            page = context.new_page()
+            cdp = context.new_cdp_session(page)
+            cdp.send('Performance.enable')
+
+            timings = []
+            for _ in range(rounds):
+                for url in urls:
+                    start = time.perf_counter()
+                    page.goto(url, wait_until='load', timeout=60000)
+                    timings.append((time.perf_counter() - start) * 1000)
+
+            metrics = {m['name']: m['value'] for m in cdp.send('Performance.getMetrics')['metrics']}
+            results[name] = {
+                'avg_load_ms': round(sum(timings) / len(timings), 1),
+                'max_load_ms': round(max(timings), 1),
+                'js_heap_mb': round(metrics.get('JSHeapUsedSize', 0) / (1024 * 1024), 1),
+                'browser_rss_mb': round(_browser_rss_mb(), 1),
+                'blocked_requests': blocker.blocked if blocker else 0,
+            }
+            browser.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比有界面 / 无头配置的内存与加载耗时')
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('urls', nargs='*', default=['https://www.zhipin.com/web/geek/job?query=Python&city=101010100'])
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    results = benchmark(args.urls, rounds=args.rounds)
+    print(f"{'配置':<10}{'平均加载(ms)':>14}{'最慢(ms)':>12}{'JS堆(MB)':>12}{'进程内存(MB)':>14}{'拦截请求':>10}")
+    for name, r in results.items():
+        print(f"{name:<10}{r['avg_load_ms']:>14}{r['max_load_ms']:>12}{r['js_heap_mb']:>12}"
+              f"{r['browser_rss_mb'] or '-':>14}{r['blocked_requests']:>10}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
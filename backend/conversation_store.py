@@ -0,0 +1,313 @@
+"""
+会话存储引擎
+- JsonlConversationStore：每个会话一个追加日志（无数据库时使用）
+- SQLiteConversationStore：共享 SQLite 存储（默认，见 storage.py）
+
+JSONL 布局：
+├─ index.jsonl        会话头日志（只追加，后写覆盖前写，定期压缩）
+└─ <conv_id>.jsonl    会话消息日志（每行一条消息，只追加）
+
+追加消息只写两行：一行消息 + 一行会话头，与历史总量无关。
+列出会话只读会话头，不解析任何消息正文。
+"""
+import os
+import json
+import threading
+from collections import deque
+from typing import Optional, List, Dict, Iterable
+
+
+class JsonlConversationStore:
+    """基于 JSONL 追加日志的会话存储"""
+
+    INDEX_NAME = 'index.jsonl'
+    LEGACY_NAME = 'conversations.json'
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        self.index_file = os.path.join(base_dir, self.INDEX_NAME)
+        os.makedirs(base_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._headers: Dict[str, Dict] = {}  # 按创建顺序排列
+        self._offset = 0                     # 已读取到的会话头日志位置
+        self._journal_lines = 0              # 日志中的行数（用于判断是否需要压缩）
+
+        self._migrate_legacy()
+
+    # ========== 会话头日志 ==========
+
+    def _log_path(self, conv_id: str) -> str:
+        return os.path.join(self.base_dir, f"{conv_id}.jsonl")
+
+    def _apply_header_line(self, line: str):
+        line = line.strip()
+        if not line:
+            return
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return  # 崩溃时可能留下半行，忽略
+        self._journal_lines += 1
+        conv_id = record.get('id')
+        if not conv_id:
+            return
+        if record.get('_deleted'):
+            self._headers.pop(conv_id, None)
+        else:
+            self._headers[conv_id] = record
+
+    def _refresh(self):
+        """增量读取其他进程追加的会话头（被压缩过则整体重读）"""
+        try:
+            size = os.path.getsize(self.index_file)
+        except OSError:
+            size = 0
+
+        if size == self._offset:
+            return
+        if size < self._offset:
+            self._headers = {}
+            self._offset = 0
+            self._journal_lines = 0
+
+        with open(self.index_file, 'rb') as f:
+            f.seek(self._offset)
+            data = f.read()
+
+        # 只消费完整的行，半行留到下次
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].decode('utf-8').splitlines():
+            self._apply_header_line(line)
+        self._offset += end
+
+    def _append_header(self, record: Dict):
+        """追加一行会话头，再增量读回（同时吸收其他进程的追加）"""
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with open(self.index_file, 'a', encoding='utf-8') as f:
+            f.write(line)
+        self._refresh()
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        """日志行数远多于存活会话时重写会话头日志（摊还 O(1)）"""
+        if self._journal_lines <= 2 * len(self._headers) + 64:
+            return
+        self._write_index(self._headers.values())
+
+    def _write_index(self, headers: Iterable[Dict]):
+        tmp = self.index_file + '.tmp'
+        count = 0
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for header in headers:
+                f.write(json.dumps(header, ensure_ascii=False) + '\n')
+                count += 1
+        os.replace(tmp, self.index_file)
+        self._offset = os.path.getsize(self.index_file)
+        self._journal_lines = count
+
+    # ========== 旧格式迁移 ==========
+
+    def _migrate_legacy(self):
+        """把旧的 conversations.json 拆分为每会话一个日志（只执行一次）"""
+        legacy = os.path.join(self.base_dir, self.LEGACY_NAME)
+        if os.path.exists(self.index_file) or not os.path.exists(legacy):
+            return
+        try:
+            with open(legacy, 'r', encoding='utf-8') as f:
+                conversations = json.load(f)
+        except (OSError, ValueError):
+            conversations = []
+
+        headers = []
+        # 旧文件最新会话在前，日志按创建顺序写入
+        for conv in reversed(conversations or []):
+            messages = conv.get('messages', [])
+            self._write_messages(conv['id'], messages)
+            header = {k: v for k, v in conv.items() if k != 'messages'}
+            header['message_count'] = len(messages)
+            headers.append(header)
+
+        with self._lock:
+            self._write_index(headers)
+            self._headers = {h['id']: h for h in headers}
+        os.replace(legacy, legacy + '.migrated')
+
+    # ========== 消息日志 ==========
+
+    def _write_messages(self, conv_id: str, messages: List[Dict]):
+        tmp = self._log_path(conv_id) + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for msg in messages:
+                f.write(json.dumps(msg, ensure_ascii=False) + '\n')
+        os.replace(tmp, self._log_path(conv_id))
+
+    def _read_messages(self, conv_id: str, limit: Optional[int] = None) -> List[Dict]:
+        path = self._log_path(conv_id)
+        if not os.path.exists(path):
+            return []
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = deque(f, maxlen=limit) if limit else f.readlines()
+        messages = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                messages.append(json.loads(line))
+            except ValueError:
+                continue
+        return messages
+
+    # ========== 对外接口 ==========
+
+    def create(self, header: Dict) -> Dict:
+        with self._lock:
+            self._refresh()
+            header = {k: v for k, v in header.items() if k != 'messages'}
+            header.setdefault('message_count', 0)
+            open(self._log_path(header['id']), 'a', encoding='utf-8').close()
+            self._append_header(header)
+            return dict(header)
+
+    def get_header(self, conv_id: str) -> Optional[Dict]:
+        with self._lock:
+            self._refresh()
+            header = self._headers.get(conv_id)
+            return dict(header) if header else None
+
+    def list_headers(self, limit: int = 50) -> List[Dict]:
+        """最新创建的会话在前，只读会话头"""
+        with self._lock:
+            self._refresh()
+            headers = list(self._headers.values())
+        if limit:
+            headers = headers[-limit:]
+        return [dict(h) for h in reversed(headers)]
+
+    def append_message(self, conv_id: str, message: Dict, header_updates: Dict) -> Optional[Dict]:
+        """追加一条消息并更新会话头，返回更新后的会话头"""
+        with self._lock:
+            self._refresh()
+            header = self._headers.get(conv_id)
+            if header is None:
+                return None
+            with open(self._log_path(conv_id), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(message, ensure_ascii=False) + '\n')
+            header = dict(header, **header_updates)
+            header['message_count'] = header.get('message_count', 0) + 1
+            self._append_header(header)
+            return dict(header)
+
+    def get_messages(self, conv_id: str, limit: Optional[int] = None) -> List[Dict]:
+        return self._read_messages(conv_id, limit)
+
+    def update(self, conv_id: str, updates: Dict) -> bool:
+        with self._lock:
+            self._refresh()
+            header = self._headers.get(conv_id)
+            if header is None:
+                return False
+            updates = dict(updates)
+            if 'messages' in updates:
+                messages = updates.pop('messages') or []
+                self._write_messages(conv_id, messages)
+                updates['message_count'] = len(messages)
+            updates.pop('id', None)
+            self._append_header(dict(header, **updates))
+            return True
+
+    def delete(self, conv_id: str) -> bool:
+        with self._lock:
+            self._refresh()
+            if conv_id not in self._headers:
+                return False
+            self._append_header({'id': conv_id, '_deleted': True})
+            try:
+                os.remove(self._log_path(conv_id))
+            except OSError:
+                pass
+            return True
+
+
+class SQLiteConversationStore:
+    """基于共享 SQLite 存储的会话存储（接口与 JsonlConversationStore 一致）"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    @staticmethod
+    def _header(row) -> Dict:
+        header = json.loads(row['header'])
+        header['message_count'] = row['message_count']
+        return header
+
+    def create(self, header: Dict) -> Dict:
+        header = {k: v for k, v in header.items() if k not in ('messages', 'message_count')}
+        self.storage.execute('INSERT INTO conversations (id, header, message_count) VALUES (?, ?, 0)',
+                             (header['id'], json.dumps(header, ensure_ascii=False)))
+        return dict(header, message_count=0)
+
+    def get_header(self, conv_id: str) -> Optional[Dict]:
+        row = self.storage.query_one('SELECT header, message_count FROM conversations WHERE id = ?', (conv_id,))
+        return self._header(row) if row else None
+
+    def list_headers(self, limit: int = 50) -> List[Dict]:
+        """最新创建的会话在前，只读会话头（解析结果走存储层读缓存）"""
+        def load():
+            if limit:
+                rows = self.storage.query('SELECT header, message_count FROM conversations '
+                                          'ORDER BY seq DESC LIMIT ?', (limit,))
+            else:
+                rows = self.storage.query('SELECT header, message_count FROM conversations ORDER BY seq DESC')
+            return [self._header(r) for r in rows]
+        return [dict(h) for h in self.storage.cached(('conversations', limit), load)]
+
+    def append_message(self, conv_id: str, message: Dict, header_updates: Dict) -> Optional[Dict]:
+        with self.storage.transaction():
+            header = self.get_header(conv_id)
+            if header is None:
+                return None
+            seq = header.pop('message_count')
+            header.update(header_updates)
+            self.storage.execute('INSERT INTO messages (conv_id, seq, data) VALUES (?, ?, ?)',
+                                 (conv_id, seq, json.dumps(message, ensure_ascii=False)))
+            self.storage.execute('UPDATE conversations SET header = ?, message_count = ? WHERE id = ?',
+                                 (json.dumps(header, ensure_ascii=False), seq + 1, conv_id))
+        return dict(header, message_count=seq + 1)
+
+    def get_messages(self, conv_id: str, limit: Optional[int] = None) -> List[Dict]:
+        if limit:
+            rows = self.storage.query('SELECT data FROM messages WHERE conv_id = ? '
+                                      'ORDER BY seq DESC LIMIT ?', (conv_id, limit))
+            rows = list(reversed(rows))
+        else:
+            rows = self.storage.query('SELECT data FROM messages WHERE conv_id = ? ORDER BY seq', (conv_id,))
+        return [json.loads(r['data']) for r in rows]
+
+    def update(self, conv_id: str, updates: Dict) -> bool:
+        with self.storage.transaction():
+            header = self.get_header(conv_id)
+            if header is None:
+                return False
+            updates = dict(updates)
+            count = header.pop('message_count')
+            if 'messages' in updates:
+                messages = updates.pop('messages') or []
+                self.storage.execute('DELETE FROM messages WHERE conv_id = ?', (conv_id,))
+                self.storage.connection().executemany(
+                    'INSERT INTO messages (conv_id, seq, data) VALUES (?, ?, ?)',
+                    [(conv_id, i, json.dumps(m, ensure_ascii=False)) for i, m in enumerate(messages)])
+                count = len(messages)
+            updates.pop('id', None)
+            updates.pop('message_count', None)
+            header.update(updates)
+            self.storage.execute('UPDATE conversations SET header = ?, message_count = ? WHERE id = ?',
+                                 (json.dumps(header, ensure_ascii=False), count, conv_id))
+        return True
+
+    def delete(self, conv_id: str) -> bool:
+        with self.storage.transaction():
+            self.storage.execute('DELETE FROM messages WHERE conv_id = ?', (conv_id,))
+            cur = self.storage.execute('DELETE FROM conversations WHERE id = ?', (conv_id,))
+        return cur.rowcount > 0
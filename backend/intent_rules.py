@@ -0,0 +1,236 @@
+"""
+规则意图分类 - 语义理解的第一层
+常见的命令式输入（如“帮我投递上海的产品经理岗位，投10个”）用词典 + 正则直接识别，
+置信度足够高时跳过 LLM 调用；有歧义的输入（疑问、否定、多个意图）交给 DeepSeek。
+
+城市与岗位词典编译成前缀树形式的正则（共享前缀合并），词典再大匹配也是一次扫描。
+词典可在用户配置中扩展：intentCities / intentRoles（字符串列表）。
+"""
+import re
+import time
+import threading
+from typing import Dict, List, Optional, Iterable, Tuple
+
+DEFAULT_CITIES = [
+    "北京", "上海", "广州", "深圳", "杭州", "成都", "武汉", "南京", "西安", "苏州",
+    "天津", "重庆", "长沙", "郑州", "厦门", "青岛", "合肥", "济南", "大连", "宁波",
+    "无锡", "东莞", "佛山", "福州", "昆明", "沈阳", "哈尔滨", "珠海", "香港", "远程",
+]
+
+DEFAULT_ROLES = [
+    "产品经理", "产品助理", "项目经理", "前端", "后端", "全栈", "运营", "用户运营", "内容运营",
+    "新媒体运营", "设计", "UI设计", "交互设计", "测试", "测试开发", "数据分析", "数据开发",
+    "算法", "算法工程师", "机器学习", "大模型", "Java", "Python", "Go", "C++", "iOS", "Android",
+    "运维", "DevOps", "销售", "市场", "人力资源", "HR", "财务", "会计", "法务", "行政", "客服",
+]
+
+# 规则置信度达到该值时不再调用 LLM
+CONFIDENCE_THRESHOLD = 0.9
+
+CN_DIGITS = {"一": 1, "两": 2, "二": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+COUNT_RE = re.compile(r'([0-9]+|[一两二三四五六七八九十]{1,3})\s*(?:个|份|家|条)|数量[:：]\s*([0-9]+)')
+APPLY_RE = re.compile(r'投递|投简历|海投|帮我投|给我投|投(?=[0-9一两二三四五六七八九十]+\s*(?:个|份|家))|申请')
+SEARCH_RE = re.compile(r'搜索|搜一下|查找|查一下|找|看看|推荐')
+JOB_WORD_RE = re.compile(r'岗位|职位|工作|机会|公司')
+RESUME_RE = re.compile(r'(?:优化|修改|润色|改改|改一下|完善|诊断).{0,6}简历|简历.{0,6}(?:优化|修改|润色|完善|诊断)')
+INTERVIEW_RE = re.compile(r'面试.{0,6}(?:准备|技巧|问题|题|模拟|练习)|(?:准备|模拟|练习).{0,6}面试')
+GREETING_RE = re.compile(r'^\s*(?:你好|您好|hi|hello|嗨|在吗|谢谢|多谢|感谢)[呀啊！!。~\s]*$', re.IGNORECASE)
+# 疑问、否定、条件句交给 LLM
+AMBIGUOUS_RE = re.compile(r'[?？]|吗|怎么|如何|为什么|是否|能不能|可不可以|不要|别|取消|停止|不用|如果|假如')
+# 命令式句子里不属于岗位描述的虚词与标点
+FILLER_RE = re.compile(r'帮我|给我|帮忙|麻烦|请|我想|我要|想要|一下|一些|相关|的|在|去|[\s，,。.！!~、]')
+
+
+def _parse_count(text: str) -> int:
+    if text.isdigit():
+        return int(text)
+    # 中文数字（支持到九十九）
+    if '十' in text:
+        tens, _, ones = text.partition('十')
+        return CN_DIGITS.get(tens, 1) * 10 + CN_DIGITS.get(ones, 0)
+    return CN_DIGITS.get(text, 0)
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """把词表编译成前缀树正则，较长的词优先匹配"""
+    trie: Dict = {}
+    for word in words:
+        node = trie
+        for ch in word.lower():
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node: Dict) -> str:
+        branches = []
+        for ch in sorted((c for c in node if c), key=lambda c: -_depth(node[c])):
+            branches.append(re.escape(ch) + build(node[ch]))
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        # 当前位置本身可以结束时，后续部分可选（贪婪，先尝试更长的词）
+        return f'(?:{body})?' if '' in node else body
+
+    return build(trie)
+
+
+def _depth(node: Dict) -> int:
+    return 1 + max((_depth(child) for key, child in node.items() if key), default=0)
+
+
+def _ascii_alnum(text: str, i: int) -> bool:
+    """text[i] 存在且是 ASCII 字母或数字"""
+    return 0 <= i < len(text) and text[i].isascii() and text[i].isalnum()
+
+
+class IntentClassifier:
+    """规则意图分类器，并统计各层（rules / llm）的命中次数与耗时"""
+
+    def __init__(self, threshold: float = CONFIDENCE_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._dictionaries = None
+        self._city_re = None
+        self._role_re = None
+        self._roles_by_lower: Dict[str, str] = {}
+        self._stats = {
+            "rules": {"calls": 0, "hits": 0, "time_ms": 0.0},
+            "llm": {"calls": 0, "time_ms": 0.0},
+        }
+
+    # ========== 词典 ==========
+
+    def _matchers(self, config: Dict):
+        """按配置的词典取编译好的 (城市正则, 岗位正则, 岗位原始写法)，词典变化时重新编译"""
+        cities = tuple(dict.fromkeys(DEFAULT_CITIES + list(config.get('intentCities') or [])))
+        roles = tuple(dict.fromkeys(DEFAULT_ROLES + list(config.get('intentRoles') or [])))
+        with self._lock:
+            if self._dictionaries != (cities, roles):
+                self._city_re = re.compile(_trie_pattern(cities))
+                self._role_re = re.compile(_trie_pattern(roles), re.IGNORECASE)
+                self._roles_by_lower = {r.lower(): r for r in roles}
+                self._dictionaries = (cities, roles)
+            return self._city_re, self._role_re, self._roles_by_lower
+
+    # ========== 实体抽取 ==========
+
+    def extract_entities(self, text: str, config: Dict = None) -> Dict:
+        """抽取城市、岗位关键词、数量（未出现的不返回）"""
+        return self._extract(text, config or {})[0]
+
+    def _extract(self, text: str, config: Dict) -> Tuple[Dict, List[Tuple[int, int]]]:
+        """抽取实体，并返回各实体在原文中的位置"""
+        city_re, role_re, roles_by_lower = self._matchers(config)
+        entities = {}
+        spans = []
+        city = city_re.search(text)
+        if city and city.group():
+            entities["city"] = city.group()
+            spans.append(city.span())
+        # 英文岗位名需要完整单词，前后都不能紧挨字母数字（避免 “Go” 命中 “Google” / “Django”）
+        for match in role_re.finditer(text):
+            word = match.group()
+            if not word:
+                continue
+            if word.isascii() and (_ascii_alnum(text, match.start() - 1) or _ascii_alnum(text, match.end())):
+                continue
+            entities["keyword"] = roles_by_lower.get(word.lower(), word)
+            spans.append(match.span())
+            break
+        count = COUNT_RE.search(text)
+        if count:
+            value = _parse_count(count.group(1) or count.group(2))
+            if value > 0:
+                entities["count"] = value
+                spans.append(count.span())
+        return entities, spans
+
+    @staticmethod
+    def _role_covered(text: str, spans: List[Tuple[int, int]]) -> bool:
+        """去掉实体、命令词和虚词后没有剩余文字，即岗位描述完全被识别出的关键词覆盖
+
+        “帮我投递上海的产品运营岗位”只识别出“运营”，剩下“产品”；“杭州Golang岗位”剩下“Golang”。
+        """
+        covered = [False] * len(text)
+        # 逐位置尝试匹配（允许重叠：“帮我投”和“投递”都要算上）
+        matches = [m.span() for regex in (APPLY_RE, SEARCH_RE, JOB_WORD_RE, FILLER_RE)
+                   for m in (regex.match(text, i) for i in range(len(text))) if m]
+        for start, end in spans + matches:
+            covered[start:end] = [True] * (end - start)
+        return all(covered)
+
+    # ========== 分类 ==========
+
+    def _classify(self, text: str, config: Dict) -> Optional[Dict]:
+        if GREETING_RE.match(text):
+            return {"intent": "general_chat", "entities": {}, "confidence": 0.95}
+        if AMBIGUOUS_RE.search(text):
+            return None
+
+        entities, spans = self._extract(text, config)
+        # 只有岗位关键词完整覆盖了岗位描述才有把握；识别不全（如只认出“运营”）交给 LLM
+        role_covered = self._role_covered(text, spans)
+        has_target = "keyword" in entities and role_covered
+        candidates = []
+        if APPLY_RE.search(text):
+            candidates.append(("apply_job", 0.95 if has_target else 0.8))
+        if SEARCH_RE.search(text) and JOB_WORD_RE.search(text):
+            candidates.append(("search_job", 0.9 if has_target else 0.75))
+        if RESUME_RE.search(text):
+            candidates.append(("optimize_resume", 0.9))
+        if INTERVIEW_RE.search(text):
+            candidates.append(("interview_prep", 0.9))
+        # 多个意图同时出现视为有歧义
+        if len(candidates) != 1:
+            return None
+        intent, confidence = candidates[0]
+        if intent in ("apply_job", "search_job") and not role_covered:
+            return None
+        return {"intent": intent, "entities": entities, "confidence": confidence}
+
+    def classify(self, text: str, config: Dict = None) -> Optional[Dict]:
+        """规则分类；置信度达到阈值时返回与 LLM 语义理解同结构的结果，否则返回 None"""
+        start = time.perf_counter()
+        result = self._classify(text.strip(), config or {})
+        hit = result is not None and result["confidence"] >= self.threshold
+        self._record("rules", (time.perf_counter() - start) * 1000, hit)
+        if not hit:
+            return None
+        result.update({"sentiment": "neutral", "source": "rules"})
+        return result
+
+    # ========== 统计 ==========
+
+    def _record(self, tier: str, elapsed_ms: float, hit: bool = False):
+        with self._lock:
+            stats = self._stats[tier]
+            stats["calls"] += 1
+            stats["time_ms"] += elapsed_ms
+            if hit:
+                stats["hits"] += 1
+
+    def record_llm(self, elapsed_ms: float):
+        """记录一次落到 LLM 层的语义理解耗时"""
+        self._record("llm", elapsed_ms)
+
+    def stats(self) -> Dict:
+        """各层命中率与平均耗时；节省时间按 LLM 层平均耗时估算"""
+        with self._lock:
+            rules = dict(self._stats["rules"])
+            llm = dict(self._stats["llm"])
+        llm_avg = llm["time_ms"] / llm["calls"] if llm["calls"] else 0.0
+        return {
+            "rules": {
+                "calls": rules["calls"],
+                "hits": rules["hits"],
+                "hit_rate": round(rules["hits"] / rules["calls"], 4) if rules["calls"] else 0.0,
+                "avg_ms": round(rules["time_ms"] / rules["calls"], 3) if rules["calls"] else 0.0,
+            },
+            "llm": {"calls": llm["calls"], "avg_ms": round(llm_avg, 1)},
+            # 还没有 LLM 调用样本时无法估算
+            "estimated_saved_ms": round(rules["hits"] * llm_avg - rules["time_ms"], 1) if llm["calls"] else 0.0,
+        }
+
+
+# 单例实例
+intent_classifier = IntentClassifier()
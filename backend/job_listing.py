@@ -0,0 +1,135 @@
+"""
+职位列表提取 - 一次取出整页搜索结果
+├─ ListingCapture   监听搜索页发出的 joblist 接口响应，直接读 JSON
+└─ EXTRACT_JS       本页没抓到接口响应时，一次 page.evaluate 读出所有卡片
+
+两种方式都返回 JobRecord 列表，代替逐张卡片 query_selector + inner_text（每张卡片 3 次往返）。
+"""
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+from urllib.parse import urlsplit
+
+JOB_PATH = '/job_detail/{id}.html'
+# 卡片 / 接口缺字段时的占位文本（投递台账不对占位文本做指纹匹配）
+UNKNOWN_TITLE = '未知职位'
+UNKNOWN_COMPANY = '未知公司'
+JOB_LIST_API = '/search/joblist'
+
+# 当前页面上的卡片数（无限滚动加载后会增加）
+CARD_COUNT_JS = ("document.querySelectorAll('li.job-card-box').length"
+                 " || document.querySelectorAll('.job-card-wrapper').length")
+
+# 新旧两版页面的卡片选择器，按顺序取第一个有结果的
+EXTRACT_JS = r"""() => {
+    let cards = document.querySelectorAll('li.job-card-box');
+    if (!cards.length) cards = document.querySelectorAll('.job-card-wrapper');
+    return Array.from(cards).map((card, index) => {
+        const text = (sel) => { const el = card.querySelector(sel); return el ? el.innerText.trim() : ''; };
+        const link = card.querySelector('a[href*="job_detail"]');
+        const url = link ? link.href : '';
+        const match = url.match(/job_detail\/([^.?\/]+)/);
+        return {
+            index,
+            id: card.dataset.jobid || (match ? match[1] : ''),
+            title: text('.job-name, .job-title'),
+            company: text('.company-name, .info-company, .boss-name'),
+            salary: text('.salary, .job-salary'),
+            city: text('.job-area, .company-location').split('·')[0],
+            url,
+        };
+    });
+}"""
+
+
+@dataclass
+class JobRecord:
+    """搜索结果中的一个职位"""
+    id: str
+    title: str
+    company: str
+    salary: str
+    url: str
+    index: int = 0  # 在结果页中的位置（没有链接时按位置点击卡片）
+    city: str = ''
+
+    @property
+    def key(self) -> str:
+        """去重键：职位 ID，没有时用链接或位置"""
+        return self.id or self.url or f'#{self.index}'
+
+    @classmethod
+    def from_dom(cls, item: Dict) -> 'JobRecord':
+        return cls(
+            id=item.get('id') or '',
+            title=item.get('title') or UNKNOWN_TITLE,
+            company=item.get('company') or UNKNOWN_COMPANY,
+            salary=item.get('salary') or '',
+            url=item.get('url') or '',
+            index=item.get('index', 0),
+            city=item.get('city') or '',
+        )
+
+    @classmethod
+    def from_api(cls, item: Dict, index: int = 0, base_url: str = '') -> 'JobRecord':
+        job_id = item.get('encryptJobId') or ''
+        url = base_url + JOB_PATH.format(id=job_id) if job_id else ''
+        if url and item.get('securityId'):
+            url += f"?lid={item.get('lid', '')}&securityId={item['securityId']}"
+        return cls(
+            id=job_id,
+            title=item.get('jobName') or UNKNOWN_TITLE,
+            company=item.get('brandName') or UNKNOWN_COMPANY,
+            salary=item.get('salaryDesc') or '',
+            url=url,
+            index=index,
+            city=item.get('cityName') or '',
+        )
+
+
+class ListingCapture:
+    """在搜索页加载前挂上，记录 joblist 接口的响应；响应体在 take() 里再读，不在事件回调里阻塞"""
+
+    def __init__(self, page):
+        self.page = page
+        self._responses = []
+        self._taken = 0     # 已经读出的职位数，新一页的位置接着往后排（无限滚动时卡片累加）
+        page.on('response', self._on_response)
+
+    def _on_response(self, response):
+        if JOB_LIST_API in response.url:
+            self._responses.append(response)
+
+    def detach(self):
+        try:
+            self.page.remove_listener('response', self._on_response)
+        except Exception:
+            pass
+
+    def take(self) -> List[JobRecord]:
+        """读出上次 take 之后新捕获的响应里的职位（读过的响应即丢弃）；这期间没有新响应返回空列表"""
+        responses, self._responses = self._responses, []
+        records: List[JobRecord] = []
+        for response in responses:
+            try:
+                data = response.json()
+            except Exception:
+                continue
+            parts = urlsplit(response.url)
+            for item in ((data.get('zpData') or {}).get('jobList') or []):
+                records.append(JobRecord.from_api(item, self._taken + len(records), f'{parts.scheme}://{parts.netloc}'))
+        self._taken += len(records)
+        return records
+
+
+def extract_listing(page) -> List[JobRecord]:
+    """一次 evaluate 读出当前页所有职位卡片"""
+    return [JobRecord.from_dom(item) for item in page.evaluate(EXTRACT_JS)]
+
+
+def read_listing(page, capture: Optional[ListingCapture] = None):
+    """优先用本页新到的接口数据（上一页的接口数据不再使用），没有时解析页面；返回 (职位列表, 来源)"""
+    if capture is not None:
+        records = capture.take()
+        if records:
+            return records, 'api'
+    return extract_listing(page), 'dom'
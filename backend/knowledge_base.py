@@ -2,48 +2,154 @@
 个人知识库管理系统
 支持多种文档类型的存储、检索和管理
 """
-import os
 import json
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 import hashlib
 
-KNOWLEDGE_DIR = os.path.join(os.path.dirname(__file__), 'data', 'knowledge')
-os.makedirs(KNOWLEDGE_DIR, exist_ok=True)
+from storage import get_storage, SQLiteStorage
+from search_index import InvertedIndex, document_text
+from vector_index import VectorIndex, HAS_NUMPY
+from passages import SCHEMA as PASSAGE_SCHEMA, split_passages, estimate_tokens
 
 
 class KnowledgeBase:
-    """个人知识库"""
+    """个人知识库（文档存于共享 SQLite 存储的 documents 表）"""
     
     DOC_TYPES = ['note', 'resume', 'job', 'reference', 'template', 'experience']
     
-    def __init__(self):
-        self.index_file = os.path.join(KNOWLEDGE_DIR, 'index.json')
-        self._ensure_index()
+    # 语义检索的最低余弦相似度，低于此值的文档不放进 AI 上下文
+    MIN_SIMILARITY = 0.1
     
-    def _ensure_index(self):
-        if not os.path.exists(self.index_file):
-            self._save_index([])
+    # 放进 AI 上下文的段落总 token 预算，以及参与挑选的候选段落数
+    CONTEXT_TOKEN_BUDGET = 600
+    CONTEXT_CANDIDATES = 20
     
-    def _load_index(self) -> List[Dict]:
-        try:
-            with open(self.index_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
+    def __init__(self, storage: Optional[SQLiteStorage] = None, vectorizer=None):
+        self.storage = storage or get_storage()
+        self.storage.ensure_schema(PASSAGE_SCHEMA)
+        self.index = InvertedIndex(self.storage)
+        # 段落按向量检索；未安装 numpy 时退回段落级全文索引
+        if HAS_NUMPY:
+            self.vectors = VectorIndex(self.storage, vectorizer)
+            self.passage_index = None
+        else:
+            self.vectors = None
+            self.passage_index = InvertedIndex(self.storage, 'passage')
+        self._sync_index()
+    
+    def _sync_index(self):
+        """为迁移进来或索引缺失的文档补建全文索引、段落和段落向量"""
+        rows = self.storage.query('SELECT id, type, meta, content FROM documents')
+        docs = []
+        for r in rows:
+            doc = dict(json.loads(r['meta']), content=r['content'])
+            docs.append((r['id'], r['type'], doc))
+        self.index.sync([(doc_id, doc_type, document_text(doc)) for doc_id, doc_type, doc in docs])
+        
+        chunked = {r['doc_id'] for r in self.storage.query('SELECT DISTINCT doc_id FROM passages')}
+        if self.vectors is not None:
+            # 旧版本按整篇文档建的向量（key 不含 #）需要按段落重建
+            chunked &= self.vectors.indexed_doc_ids(passages_only=True)
+        missing = [d for d in docs if d[0] not in chunked]
+        if missing:
+            with self.storage.transaction():
+                self._write_passages(missing)
+        if self.passage_index is not None:
+            self.passage_index.sync(self._passage_texts())
+    
+    # ========== 段落 ==========
+    
+    def _write_passages(self, docs: List[tuple]):
+        """切分并写入段落及其索引（docs: [(id, 类型, 文档)]），替换原有段落"""
+        rows = []
+        items = []
+        for doc_id, doc_type, doc in docs:
+            self._drop_passages(doc_id)
+            chunks = split_passages(doc.get('content', '')) or [(0, '')]
+            for seq, (start, text) in enumerate(chunks):
+                rows.append((doc_id, seq, start, text, estimate_tokens(text)))
+                # 段落向量带上标题，短段落也能匹配文档主题
+                items.append((f"{doc_id}#{seq}", doc_id, doc_type, f"{doc.get('title', '')}\n{text}"))
+        self.storage.connection().executemany(
+            'INSERT INTO passages (doc_id, seq, start, text, tokens) VALUES (?, ?, ?, ?, ?)', rows)
+        if self.vectors is not None:
+            self.vectors.add(items)
+        else:
+            for key, _, doc_type, text in items:
+                self.passage_index.add_document(key, doc_type, text)
+    
+    def _drop_passages(self, doc_id: str):
+        if self.vectors is not None:
+            self.vectors.remove_doc(doc_id)
+        else:
+            for r in self.storage.query('SELECT seq FROM passages WHERE doc_id = ?', (doc_id,)):
+                self.passage_index.remove_document(f"{doc_id}#{r['seq']}")
+        self.storage.execute('DELETE FROM passages WHERE doc_id = ?', (doc_id,))
+    
+    def _passage_texts(self) -> List[tuple]:
+        """全部段落的 [(key, 类型, 标题+正文)]，供段落全文索引对账"""
+        titles = {r['id']: (r['type'], json.loads(r['meta']).get('title', ''))
+                  for r in self.storage.query('SELECT id, type, meta FROM documents')}
+        return [(f"{r['doc_id']}#{r['seq']}", titles[r['doc_id']][0], f"{titles[r['doc_id']][1]}\n{r['text']}")
+                for r in self.storage.query('SELECT doc_id, seq, text FROM passages') if r['doc_id'] in titles]
+    
+    def get_passages(self, doc_id: str, seqs: List[int] = None) -> List[Dict]:
+        """按需读取文档段落（不读整篇正文），按顺序返回"""
+        sql = 'SELECT seq, start, text, tokens FROM passages WHERE doc_id = ?'
+        params: tuple = (doc_id,)
+        if seqs is not None:
+            if not seqs:
+                return []
+            sql += f" AND seq IN ({','.join('?' * len(seqs))})"
+            params += tuple(seqs)
+        rows = self.storage.query(sql + ' ORDER BY seq', params)
+        return [dict(r) for r in rows]
+    
+    def _search_passages(self, query: str, doc_type: str = None, limit: int = 20) -> List[tuple]:
+        """段落检索，返回按得分降序的 [(doc_id, seq, score)]"""
+        if self.vectors is not None:
+            hits = [(key, score) for key, _, score in
+                    self.vectors.search(query, limit, doc_type, min_score=self.MIN_SIMILARITY)]
+        else:
+            hits = self.passage_index.search(query, doc_type, limit)
+        results = []
+        for key, score in hits:
+            doc_id, _, seq = key.rpartition('#')
+            if doc_id:
+                results.append((doc_id, int(seq), score))
+        return results
     
-    def _save_index(self, index: List[Dict]):
-        with open(self.index_file, 'w', encoding='utf-8') as f:
-            json.dump(index, f, ensure_ascii=False, indent=2)
+    def _metas(self, ids: List[str]) -> Dict[str, Dict]:
+        placeholders = ','.join('?' * len(ids))
+        rows = self.storage.query(f'SELECT id, meta FROM documents WHERE id IN ({placeholders})', tuple(ids))
+        return {r['id']: json.loads(r['meta']) for r in rows}
     
-    def _get_doc_path(self, doc_id: str) -> str:
-        return os.path.join(KNOWLEDGE_DIR, f"{doc_id}.json")
+    @staticmethod
+    def _summarize(content: str) -> str:
+        return content[:100] + "..." if len(content) > 100 else content
+    
+    def _load_index(self, doc_type: str = None, limit: int = None) -> List[Dict]:
+        """读取文档元数据（不含正文），最新的在前；解析结果走存储层读缓存"""
+        def load():
+            sql = 'SELECT meta FROM documents'
+            params: tuple = ()
+            if doc_type:
+                sql += ' WHERE type = ?'
+                params += (doc_type,)
+            sql += ' ORDER BY seq DESC'
+            if limit:
+                sql += ' LIMIT ?'
+                params += (limit,)
+            return [json.loads(r['meta']) for r in self.storage.query(sql, params)]
+        return [dict(meta) for meta in self.storage.cached(('documents', doc_type, limit), load)]
     
     def add_document(self, 
                      title: str, 
                      content: str, 
                      doc_type: str = 'note',
-                     tags: List[str] = None) -> Dict:
+                     tags: List[str] = None,
+                     metadata: Dict[str, Any] = None) -> Dict:
         """添加文档"""
         if doc_type not in self.DOC_TYPES:
             doc_type = 'note'
@@ -59,113 +165,160 @@ class KnowledgeBase:
             "created_at": datetime.now().isoformat(),
             "updated_at": datetime.now().isoformat(),
             "word_count": len(content),
-            "summary": content[:100] + "..." if len(content) > 100 else content
+            "summary": self._summarize(content)
         }
+        if metadata:
+            doc["metadata"] = metadata
         
-        # 保存文档内容
-        with open(self._get_doc_path(doc_id), 'w', encoding='utf-8') as f:
-            json.dump(doc, f, ensure_ascii=False, indent=2)
-        
-        # 更新索引
-        index = self._load_index()
-        index_entry = {k: v for k, v in doc.items() if k != 'content'}
-        index.insert(0, index_entry)
-        self._save_index(index)
+        meta = {k: v for k, v in doc.items() if k != 'content'}
+        with self.storage.transaction():
+            self.storage.execute('INSERT INTO documents (id, type, meta, content) VALUES (?, ?, ?, ?)',
+                                 (doc_id, doc_type, json.dumps(meta, ensure_ascii=False), content))
+            self.index.add_document(doc_id, doc_type, document_text(doc))
+            self._write_passages([(doc_id, doc_type, doc)])
         
         return doc
     
-    def get_document(self, doc_id: str) -> Optional[Dict]:
-        """获取文档详情"""
-        doc_path = self._get_doc_path(doc_id)
-        if os.path.exists(doc_path):
-            with open(doc_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return None
+    def get_document(self, doc_id: str, include_content: bool = False, seqs: List[int] = None) -> Optional[Dict]:
+        """获取文档；默认只读元数据，不读整篇正文
+
+        seqs：同时按需带上这些段落（doc['passages']），只需要上下文的调用方用它代替整篇正文；
+        include_content=True：读整篇正文（编辑文档、前端详情页）。
+        """
+        if not include_content:
+            row = self.storage.query_one('SELECT meta FROM documents WHERE id = ?', (doc_id,))
+            if row is None:
+                return None
+            doc = json.loads(row['meta'])
+            if seqs is not None:
+                doc['passages'] = self.get_passages(doc_id, seqs)
+            return doc
+        row = self.storage.query_one('SELECT meta, content FROM documents WHERE id = ?', (doc_id,))
+        if row is None:
+            return None
+        doc = json.loads(row['meta'])
+        doc['content'] = row['content']
+        return doc
     
-    def list_documents(self, doc_type: str = None, limit: int = 50) -> List[Dict]:
+    def list_documents(self, doc_type: str = None, tag: str = None, limit: int = 50) -> List[Dict]:
         """列出文档"""
-        index = self._load_index()
-        
-        if doc_type:
-            index = [d for d in index if d.get('type') == doc_type]
+        if not tag:
+            return self._load_index(doc_type, limit)
         
-        return index[:limit]
+        docs = [d for d in self._load_index(doc_type) if tag in d.get('tags', [])]
+        return docs[:limit]
     
     def update_document(self, doc_id: str, updates: Dict) -> bool:
         """更新文档"""
-        doc = self.get_document(doc_id)
-        if not doc:
-            return False
-        
-        # 更新文档
-        for key in ['title', 'content', 'tags']:
-            if key in updates:
-                doc[key] = updates[key]
-        
-        doc['updated_at'] = datetime.now().isoformat()
-        doc['word_count'] = len(doc.get('content', ''))
-        doc['summary'] = doc['content'][:100] + "..." if len(doc.get('content', '')) > 100 else doc.get('content', '')
-        
-        # 保存
-        with open(self._get_doc_path(doc_id), 'w', encoding='utf-8') as f:
-            json.dump(doc, f, ensure_ascii=False, indent=2)
-        
-        # 更新索引
-        index = self._load_index()
-        for i, entry in enumerate(index):
-            if entry['id'] == doc_id:
-                index[i] = {k: v for k, v in doc.items() if k != 'content'}
-                break
-        self._save_index(index)
+        with self.storage.transaction():
+            doc = self.get_document(doc_id, include_content=True)
+            if not doc:
+                return False
+            
+            # 更新文档
+            for key in ['title', 'content', 'tags']:
+                if key in updates:
+                    doc[key] = updates[key]
+            
+            content = doc.get('content', '')
+            doc['updated_at'] = datetime.now().isoformat()
+            doc['word_count'] = len(content)
+            doc['summary'] = self._summarize(content)
+            
+            meta = {k: v for k, v in doc.items() if k != 'content'}
+            self.storage.execute('UPDATE documents SET meta = ?, content = ? WHERE id = ?',
+                                 (json.dumps(meta, ensure_ascii=False), content, doc_id))
+            self.index.update_document(doc_id, doc['type'], document_text(doc))
+            if 'title' in updates or 'content' in updates:
+                self._write_passages([(doc_id, doc['type'], doc)])
         
         return True
     
     def delete_document(self, doc_id: str) -> bool:
         """删除文档"""
-        doc_path = self._get_doc_path(doc_id)
-        
-        if os.path.exists(doc_path):
-            os.remove(doc_path)
-        
-        index = self._load_index()
-        original_len = len(index)
-        index = [d for d in index if d['id'] != doc_id]
-        
-        if len(index) < original_len:
-            self._save_index(index)
-            return True
-        return False
-    
-    def search(self, query: str, doc_type: str = None) -> List[Dict]:
-        """搜索文档"""
-        index = self._load_index()
-        query_lower = query.lower()
+        with self.storage.transaction():
+            cur = self.storage.execute('DELETE FROM documents WHERE id = ?', (doc_id,))
+            self.index.remove_document(doc_id)
+            self._drop_passages(doc_id)
+        return cur.rowcount > 0
+    
+    def get_all_tags(self) -> Dict[str, int]:
+        """所有标签及其文档数"""
+        tags: Dict[str, int] = {}
+        for doc in self._load_index():
+            for tag in doc.get('tags', []):
+                tags[tag] = tags.get(tag, 0) + 1
+        return tags
+    
+    def get_statistics(self) -> Dict:
+        """知识库统计"""
+        rows = self.storage.query('SELECT type, COUNT(*) AS n, SUM(LENGTH(content)) AS chars '
+                                  'FROM documents GROUP BY type')
+        return {
+            "total_documents": sum(r['n'] for r in rows),
+            "total_words": sum(r['chars'] or 0 for r in rows),
+            "by_type": {r['type']: r['n'] for r in rows}
+        }
+    
+    def search(self, query: str, doc_type: str = None, limit: int = 10) -> List[Dict]:
+        """全文搜索（BM25 排序），返回带 score 的文档元数据"""
+        if not query.strip():
+            return self.list_documents(doc_type, limit=limit)
         
-        results = []
-        for doc in index:
-            if doc_type and doc.get('type') != doc_type:
-                continue
-            
-            # 搜索标题、摘要、标签
-            if (query_lower in doc.get('title', '').lower() or
-                query_lower in doc.get('summary', '').lower() or
-                any(query_lower in tag.lower() for tag in doc.get('tags', []))):
-                results.append(doc)
+        ranked = self.index.search(query, doc_type, limit)
+        if not ranked:
+            return []
         
-        return results
+        metas = self._metas([doc_id for doc_id, _ in ranked])
+        return [dict(metas[doc_id], score=round(score, 4)) for doc_id, score in ranked if doc_id in metas]
     
-    def get_context_for_ai(self, query: str, doc_type: str = None) -> str:
-        """获取相关文档作为 AI 上下文"""
-        results = self.search(query, doc_type)
+    def semantic_search(self, query: str, doc_type: str = None, limit: int = 5) -> List[Dict]:
+        """段落级语义检索，每篇文档取最相关段落的得分；未安装 numpy 时按段落全文检索"""
+        best: Dict[str, float] = {}
+        for doc_id, _, score in self._search_passages(query, doc_type, limit * 4):
+            if doc_id not in best:
+                best[doc_id] = score
+                if len(best) >= limit:
+                    break
+        if not best:
+            return []
         
-        if not results:
+        metas = self._metas(list(best))
+        return [dict(metas[doc_id], score=round(score, 4)) for doc_id, score in best.items() if doc_id in metas]
+    
+    def get_context_for_ai(self, query: str, doc_type: str = None, token_budget: int = None) -> str:
+        """在 token 预算内挑选最相关的段落作为 AI 上下文，按文档分组"""
+        budget = token_budget or self.CONTEXT_TOKEN_BUDGET
+        hits = self._search_passages(query, doc_type, self.CONTEXT_CANDIDATES)
+        if not hits:
             return ""
         
+        by_doc: Dict[str, List[int]] = {}
+        for doc_id, seq, _ in hits:
+            by_doc.setdefault(doc_id, []).append(seq)
+        loaded = {(doc_id, p['seq']): p for doc_id, seqs in by_doc.items()
+                  for p in self.get_passages(doc_id, seqs)}
+        metas = self._metas(list(by_doc))
+        
+        # 按得分贪心装入，放不下的段落跳过，继续尝试更短的
+        chosen: Dict[str, List[Dict]] = {}
+        used = 0
+        for doc_id, seq, _ in hits:
+            passage = loaded.get((doc_id, seq))
+            if not passage or not passage['text'] or doc_id not in metas:
+                continue
+            cost = passage['tokens']
+            if doc_id not in chosen:
+                cost += estimate_tokens(metas[doc_id].get('title', '')) + 2
+            if used + cost > budget:
+                continue
+            chosen.setdefault(doc_id, []).append(passage)
+            used += cost
+        
         context_parts = []
-        for doc in results[:3]:  # 最多3个
-            full_doc = self.get_document(doc['id'])
-            if full_doc:
-                context_parts.append(f"【{doc['title']}】\n{full_doc.get('content', '')[:500]}")
+        for doc_id, picked in chosen.items():
+            picked.sort(key=lambda p: p['seq'])
+            context_parts.append(f"【{metas[doc_id]['title']}】\n" + "\n……\n".join(p['text'] for p in picked))
         
         return "\n\n".join(context_parts)
 
@@ -0,0 +1,175 @@
+"""
+LLM 响应缓存 - 相同请求直接返回上次的回复
+缓存键：规范化后的消息列表（角色小写、空白折叠）+ 模型 + 温度 + 其他生成参数，取 SHA-256。
+
+两层：
+├─ 内存 LRU（有上限，带 TTL）
+└─ SQLite 表 llm_cache（可选，进程重启和多进程间共享）
+
+温度高于 MAX_CACHE_TEMPERATURE 的请求结果带随机性，默认不缓存，调用方可显式开启。
+
+环境变量：
+├─ CAREERPILOT_LLM_CACHE_SIZE   内存条目上限（默认 512）
+├─ CAREERPILOT_LLM_CACHE_TTL    过期秒数（默认 3600）
+└─ CAREERPILOT_LLM_CACHE_DISK   设为 1 启用 SQLite 层
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Callable
+
+MAX_CACHE_TEMPERATURE = 0.3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_messages(messages: List[Dict]) -> List[Dict]:
+    """去掉首尾空白、折叠连续空白，角色统一小写"""
+    return [{"role": str(m.get("role", "user")).lower(),
+             "content": WHITESPACE_RE.sub(' ', str(m.get("content", ""))).strip()}
+            for m in messages]
+
+
+class LLMCache:
+    """内存 LRU + 可选 SQLite 的 LLM 回复缓存"""
+
+    def __init__(self, maxsize: int = None, ttl: float = None, disk: bool = None, storage=None):
+        self.maxsize = maxsize or int(os.getenv('CAREERPILOT_LLM_CACHE_SIZE', 512))
+        self.ttl = ttl or float(os.getenv('CAREERPILOT_LLM_CACHE_TTL', 3600))
+        self.disk = os.getenv('CAREERPILOT_LLM_CACHE_DISK', '0') == '1' if disk is None else disk
+        self._storage = storage
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()  # key -> (过期时间, 回复)
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "skipped": 0}
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            from storage import get_storage
+            self._storage = get_storage()
+            self._storage.ensure_schema(SCHEMA)
+        return self._storage
+
+    # ========== 缓存键 ==========
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict], temperature: float = None, **params) -> str:
+        payload = {
+            "model": model,
+            "temperature": temperature,
+            "messages": normalize_messages(messages),
+            "params": {k: v for k, v in sorted(params.items()) if v is not None},
+        }
+        raw = json.dumps(payload, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def should_cache(self, temperature: Optional[float], cache: Optional[bool] = None) -> bool:
+        """cache 显式指定时以其为准，否则只缓存低温度请求"""
+        if cache is not None:
+            allowed = cache
+        else:
+            allowed = temperature is not None and temperature <= MAX_CACHE_TEMPERATURE
+        if not allowed:
+            with self._lock:
+                self._counters["skipped"] += 1
+        return allowed
+
+    # ========== 读写 ==========
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._counters["memory_hits"] += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.disk:
+            row = self.storage.query_one('SELECT value, expires FROM llm_cache WHERE key = ?', (key,))
+            if row is not None and row['expires'] > now:
+                with self._lock:
+                    self._remember(key, row['value'], row['expires'])
+                    self._counters["disk_hits"] += 1
+                return row['value']
+
+        with self._lock:
+            self._counters["misses"] += 1
+        return None
+
+    def put(self, key: str, value: str):
+        if not value:
+            return
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires)
+        if self.disk:
+            self.storage.execute('INSERT OR REPLACE INTO llm_cache (key, value, expires) VALUES (?, ?, ?)',
+                                 (key, value, expires))
+
+    def _remember(self, key: str, value: str, expires: float):
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk:
+            self.storage.execute('DELETE FROM llm_cache')
+
+    def purge_expired(self) -> int:
+        """清理 SQLite 层的过期条目，返回删除数"""
+        if not self.disk:
+            return 0
+        return self.storage.execute('DELETE FROM llm_cache WHERE expires <= ?', (time.time(),)).rowcount
+
+    # ========== 统计 ==========
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self._counters)
+            size = len(self._entries)
+        lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+        hits = counters["memory_hits"] + counters["disk_hits"]
+        return dict(counters, hits=hits, hit_rate=round(hits / lookups, 4) if lookups else 0.0,
+                    size=size, maxsize=self.maxsize, ttl=self.ttl, disk=self.disk)
+
+
+def cached_completion(client, model: str, messages: List[Dict], temperature: float = None,
+                      cache: Optional[bool] = None, validate: Callable[[str], bool] = None, **params) -> str:
+    """带缓存的 chat.completions 调用，返回回复文本；validate 不通过的回复不写入缓存"""
+    key = None
+    if llm_cache.should_cache(temperature, cache):
+        key = llm_cache.make_key(model, messages, temperature, endpoint=str(getattr(client, 'base_url', '')), **params)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+    kwargs = dict(params)
+    if temperature is not None:
+        kwargs['temperature'] = temperature
+    response = client.chat.completions.create(model=model, messages=messages, **kwargs)
+    content = response.choices[0].message.content or ''
+    if key is not None and (validate is None or validate(content)):
+        llm_cache.put(key, content)
+    return content
+
+
+# 单例实例
+llm_cache = LLMCache()
@@ -0,0 +1,80 @@
+"""
+LLM 客户端池 - 进程内按 (base_url, api_key) 复用客户端
+每个客户端持有一个 httpx 连接池，keep-alive 连接跨请求复用，
+省去每次调用新建连接池、TCP/TLS 握手的开销。
+
+连接池参数可用环境变量调整：
+├─ CAREERPILOT_LLM_MAX_CONNECTIONS   最大连接数（默认 20）
+├─ CAREERPILOT_LLM_MAX_KEEPALIVE     最大空闲 keep-alive 连接数（默认 10）
+├─ CAREERPILOT_LLM_KEEPALIVE_EXPIRY  空闲连接保留秒数（默认 60）
+├─ CAREERPILOT_LLM_TIMEOUT           读超时秒数（默认 60）
+├─ CAREERPILOT_LLM_CONNECT_TIMEOUT   建连超时秒数（默认 10）
+└─ CAREERPILOT_LLM_MAX_RETRIES       SDK 自动重试次数（默认 2）
+"""
+import os
+import atexit
+import threading
+from typing import Dict, Tuple, Optional
+
+import httpx
+import openai
+
+POOL_LIMITS = {
+    'max_connections': int(os.getenv('CAREERPILOT_LLM_MAX_CONNECTIONS', 20)),
+    'max_keepalive_connections': int(os.getenv('CAREERPILOT_LLM_MAX_KEEPALIVE', 10)),
+    'keepalive_expiry': float(os.getenv('CAREERPILOT_LLM_KEEPALIVE_EXPIRY', 60)),
+}
+READ_TIMEOUT = float(os.getenv('CAREERPILOT_LLM_TIMEOUT', 60))
+CONNECT_TIMEOUT = float(os.getenv('CAREERPILOT_LLM_CONNECT_TIMEOUT', 10))
+MAX_RETRIES = int(os.getenv('CAREERPILOT_LLM_MAX_RETRIES', 2))
+
+_lock = threading.Lock()
+_clients: Dict[Tuple[str, Optional[str], str], object] = {}
+
+
+def _http_client() -> httpx.Client:
+    return httpx.Client(
+        limits=httpx.Limits(**POOL_LIMITS),
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        follow_redirects=True,
+    )
+
+
+def get_openai_client(api_key: str, base_url: Optional[str] = None) -> openai.OpenAI:
+    """OpenAI 兼容客户端（DeepSeek 等），同一 (base_url, api_key) 全进程共享；base_url 为空时用 SDK 默认地址"""
+    key = ('openai', base_url, api_key)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = openai.OpenAI(api_key=api_key, base_url=base_url,
+                                                   max_retries=MAX_RETRIES, http_client=_http_client())
+        return client
+
+
+def get_anthropic_client(api_key: str, base_url: Optional[str] = None):
+    """Anthropic 客户端，同样按 (base_url, api_key) 复用"""
+    import anthropic
+
+    key = ('anthropic', base_url, api_key)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            kwargs = {'base_url': base_url} if base_url else {}
+            client = _clients[key] = anthropic.Anthropic(api_key=api_key, max_retries=MAX_RETRIES,
+                                                         http_client=_http_client(), **kwargs)
+        return client
+
+
+def close_clients():
+    """关闭所有连接池（进程退出时自动调用）"""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+
+atexit.register(close_clients)
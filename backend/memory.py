@@ -2,45 +2,22 @@
 长期记忆系统 - 用户偏好、习惯与上下文记忆
 支持 DeepSeek + Agent 双重架构
 """
-import os
-import json
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 import hashlib
 
-MEMORY_DIR = os.path.join(os.path.dirname(__file__), 'data', 'memory')
-CONVERSATIONS_DIR = os.path.join(os.path.dirname(__file__), 'data', 'conversations')
-
-os.makedirs(MEMORY_DIR, exist_ok=True)
-os.makedirs(CONVERSATIONS_DIR, exist_ok=True)
+from conversation_store import SQLiteConversationStore
+from storage import get_storage, SQLiteStorage
 
 
 class ConversationManager:
-    """会话管理器 - 管理历史会话"""
-    
-    def __init__(self):
-        self.conversations_file = os.path.join(CONVERSATIONS_DIR, 'conversations.json')
-        self._ensure_file()
-    
-    def _ensure_file(self):
-        if not os.path.exists(self.conversations_file):
-            self._save_conversations([])
+    """会话管理器 - 管理历史会话（存储引擎可替换，见 conversation_store）"""
     
-    def _load_conversations(self) -> List[Dict]:
-        try:
-            with open(self.conversations_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    
-    def _save_conversations(self, conversations: List[Dict]):
-        with open(self.conversations_file, 'w', encoding='utf-8') as f:
-            json.dump(conversations, f, ensure_ascii=False, indent=2)
+    def __init__(self, store=None):
+        self.store = store or SQLiteConversationStore(get_storage())
     
     def create_conversation(self, title: str = "新对话") -> Dict:
         """创建新会话"""
-        conversations = self._load_conversations()
-        
         conv_id = hashlib.md5(f"{datetime.now().timestamp()}".encode()).hexdigest()[:12]
         
         new_conv = {
@@ -48,28 +25,25 @@ class ConversationManager:
             "title": title,
             "created_at": datetime.now().isoformat(),
             "updated_at": datetime.now().isoformat(),
-            "messages": [],
             "summary": "",
             "tags": []
         }
         
-        conversations.insert(0, new_conv)
-        self._save_conversations(conversations)
+        self.store.create(new_conv)
         
-        return new_conv
+        return {**new_conv, "messages": []}
     
     def get_conversation(self, conv_id: str) -> Optional[Dict]:
         """获取指定会话"""
-        conversations = self._load_conversations()
-        for conv in conversations:
-            if conv['id'] == conv_id:
-                return conv
-        return None
+        header = self.store.get_header(conv_id)
+        if header is None:
+            return None
+        header.pop('message_count', None)
+        header['messages'] = self.store.get_messages(conv_id)
+        return header
     
     def list_conversations(self, limit: int = 50) -> List[Dict]:
-        """列出所有会话"""
-        conversations = self._load_conversations()
-        # 返回简要信息，不含完整消息
+        """列出所有会话（只读会话头，不含完整消息）"""
         return [{
             "id": c['id'],
             "title": c['title'],
@@ -77,177 +51,118 @@ class ConversationManager:
             "updated_at": c['updated_at'],
             "summary": c.get('summary', ''),
             "tags": c.get('tags', []),
-            "message_count": len(c.get('messages', []))
-        } for c in conversations[:limit]]
+            "message_count": c.get('message_count', 0)
+        } for c in self.store.list_headers(limit)]
     
     def add_message(self, conv_id: str, role: str, content: str) -> bool:
-        """添加消息到会话"""
-        conversations = self._load_conversations()
+        """添加消息到会话（O(1) 追加）"""
+        header = self.store.get_header(conv_id)
+        if header is None:
+            return False
+        
+        message = {
+            "id": hashlib.md5(f"{datetime.now().timestamp()}".encode()).hexdigest()[:8],
+            "role": role,
+            "content": content,
+            "timestamp": datetime.now().isoformat()
+        }
+        header_updates = {"updated_at": datetime.now().isoformat()}
         
-        for conv in conversations:
-            if conv['id'] == conv_id:
-                conv['messages'].append({
-                    "id": hashlib.md5(f"{datetime.now().timestamp()}".encode()).hexdigest()[:8],
-                    "role": role,
-                    "content": content,
-                    "timestamp": datetime.now().isoformat()
-                })
-                conv['updated_at'] = datetime.now().isoformat()
-                
-                # 自动更新标题（基于第一条用户消息）
-                if len(conv['messages']) == 1 and role == 'user':
-                    conv['title'] = content[:30] + ('...' if len(content) > 30 else '')
-                
-                self._save_conversations(conversations)
-                return True
+        # 自动更新标题（基于第一条用户消息）
+        if header.get('message_count', 0) == 0 and role == 'user':
+            header_updates['title'] = content[:30] + ('...' if len(content) > 30 else '')
         
-        return False
+        return self.store.append_message(conv_id, message, header_updates) is not None
     
     def update_conversation(self, conv_id: str, updates: Dict) -> bool:
         """更新会话信息"""
-        conversations = self._load_conversations()
-        
-        for conv in conversations:
-            if conv['id'] == conv_id:
-                conv.update(updates)
-                conv['updated_at'] = datetime.now().isoformat()
-                self._save_conversations(conversations)
-                return True
-        
-        return False
+        return self.store.update(conv_id, {**updates, 'updated_at': datetime.now().isoformat()})
     
     def delete_conversation(self, conv_id: str) -> bool:
         """删除会话"""
-        conversations = self._load_conversations()
-        original_len = len(conversations)
-        conversations = [c for c in conversations if c['id'] != conv_id]
-        
-        if len(conversations) < original_len:
-            self._save_conversations(conversations)
-            return True
-        return False
+        return self.store.delete(conv_id)
     
     def get_recent_messages(self, conv_id: str, limit: int = 10) -> List[Dict]:
-        """获取最近的消息"""
-        conv = self.get_conversation(conv_id)
-        if conv:
-            return conv.get('messages', [])[-limit:]
-        return []
+        """获取最近的消息（只解析日志末尾）"""
+        return self.store.get_messages(conv_id, limit)
     
     def get_messages(self, conv_id: str) -> List[Dict]:
         """获取会话的所有消息"""
-        conv = self.get_conversation(conv_id)
-        if conv:
-            return conv.get('messages', [])
-        return []
+        return self.store.get_messages(conv_id)
 
 
 class MemorySystem:
-    """长期记忆系统 - 用户偏好与习惯"""
-    
-    def __init__(self):
-        self.memory_file = os.path.join(MEMORY_DIR, 'long_term_memory.json')
-        self.context_file = os.path.join(MEMORY_DIR, 'context_memory.json')
-        self._ensure_files()
-    
-    def _ensure_files(self):
-        for f in [self.memory_file, self.context_file]:
-            if not os.path.exists(f):
-                with open(f, 'w', encoding='utf-8') as file:
-                    json.dump({}, file)
-    
-    def _load_memory(self, file_path: str) -> Dict:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
-    
-    def _save_memory(self, file_path: str, data: Dict):
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+    """长期记忆系统 - 用户偏好与习惯
+    
+    每条记忆是 kv 表中的一行：长期记忆命名空间为 memory:<分类>，上下文为 context
+    """
+    
+    CONTEXT_NS = 'context'
+    
+    def __init__(self, storage: Optional[SQLiteStorage] = None):
+        self.storage = storage or get_storage()
+    
+    @staticmethod
+    def _ns(category: str) -> str:
+        return f"memory:{category}"
     
     # ========== 长期记忆 ==========
     
     def remember(self, key: str, value: Any, category: str = "general"):
         """存储长期记忆"""
-        memory = self._load_memory(self.memory_file)
-        
-        if category not in memory:
-            memory[category] = {}
-        
-        memory[category][key] = {
+        self.storage.kv_set(self._ns(category), key, {
             "value": value,
             "created_at": datetime.now().isoformat(),
             "access_count": 0
-        }
-        
-        self._save_memory(self.memory_file, memory)
+        })
     
     def recall(self, key: str, category: str = "general") -> Optional[Any]:
         """回忆长期记忆"""
-        memory = self._load_memory(self.memory_file)
-        
-        if category in memory and key in memory[category]:
+        with self.storage.transaction():
+            item = self.storage.kv_get(self._ns(category), key)
+            if item is None:
+                return None
             # 增加访问计数
-            memory[category][key]['access_count'] += 1
-            memory[category][key]['last_accessed'] = datetime.now().isoformat()
-            self._save_memory(self.memory_file, memory)
-            return memory[category][key]['value']
-        
-        return None
+            item['access_count'] = item.get('access_count', 0) + 1
+            item['last_accessed'] = datetime.now().isoformat()
+            self.storage.kv_set(self._ns(category), key, item)
+        return item['value']
     
     def get_all_memories(self, category: Optional[str] = None) -> Dict:
         """获取所有记忆"""
-        memory = self._load_memory(self.memory_file)
-        
         if category:
-            return memory.get(category, {})
-        return memory
+            return self.storage.kv_items(self._ns(category))
+        return {ns[len('memory:'):]: items for ns, items in self.storage.kv_namespaces('memory:').items()}
     
     def forget(self, key: str, category: str = "general") -> bool:
         """删除记忆"""
-        memory = self._load_memory(self.memory_file)
-        
-        if category in memory and key in memory[category]:
-            del memory[category][key]
-            self._save_memory(self.memory_file, memory)
-            return True
-        return False
+        return self.storage.kv_delete(self._ns(category), key)
     
     # ========== 上下文记忆 ==========
     
     def set_context(self, key: str, value: Any, ttl_hours: int = 24):
         """设置上下文（短期记忆，有过期时间）"""
-        context = self._load_memory(self.context_file)
-        
-        context[key] = {
+        self.storage.kv_set(self.CONTEXT_NS, key, {
             "value": value,
             "created_at": datetime.now().isoformat(),
             "expires_at": (datetime.now().timestamp() + ttl_hours * 3600)
-        }
-        
-        self._save_memory(self.context_file, context)
+        })
     
     def get_context(self, key: str) -> Optional[Any]:
         """获取上下文"""
-        context = self._load_memory(self.context_file)
-        
-        if key in context:
-            item = context[key]
-            # 检查是否过期
-            if item.get('expires_at', 0) > datetime.now().timestamp():
-                return item['value']
-            else:
-                # 已过期，删除
-                del context[key]
-                self._save_memory(self.context_file, context)
-        
+        item = self.storage.kv_get(self.CONTEXT_NS, key)
+        if item is None:
+            return None
+        # 检查是否过期
+        if item.get('expires_at', 0) > datetime.now().timestamp():
+            return item['value']
+        # 已过期，删除
+        self.storage.kv_delete(self.CONTEXT_NS, key)
         return None
     
     def get_all_context(self) -> Dict:
         """获取所有有效上下文"""
-        context = self._load_memory(self.context_file)
+        context = self.storage.kv_items(self.CONTEXT_NS)
         now = datetime.now().timestamp()
         
         # 过滤过期的
@@ -258,13 +173,13 @@ class MemorySystem:
     
     def clear_expired_context(self):
         """清理过期上下文"""
-        context = self._load_memory(self.context_file)
+        context = self.storage.kv_items(self.CONTEXT_NS)
         now = datetime.now().timestamp()
         
-        valid = {k: v for k, v in context.items() 
-                 if v.get('expires_at', 0) > now}
-        
-        self._save_memory(self.context_file, valid)
+        with self.storage.transaction():
+            for k, v in context.items():
+                if v.get('expires_at', 0) <= now:
+                    self.storage.kv_delete(self.CONTEXT_NS, k)
     
     # ========== 用户偏好 ==========
     
@@ -286,34 +201,29 @@ class MemorySystem:
     
     def learn_habit(self, action: str, details: Dict):
         """学习用户习惯"""
-        memory = self._load_memory(self.memory_file)
-        
-        if "habits" not in memory:
-            memory["habits"] = {}
-        
-        if action not in memory["habits"]:
-            memory["habits"][action] = {
+        ns = self._ns("habits")
+        with self.storage.transaction():
+            habit = self.storage.kv_get(ns, action) or {
                 "count": 0,
                 "details": [],
                 "first_seen": datetime.now().isoformat()
             }
-        
-        memory["habits"][action]["count"] += 1
-        memory["habits"][action]["last_seen"] = datetime.now().isoformat()
-        memory["habits"][action]["details"].append({
-            **details,
-            "timestamp": datetime.now().isoformat()
-        })
-        
-        # 只保留最近20条
-        memory["habits"][action]["details"] = memory["habits"][action]["details"][-20:]
-        
-        self._save_memory(self.memory_file, memory)
+            
+            habit["count"] += 1
+            habit["last_seen"] = datetime.now().isoformat()
+            habit["details"].append({
+                **details,
+                "timestamp": datetime.now().isoformat()
+            })
+            
+            # 只保留最近20条
+            habit["details"] = habit["details"][-20:]
+            
+            self.storage.kv_set(ns, action, habit)
     
     def get_habits(self) -> Dict:
         """获取用户习惯"""
-        memory = self._load_memory(self.memory_file)
-        return memory.get("habits", {})
+        return self.get_all_memories(category="habits")
     
     # ========== 智能摘要 ==========
     
@@ -0,0 +1,162 @@
+"""
+本地模拟 OpenAI 兼容接口 - 离线压测 LLM 调用链路
+只实现 /chat/completions，按固定延迟返回预置回复（stream=true 时按 SSE 逐段推送），
+支持 HTTP/1.1 keep-alive。
+
+用法：
+    python mock_llm_server.py serve [--port 8765] [--latency 0.05]
+    python mock_llm_server.py bench [-n 50] [--latency 0.05]
+
+把配置中的 deepseekBaseUrl 指向 http://127.0.0.1:8765/v1 即可让 Agent 走本地模拟服务。
+bench 对比「每次新建客户端」与「共享连接池客户端」的平均耗时（本地无 TLS，
+真实环境下省去的握手开销更大）。
+"""
+import sys
+import json
+import time
+import uuid
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8765
+
+# 语义理解请求（要求返回 JSON）的预置回复
+INTENT_REPLY = json.dumps({
+    "intent": "search_job",
+    "entities": {"keyword": "Python", "city": "北京", "count": "5"},
+    "sentiment": "neutral",
+    "confidence": 0.9
+}, ensure_ascii=False)
+CHAT_REPLY = "这是本地模拟服务的回复。"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # 保持连接，便于验证连接复用
+    disable_nagle_algorithm = True  # 头和正文分两次写出，避免 Nagle 与延迟确认叠加出 40ms 停顿
+    latency = 0.05
+    token_interval = 0.01  # 流式输出相邻两段的间隔（秒）
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def _send_stream(self, model: str, content: str):
+        """按 OpenAI 流式格式逐段推送（分块传输编码，连接可复用）"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        chunk_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        pieces = [content[i:i + 2] for i in range(0, len(content), 2)]
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(self.token_interval)
+            payload = {"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": model, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self._write_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b'0\r\n\r\n')
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {"object": "list", "data": [{"id": "deepseek-chat", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            request = {}
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        time.sleep(self.latency)
+        messages = request.get('messages') or [{}]
+        wants_json = 'JSON' in str(messages[0].get('content', ''))
+        if (request.get('response_format') or {}).get('type') == 'json_object':
+            # 合并调用：意图与回复一起返回
+            content = json.dumps(dict(json.loads(INTENT_REPLY), reply=CHAT_REPLY), ensure_ascii=False)
+        else:
+            content = INTENT_REPLY if wants_json else CHAT_REPLY
+        if request.get('stream'):
+            self._send_stream(request.get('model', 'deepseek-chat'), content)
+            return
+        self._send_json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get('model', 'deepseek-chat'),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        })
+
+
+def start_server(port: int = DEFAULT_PORT, latency: float = 0.05) -> ThreadingHTTPServer:
+    """后台线程启动模拟服务（port=0 时随机端口），返回 server"""
+    handler = type('Handler', (MockHandler,), {'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench(base_url: str, n: int = 50):
+    """对比每次新建客户端与共享连接池客户端的平均调用耗时"""
+    import openai
+    from llm_client import get_openai_client
+
+    messages = [{"role": "user", "content": "你好"}]
+
+    def run(get_client) -> float:
+        start = time.perf_counter()
+        for _ in range(n):
+            get_client().chat.completions.create(model="deepseek-chat", messages=messages)
+        return (time.perf_counter() - start) / n * 1000
+
+    fresh = run(lambda: openai.OpenAI(api_key='mock', base_url=base_url))
+    pooled = run(lambda: get_openai_client('mock', base_url))
+    print(f"每次新建客户端: {fresh:.2f} ms/次")
+    print(f"共享连接池:     {pooled:.2f} ms/次")
+    print(f"节省:           {fresh - pooled:.2f} ms/次")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟 OpenAI 兼容接口')
+    parser.add_argument('command', choices=['serve', 'bench'])
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--latency', type=float, default=0.05, help='每次请求的模拟延迟（秒）')
+    parser.add_argument('-n', type=int, default=50, help='bench 调用次数')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        server = start_server(args.port, args.latency)
+        print(f"模拟服务已启动: http://127.0.0.1:{server.server_address[1]}/v1")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        # 未单独启动服务时，bench 自带一个
+        server = start_server(0, args.latency)
+        bench(f"http://127.0.0.1:{server.server_address[1]}/v1", args.n)
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+节奏控制 - 浏览器自动化的速率、等待与停顿
+├─ RateLimiter       令牌桶：每个键（通常是域名）独立计速，平均每秒 rate 次，允许 burst 次突发
+├─ AdaptiveTimeout   按实际就绪耗时自适应的等待超时（慢页面自动放宽，快页面快速失败）
+├─ PacingPolicy      模拟真人操作的随机停顿，与就绪等待分开配置，可整体关闭
+└─ WaitStats         统计就绪等待的实际耗时，与原先固定 sleep 的时长对比
+
+环境变量：
+├─ CAREERPILOT_APPLY_CONCURRENCY   同时打开的职位详情页数（默认 3）
+├─ CAREERPILOT_APPLY_RATE          每个域名每秒最多打开的页面数（默认 1.0）
+├─ CAREERPILOT_PACING_MIN          操作间随机停顿的下限秒数（默认 0.3）
+└─ CAREERPILOT_PACING_MAX          上限秒数（默认 1.0；两者都设为 0 关闭停顿）
+"""
+import os
+import time
+import random
+import threading
+from typing import Dict
+from urllib.parse import urlsplit
+
+APPLY_CONCURRENCY = int(os.getenv('CAREERPILOT_APPLY_CONCURRENCY', 3))
+APPLY_RATE = float(os.getenv('CAREERPILOT_APPLY_RATE', 1.0))
+PACING_MIN = float(os.getenv('CAREERPILOT_PACING_MIN', 0.3))
+PACING_MAX = float(os.getenv('CAREERPILOT_PACING_MAX', 1.0))
+
+
+class RateLimiter:
+    """按键（域名）分别计速的令牌桶，线程安全"""
+
+    def __init__(self, rate: float = APPLY_RATE, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, list] = {}  # key -> [令牌数, 上次补充时间]
+        self.waited = 0.0                    # 累计等待秒数
+
+    def acquire(self, key: str = '') -> float:
+        """取一个令牌，必要时阻塞；返回本次等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._buckets.setdefault(key, [float(self.burst), now])
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            # 先扣令牌再睡，并发调用方按到达顺序排队
+            bucket[0] -= 1
+            delay = -bucket[0] / self.rate if bucket[0] < 0 else 0.0
+            self.waited += delay
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def acquire_url(self, url: str) -> float:
+        """按 URL 的域名取令牌"""
+        return self.acquire(urlsplit(url).netloc)
+
+
+class AdaptiveTimeout:
+    """超时 = factor × 就绪耗时的指数滑动平均，限制在 [floor, ceiling] 毫秒之间"""
+
+    def __init__(self, ceiling_ms: float, floor_ms: float = 2000, factor: float = 4.0, alpha: float = 0.3):
+        self.ceiling_ms = ceiling_ms
+        self.floor_ms = min(floor_ms, ceiling_ms)
+        self.factor = factor
+        self.alpha = alpha
+        self._avg_ms = None
+
+    @property
+    def value(self) -> float:
+        """当前超时（毫秒）；还没有样本时取上限"""
+        if self._avg_ms is None:
+            return self.ceiling_ms
+        return max(self.floor_ms, min(self.ceiling_ms, self._avg_ms * self.factor))
+
+    def observe(self, elapsed_ms: float):
+        if self._avg_ms is None:
+            self._avg_ms = elapsed_ms
+        else:
+            self._avg_ms += self.alpha * (elapsed_ms - self._avg_ms)
+
+    def timed_out(self):
+        """等待超时：超时翻倍（不超过上限），否则超时一旦收紧到 floor 就再也放不宽"""
+        if self._avg_ms is not None:
+            self._avg_ms = min(self.ceiling_ms, self.value * 2) / self.factor
+
+
+class PacingPolicy:
+    """操作之间的随机停顿（模拟真人节奏），与页面就绪等待无关"""
+
+    def __init__(self, min_seconds: float = PACING_MIN, max_seconds: float = PACING_MAX):
+        self.min_seconds = max(0.0, min_seconds)
+        self.max_seconds = max(self.min_seconds, max_seconds)
+        self.paused = 0.0  # 累计停顿秒数
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_seconds > 0
+
+    def pause(self) -> float:
+        if not self.enabled:
+            return 0.0
+        delay = random.uniform(self.min_seconds, self.max_seconds)
+        self.paused += delay
+        time.sleep(delay)
+        return delay
+
+
+class WaitStats:
+    """按阶段统计就绪等待：次数、实际耗时、原先固定 sleep 的总时长"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, Dict[str, float]] = {}
+
+    def record(self, stage: str, elapsed: float, replaced: float = 0.0):
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"count": 0, "waited": 0.0, "replaced": 0.0})
+            entry["count"] += 1
+            entry["waited"] += elapsed
+            entry["replaced"] += replaced
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def summary(self) -> Dict:
+        with self._lock:
+            stages = {k: dict(v) for k, v in self._stages.items()}
+        waited = sum(v["waited"] for v in stages.values())
+        replaced = sum(v["replaced"] for v in stages.values())
+        for entry in stages.values():
+            entry["waited"] = round(entry["waited"], 2)
+            entry["replaced"] = round(entry["replaced"], 2)
+        return {"stages": stages, "waited": round(waited, 2), "replaced": round(replaced, 2),
+                "saved": round(replaced - waited, 2)}
@@ -0,0 +1,123 @@
+"""
+任务进度 - 合并写入与变化订阅
+├─ ProgressReporter   Worker 端：进度先记在内存里，最多每 interval 写一次库，阶段切换时立即写，
+│                     停止更新后最后一次进度也会在 interval 内补写
+└─ watch_tasks        API 端：先发全量任务快照，之后只推送有变化的任务（PRAGMA data_version 感知提交，
+                      再按 tasks.version / task_removed 墓碑只查变化的行）
+
+环境变量：
+└─ CAREERPILOT_PROGRESS_INTERVAL_MS   进度写库的最小间隔（默认 500）
+"""
+import os
+import time
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+from storage import get_storage, SQLiteStorage
+
+PROGRESS_INTERVAL = int(os.getenv('CAREERPILOT_PROGRESS_INTERVAL_MS', 500)) / 1000
+POLL_INTERVAL = 0.2     # watch_tasks 检查 data_version 的间隔（秒）
+PING_INTERVAL = 15.0    # 没有变化时发心跳的间隔（秒），便于发现断开的连接
+
+
+class ProgressReporter:
+    """合并同一任务的进度更新"""
+
+    def __init__(self, task_id: str, storage: Optional[SQLiteStorage] = None, interval: float = PROGRESS_INTERVAL):
+        self.task_id = task_id
+        self.storage = storage or get_storage()
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._pending: Dict = {}
+        self._last_flush = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._closed = False
+        self.updates = 0
+        self.writes = 0
+
+    def update(self, progress: int = None, log: str = None, **fields):
+        """记录一次进度；距上次写库不足 interval 时只更新内存，由定时器补写"""
+        if progress is not None:
+            fields['progress'] = progress
+        if log is not None:
+            fields['log'] = log
+        with self._lock:
+            if self._closed:
+                return
+            self.updates += 1
+            self._pending.update(fields)
+            delay = self._last_flush + self.interval - time.monotonic()
+            if delay > 0:
+                if self._timer is None:
+                    self._timer = threading.Timer(delay, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.flush()
+
+    def transition(self, progress: int = None, log: str = None, **fields):
+        """阶段切换：立即写库"""
+        self.update(progress, log, **fields)
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            fields, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+            if not fields:
+                return
+            self.writes += 1
+            # 持锁写库：保证关闭后不会再有迟到的写入覆盖最终状态
+            self.storage.update_task(self.task_id, **fields)
+
+    def close(self, flush: bool = True):
+        """写出未落库的进度，之后的更新全部忽略（任务最终状态由调用方写入）；
+        flush=False 时丢弃未落库的进度（任务已不归本 Worker 所有，不能覆盖接手方的进度）"""
+        if flush:
+            self.flush()
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._pending = {}
+            self._closed = True
+
+
+def watch_tasks(storage: Optional[SQLiteStorage] = None, poll: float = POLL_INTERVAL,
+                ping: float = PING_INTERVAL) -> Iterator[Tuple[str, object]]:
+    """任务变化订阅，产出 (事件, 数据)：
+    ├─ ('tasks', [任务...])     首次全量
+    ├─ ('task', 任务)           新增或变化的任务
+    ├─ ('removed', {'id': ..})  被删除的任务
+    └─ ('ping', {})             空闲心跳
+
+    data_version 变化（任何提交，包括续租和其他表的写入）后只按任务变更序号查增量，
+    与任务总数无关；没有任务变化时这次查询走索引、返回空。
+    """
+    storage = storage or get_storage()
+    conn = storage.connection()
+    version = conn.execute('PRAGMA data_version').fetchone()[0]
+    # 先取序号再读全量：两者之间的写入会在下一轮作为增量重复推送一次，不会漏
+    since = storage.task_version()
+    yield 'tasks', storage.list_tasks()
+
+    idle_since = time.monotonic()
+    while True:
+        time.sleep(poll)
+        current = conn.execute('PRAGMA data_version').fetchone()[0]
+        if current != version:
+            version = current
+            changed, removed, since = storage.task_changes(since)
+            for task in changed:
+                yield 'task', task
+            for task_id in removed:
+                yield 'removed', {'id': task_id}
+            if changed or removed:
+                idle_since = time.monotonic()
+                continue
+        if time.monotonic() - idle_since >= ping:
+            idle_since = time.monotonic()
+            yield 'ping', {}
@@ -0,0 +1,376 @@
+"""
+离线回放 - 不访问 zhipin.com、不用真实账号跑通投递流程，并给出各阶段的吞吐与耗时
+
+两种数据来源：
+├─ 模拟站点（默认）  本地 HTTP 服务按固定规则生成搜索页、列表接口和详情页，结果完全确定
+└─ HAR 录制         record 在真实站点上录下搜索页和详情页（只打开，不点击沟通），replay 用录制内容回放
+
+用法：
+    python replay_harness.py run [--jobs 60] [--count 20] [--concurrency 1 3] [--latency 0.05] [--profile headless]
+    python replay_harness.py record --har replay.har [--keyword 产品经理] [--city 上海] [--details 10]
+    python replay_harness.py replay --har replay.har [--keyword 产品经理] [--city 上海] [--count 10]
+
+回放使用临时数据库和临时 Cookie 文件，不影响真实的投递台账、配置和登录状态。
+replay 的关键词和城市需要与录制时一致（请求 URL 要能在 HAR 中找到）。
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from typing import Dict, List
+
+PAGE_SIZE = 15
+TITLES = ['产品经理', 'Python开发', '数据分析师', '前端工程师', '测试开发', '运营专员']
+
+# 1x1 透明 PNG
+PIXEL_PNG = bytes.fromhex('89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+                          '1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082')
+
+LIST_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>职位搜索</title>
+<style>li.job-card-box { height: 120px; list-style: none; border-bottom: 1px solid #eee; }
+@font-face { font-family: boss; src: url(/static/boss.woff2); } body { font-family: boss, sans-serif; }</style>
+</head><body>
+<div class="user-nav"><img src="/static/avatar.png"></div>
+<ul class="job-list-box"></ul>
+<script src="/static/analytics.js"></script>
+<script>
+const params = new URLSearchParams(location.search);
+let page = Number(params.get('page') || 1) - 1, loading = false, more = true;
+async function load() {
+  if (loading || !more) return;
+  loading = true;
+  page += 1;
+  const query = new URLSearchParams({query: params.get('query') || '', city: params.get('city') || '', page});
+  const data = await (await fetch('/wapi/zpgeek/search/joblist.json?' + query)).json();
+  const list = document.querySelector('.job-list-box');
+  for (const job of data.zpData.jobList) {
+    const li = document.createElement('li');
+    li.className = 'job-card-box';
+    li.innerHTML = `<a class="job-name" href="/job_detail/${job.encryptJobId}.html?lid=${job.lid}&securityId=${job.securityId}">${job.jobName}</a>
+      <span class="job-salary">${job.salaryDesc}</span><span class="boss-name">${job.brandName}</span>
+      <img src="/static/logo.png">`;
+    list.appendChild(li);
+  }
+  more = data.zpData.hasMore;
+  loading = false;
+}
+window.addEventListener('scroll', () => {
+  if (innerHeight + scrollY >= document.body.scrollHeight - 10) load();
+});
+load();
+</script></body></html>"""
+
+DETAIL_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head><body>
+<div class="user-nav"><img src="/static/avatar.png"></div>
+<h1 class="job-name">{title}</h1><div class="company-name">{company}</div>
+<img src="/static/logo.png">
+<a class="btn btn-startchat" href="javascript:;">{button}</a>
+<script>
+document.querySelector('.btn-startchat').addEventListener('click', async (e) => {{
+  await fetch('/wapi/zpgeek/friend/add.json?jobId={job_id}', {{method: 'POST'}});
+  e.target.textContent = '继续沟通';
+}});
+</script></body></html>"""
+
+LOGIN_HTML = """<!DOCTYPE html><html><head><meta charset="utf-8"></head><body>
+<input name="phone" type="tel"><button class="btn-sms">发送验证码</button></body></html>"""
+
+
+# ========== 模拟站点 ==========
+
+class FixtureSite:
+    """确定性的职位数据：每 contacted_every 个职位有一个已沟通过"""
+
+    def __init__(self, jobs: int = 60, contacted_every: int = 4):
+        self.jobs = jobs
+        self.contacted_every = contacted_every
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.contacted = {self.job_id(i) for i in range(self.jobs) if i % self.contacted_every == 0}
+            self.chats: List[str] = []
+            self.requests: Dict[str, int] = {}
+
+    @staticmethod
+    def job_id(i: int) -> str:
+        return f'replay{i:04d}'
+
+    def job(self, i: int) -> Dict:
+        return {
+            'encryptJobId': self.job_id(i),
+            'jobName': f'{TITLES[i % len(TITLES)]}-{i}',
+            'brandName': f'模拟公司{i:03d}',
+            'salaryDesc': f'{10 + i % 20}-{20 + i % 20}K',
+            'securityId': f'sec{i}',
+            'lid': 'replay',
+        }
+
+    def page(self, page_no: int) -> Dict:
+        start = (page_no - 1) * PAGE_SIZE
+        items = [self.job(i) for i in range(start, min(start + PAGE_SIZE, self.jobs))]
+        return {'code': 0, 'zpData': {'jobList': items, 'hasMore': start + PAGE_SIZE < self.jobs}}
+
+    def count(self, kind: str):
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def chat(self, job_id: str):
+        with self._lock:
+            self.chats.append(job_id)
+            self.contacted.add(job_id)
+
+    def expected_success(self, count: int, max_scan: int) -> int:
+        """按列表顺序跳过已沟通的职位，最多查看 max_scan 个，应成功投递的数量"""
+        success = scanned = 0
+        for i in range(self.jobs):
+            if success >= count or scanned >= max_scan:
+                break
+            scanned += 1
+            if self.job_id(i) not in self.contacted:
+                success += 1
+        return success
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    site: FixtureSite = None
+    latency = 0.05
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _html(self, html: str):
+        self._send(200, html.encode('utf-8'), 'text/html; charset=utf-8')
+
+    def _json(self, payload: Dict):
+        self._send(200, json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json')
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        path = parts.path
+        if path.startswith('/static/'):
+            self.site.count('static')
+            if path.endswith('.png'):
+                self._send(200, PIXEL_PNG, 'image/png')
+            elif path.endswith('.js'):
+                self._send(200, b'/* analytics */', 'application/javascript')
+            else:
+                self._send(200, b'\0' * 2048, 'font/woff2')
+            return
+
+        time.sleep(self.latency)
+        if path == '/web/geek/job':
+            self.site.count('search_page')
+            self._html(LIST_HTML)
+        elif path == '/wapi/zpgeek/search/joblist.json':
+            self.site.count('joblist_api')
+            self._json(self.site.page(int((query.get('page') or ['1'])[0])))
+        elif path.startswith('/job_detail/'):
+            self.site.count('detail_page')
+            job_id = path.rsplit('/', 1)[-1].split('.')[0]
+            match = re.search(r'(\d+)$', job_id)
+            if not match or int(match.group(1)) >= self.site.jobs:
+                self._send(404, b'not found', 'text/plain')
+                return
+            job = self.site.job(int(match.group(1)))
+            button = '继续沟通' if job_id in self.site.contacted else '立即沟通'
+            self._html(DETAIL_HTML.format(title=job['jobName'], company=job['brandName'],
+                                          button=button, job_id=job_id))
+        elif path.startswith('/web/user'):
+            self.site.count('login_page')
+            self._html(LOGIN_HTML)
+        else:
+            self._send(404, b'not found', 'text/plain')
+
+    def do_POST(self):
+        parts = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        time.sleep(self.latency)
+        if parts.path == '/wapi/zpgeek/friend/add.json':
+            self.site.count('chat')
+            self.site.chat((parse_qs(parts.query).get('jobId') or [''])[0])
+            self._json({'code': 0})
+        else:
+            self._send(404, b'not found', 'text/plain')
+
+
+def start_server(site: FixtureSite, port: int = 0, latency: float = 0.05) -> ThreadingHTTPServer:
+    """后台线程启动模拟站点（port=0 时随机端口），返回 server"""
+    handler = type('Handler', (ReplayHandler,), {'site': site, 'latency': latency})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ========== 运行 ==========
+
+def _isolate() -> str:
+    """使用临时数据库（须在导入 storage 之前调用），返回临时目录"""
+    workdir = tempfile.mkdtemp(prefix='careerpilot-replay-')
+    os.environ['CAREERPILOT_DB'] = os.path.join(workdir, 'replay.db')
+    return workdir
+
+
+def _make_bot(workdir: str, name: str, profile: str, cookies_from: str = None):
+    """创建指向临时 Cookie / 台账的 BossAutomation，关闭随机停顿"""
+    from boss_automation import BossAutomation
+    from applied_ledger import AppliedLedger
+    from storage import SQLiteStorage
+    from pacing import PacingPolicy
+
+    bot = BossAutomation(profile)
+    bot.cookie_path = os.path.join(workdir, f'{name}-cookies.json')
+    if cookies_from and os.path.exists(cookies_from):
+        shutil.copyfile(cookies_from, bot.cookie_path)
+    bot.pacing = PacingPolicy(0, 0)
+    bot.ledger = AppliedLedger(SQLiteStorage(os.path.join(workdir, f'{name}-ledger.db')))
+    return bot
+
+
+def _report(bot, elapsed: float, success: int) -> Dict:
+    timing = bot.timing_summary()
+    stages = {}
+    for stage, entry in timing['stages'].items():
+        if entry['count']:
+            stages[stage] = {'count': entry['count'],
+                             'avg_ms': round(entry['waited'] / entry['count'] * 1000, 1),
+                             'total_s': entry['waited']}
+    return {'success': success, 'elapsed_s': round(elapsed, 2),
+            'per_minute': round(success / elapsed * 60, 1) if elapsed else 0.0, 'stages': stages}
+
+
+def _print_report(title: str, report: Dict):
+    print(f"\n── {title}: 成功 {report['success']}，耗时 {report['elapsed_s']}s，"
+          f"{report['per_minute']} 个/分钟")
+    print(f"   {'阶段':<14}{'次数':>6}{'平均(ms)':>12}{'合计(s)':>10}")
+    for stage, entry in report['stages'].items():
+        print(f"   {stage:<14}{entry['count']:>6}{entry['avg_ms']:>12}{entry['total_s']:>10}")
+
+
+def run_fixture(jobs: int = 60, count: int = 20, concurrencies=(1, 3), latency: float = 0.05,
+                profile: str = 'headless', keyword: str = '产品经理', city: str = '上海') -> List[Dict]:
+    """在模拟站点上按不同并发各跑一次完整投递，返回每次的报告"""
+    workdir = _isolate()
+    from boss_automation import MAX_SCAN_FACTOR
+
+    site = FixtureSite(jobs)
+    server = start_server(site, latency=latency)
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    reports = []
+    try:
+        for concurrency in concurrencies:
+            site.reset()
+            expected = site.expected_success(count, count * MAX_SCAN_FACTOR)
+            bot = _make_bot(workdir, f'run{concurrency}', profile)
+            bot.base_url = base_url
+            bot.start()
+            try:
+                start = time.perf_counter()
+                success = bot.apply_jobs(keyword, city, count, concurrency=concurrency, rate=0)
+                report = _report(bot, time.perf_counter() - start, success)
+            finally:
+                bot.stop()
+            report.update(concurrency=concurrency, expected=expected, chats=len(site.chats),
+                          requests=dict(site.requests))
+            reports.append(report)
+            _print_report(f'并发 {concurrency}', report)
+            print(f"   服务端请求: {report['requests']}")
+            ok = success == expected == len(site.chats)
+            print(f"   {'✅' if ok else '❌'} 成功 {success} / 预期 {expected} / 服务端收到沟通 {len(site.chats)}")
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return reports
+
+
+def record_har(har: str, keyword: str, city: str, details: int = 10):
+    """在真实站点上录制登录检查、搜索页和前 details 个详情页（不点击沟通）"""
+    workdir = _isolate()
+    from boss_automation import COOKIE_PATH, CHAT_BUTTON_SELECTOR
+
+    bot = _make_bot(workdir, 'record', 'headed', cookies_from=COOKIE_PATH)
+    bot.context_hooks.append(lambda context: context.route_from_har(har, update=True, update_content='embed'))
+    bot.start()
+    try:
+        if not bot.ensure_logged_in():
+            print('❌ 未登录，无法录制')
+            return
+        for i, job in enumerate(bot.iter_jobs(keyword, city, max_pages=1)):
+            if i >= details:
+                break
+            page = bot.context.new_page()
+            page.goto(job.url, wait_until='domcontentloaded', timeout=30000)
+            bot._wait_ready('detail', CHAT_BUTTON_SELECTOR, page=page)
+            page.close()
+            print(f'   📼 已录制 {job.title} @ {job.company}')
+    finally:
+        bot.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(f'💾 HAR 已保存: {har}')
+
+
+def replay_har(har: str, keyword: str, city: str, count: int = 10, concurrency: int = 3,
+               profile: str = 'headless') -> Dict:
+    """用录制的 HAR 回放一次投递；HAR 里没有的请求（如点击沟通）直接中止"""
+    workdir = _isolate()
+    bot = _make_bot(workdir, 'replay', profile)
+    bot.context_hooks.append(lambda context: context.route_from_har(har, not_found='abort'))
+    bot.start()
+    try:
+        start = time.perf_counter()
+        success = bot.apply_jobs(keyword, city, count, concurrency=concurrency, rate=0)
+        report = _report(bot, time.perf_counter() - start, success)
+    finally:
+        bot.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    _print_report('HAR 回放', report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='离线回放投递流程')
+    parser.add_argument('command', choices=['run', 'record', 'replay'])
+    parser.add_argument('--jobs', type=int, default=60, help='模拟站点的职位总数')
+    parser.add_argument('--count', type=int, default=20, help='目标投递数')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 3])
+    parser.add_argument('--latency', type=float, default=0.05, help='模拟站点每个请求的延迟（秒）')
+    parser.add_argument('--profile', default='headless', choices=['headed', 'headless'])
+    parser.add_argument('--har', default='replay.har')
+    parser.add_argument('--keyword', default='产品经理')
+    parser.add_argument('--city', default='上海')
+    parser.add_argument('--details', type=int, default=10, help='录制的详情页数')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run_fixture(args.jobs, args.count, args.concurrency, args.latency, args.profile, args.keyword, args.city)
+    elif args.command == 'record':
+        record_har(args.har, args.keyword, args.city, args.details)
+    else:
+        replay_har(args.har, args.keyword, args.city, args.count, args.concurrency[-1], args.profile)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,468 @@
+"""
+简历解析 - 后台解析队列
+上传接口只保存文件并返回解析任务 ID，解析在后台进程池中完成，不再占用请求线程。
+
+├─ store_upload        按内容 SHA-256 存储上传文件（uploads/<sha256>.<ext>），相同内容只存一份
+├─ extract_resume      解析一个文件：PDF 按页分批并行（每页 pdfplumber，空页单独用 pypdf 补），docx、txt/md
+├─ ResumeParseQueue    解析任务队列
+│   ├─ submit          登记任务（resume_jobs 表）并交给调度线程，立即返回任务；
+│   │                  同一内容已解析过时直接用缓存文本完成（不重新解析、不重复加入知识库），
+│   │                  正在解析时返回进行中的那个任务
+│   ├─ get / watch     查询任务状态 / 订阅状态变化直到完成（供轮询和 SSE）
+│   └─ _finish         解析完成后写入配置（resume_*）并加入知识库（每个内容哈希只建一篇文档）
+├─ resume_files 表     内容哈希 → 文件路径、解析文本缓存、知识库文档 ID
+└─ get_resume_queue    进程级单例
+
+超时：整份文件的解析有总时限，超时未返回的页批次跳过（结果里记录缺失页）。
+有卡住子进程的进程池不再接新任务（新任务用新进程池），等池上其他在途任务都结束后再整体终止；
+进程池意外损坏时，受影响的任务在新进程池上重试一次。整份文件都超时、没有任何文字的任务记为失败。
+子进程用 spawn 方式启动：Flask 进程是多线程的，fork 会把其他线程持有的锁（SQLite、日志等）一起复制进子进程。
+
+环境变量：
+├─ CAREERPILOT_RESUME_WORKERS   解析进程数（默认 min(4, CPU 数)）
+└─ CAREERPILOT_RESUME_TIMEOUT   单个文件的解析时限（秒，默认 60）
+"""
+import os
+import time
+import uuid
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from storage import get_storage, SQLiteStorage
+
+PARSE_WORKERS = int(os.getenv('CAREERPILOT_RESUME_WORKERS', 0)) or min(4, os.cpu_count() or 1)
+PARSE_TIMEOUT = float(os.getenv('CAREERPILOT_RESUME_TIMEOUT', 60))
+UPLOAD_CHUNK = 64 * 1024
+MIN_PAGES_PER_BATCH = 2     # 每个批次至少的页数（每批在子进程里要重新打开一次 PDF）
+PING_INTERVAL = 15.0        # watch 没有变化时发心跳的间隔（秒）
+
+DOC_CLAIM_PREFIX = 'claim:'  # resume_files.doc_id 的占位值：某个请求正在为该内容建知识库文档
+DOC_CLAIM_TIMEOUT = 60.0     # 认领超过这个秒数仍未完成视为已放弃
+
+UNPARSED = "(无法解析)"
+FINISHED = ('done', 'failed')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS resume_jobs (
+    id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    path TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    parsed INTEGER NOT NULL DEFAULT 0,
+    pages INTEGER NOT NULL DEFAULT 0,
+    missing_pages INTEGER NOT NULL DEFAULT 0,
+    chars INTEGER NOT NULL DEFAULT 0,
+    error TEXT NOT NULL DEFAULT '',
+    sha256 TEXT NOT NULL DEFAULT '',
+    cached INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    finished_at REAL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS resume_files (
+    sha256 TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    content TEXT,
+    pages INTEGER NOT NULL DEFAULT 0,
+    doc_id TEXT NOT NULL DEFAULT '',
+    created_at REAL NOT NULL,
+    parsed_at REAL
+) WITHOUT ROWID;
+"""
+
+# 旧版 resume_jobs 表缺少的列
+MIGRATIONS = {
+    'sha256': "ALTER TABLE resume_jobs ADD COLUMN sha256 TEXT NOT NULL DEFAULT ''",
+    'cached': "ALTER TABLE resume_jobs ADD COLUMN cached INTEGER NOT NULL DEFAULT 0",
+}
+
+
+# ========== 上传存储 ==========
+
+def store_upload(file, folder: str) -> Tuple[str, str]:
+    """
+    边写临时文件边计算 SHA-256，再按哈希改名；内容相同的文件已存在时丢弃临时文件
+    file 为 werkzeug FileStorage；返回 (sha256, 路径)
+    """
+    os.makedirs(folder, exist_ok=True)
+    tmp = os.path.join(folder, f".upload-{uuid.uuid4().hex}")
+    digest = hashlib.sha256()
+    try:
+        with open(tmp, 'wb') as f:
+            for chunk in iter(lambda: file.stream.read(UPLOAD_CHUNK), b''):
+                digest.update(chunk)
+                f.write(chunk)
+        sha256 = digest.hexdigest()
+        path = os.path.join(folder, f"{sha256}.{detect_type(tmp, file.filename or '')}")
+        if os.path.exists(path):
+            os.remove(tmp)
+        else:
+            os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return sha256, path
+
+
+# ========== 文件解析（在子进程中执行，只依赖解析库） ==========
+
+def detect_type(path: str, filename: str = '') -> str:
+    """按扩展名判断类型；secure_filename 会去掉中文文件名的扩展名，此时按文件头识别"""
+    for name in (filename, path):
+        ext = os.path.splitext(name or '')[1].lower().lstrip('.')
+        if ext in ('pdf', 'docx', 'doc', 'txt', 'md'):
+            return 'docx' if ext == 'doc' else ext
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    if head.startswith(b'%PDF'):
+        return 'pdf'
+    if head.startswith(b'PK'):
+        return 'docx'
+    return 'txt'
+
+
+def pdf_page_count(path: str) -> int:
+    """只读页表，不解析页面内容"""
+    try:
+        import pypdf
+        return len(pypdf.PdfReader(path).pages)
+    except Exception:
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            return len(pdf.pages)
+
+
+def extract_pdf_pages(path: str, start: int, stop: int) -> List[str]:
+    """解析 [start, stop) 页；pdfplumber 取不到文字的页再用 pypdf 单独补这一页"""
+    texts = []
+    try:
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            for p in pdf.pages[start:stop]:
+                try:
+                    texts.append(p.extract_text() or "")
+                except Exception:
+                    texts.append("")
+    except Exception:
+        texts = [""] * (stop - start)
+
+    if not all(t.strip() for t in texts):
+        try:
+            import pypdf
+            reader = pypdf.PdfReader(path)
+            for i, t in enumerate(texts):
+                if not t.strip():
+                    texts[i] = reader.pages[start + i].extract_text() or ""
+        except Exception:
+            pass
+    return texts
+
+
+def extract_document(path: str, kind: str) -> str:
+    if kind == 'docx':
+        import docx
+        return "\n".join(p.text for p in docx.Document(path).paragraphs)
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def page_batches(pages: int, workers: int) -> List[Tuple[int, int]]:
+    """把页码切成不超过 workers 个连续批次"""
+    size = max(MIN_PAGES_PER_BATCH, -(-pages // max(1, workers)))
+    return [(i, min(i + size, pages)) for i in range(0, pages, size)]
+
+
+def extract_resume(path: str, filename: str = '', executor: Optional[ProcessPoolExecutor] = None,
+                   timeout: float = PARSE_TIMEOUT) -> Dict:
+    """
+    解析简历，返回 {content, pages, missing_pages, timed_out}
+    传入 executor 时 PDF 按页批次并行、docx/txt 也放到子进程里；不传时在当前进程顺序解析
+    """
+    kind = detect_type(path, filename)
+    deadline = time.monotonic() + timeout
+    pages = missing = 0
+    timed_out = False
+
+    if kind == 'pdf':
+        pages = pdf_page_count(path)
+        if executor is None:
+            texts = extract_pdf_pages(path, 0, pages)
+        else:
+            batches = page_batches(pages, PARSE_WORKERS)
+            futures = [executor.submit(extract_pdf_pages, path, a, b) for a, b in batches]
+            texts = []
+            for (a, b), fut in zip(batches, futures):
+                try:
+                    texts.extend(fut.result(timeout=max(0.0, deadline - time.monotonic())))
+                except FutureTimeout:
+                    timed_out = True
+                    missing += b - a
+                except BrokenProcessPool:
+                    raise
+                except Exception:
+                    missing += b - a
+        text = "\n".join(texts)
+    elif executor is None:
+        text = extract_document(path, kind)
+    else:
+        try:
+            text = executor.submit(extract_document, path, kind).result(timeout=timeout)
+        except FutureTimeout:
+            timed_out, text = True, ""
+
+    text = text.strip()
+    return {"content": text or UNPARSED, "pages": pages, "missing_pages": missing, "timed_out": timed_out}
+
+
+# ========== 解析任务队列 ==========
+
+class ResumeParseQueue:
+    """简历解析任务：状态存 SQLite，解析在进程池中执行"""
+
+    def __init__(self, storage: Optional[SQLiteStorage] = None, workers: int = PARSE_WORKERS):
+        self.storage = storage or get_storage()
+        self.storage.ensure_schema(SCHEMA)
+        self._migrate()
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_users: Dict[ProcessPoolExecutor, int] = {}   # 每个进程池上的在途任务数
+        self._pool_lock = threading.Lock()
+        # 调度线程只等待子进程结果、写库，不做解析本身
+        self._dispatcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='resume-parse')
+        self._changed = threading.Condition()
+        self._generation = 0
+        self._recover()
+
+    def _migrate(self):
+        columns = {row['name'] for row in self.storage.query('PRAGMA table_info(resume_jobs)')}
+        for column, sql in MIGRATIONS.items():
+            if column not in columns:
+                self.storage.execute(sql)
+
+    def _recover(self):
+        """上次进程退出时未完成的任务无法继续，标记为失败"""
+        self.storage.execute("UPDATE resume_jobs SET status = 'failed', error = ?, finished_at = ? "
+                             "WHERE status NOT IN ('done', 'failed')", ('服务重启，解析中断，请重新上传', time.time()))
+
+    # ========== 进程池 ==========
+
+    def _acquire_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            self._pool_users[self._pool] = self._pool_users.get(self._pool, 0) + 1
+            return self._pool
+
+    def _release_pool(self, pool: ProcessPoolExecutor, retire: bool = False):
+        """任务用完进程池；retire=True 表示池里有卡住的子进程或池已损坏，不再分配给新任务。
+        已退役的池在最后一个在途任务结束后才终止，不影响同池上其他任务的解析"""
+        with self._pool_lock:
+            if retire and self._pool is pool:
+                self._pool = None
+            self._pool_users[pool] -= 1
+            idle = self._pool_users[pool] == 0 and self._pool is not pool
+            if idle:
+                del self._pool_users[pool]
+        if idle:
+            self._terminate_pool(pool)
+
+    @staticmethod
+    def _terminate_pool(pool: ProcessPoolExecutor):
+        """终止进程池，卡住的子进程直接杀掉"""
+        # ProcessPoolExecutor 没有公开的终止接口，只能取内部进程表
+        for proc in list((getattr(pool, '_processes', None) or {}).values()):
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+        pool.shutdown(wait=False)
+
+    # ========== 任务 ==========
+
+    def submit(self, path: str, filename: str, sha256: str = '') -> Dict:
+        """sha256 来自 store_upload；传入时启用解析缓存和知识库去重"""
+        job_id = uuid.uuid4().hex[:12]
+        # 查缓存、查进行中的任务、登记新任务在同一个写事务里：同时到达的相同上传只会有一个开始解析
+        with self.storage.transaction():
+            cached = None
+            if sha256:
+                self.storage.execute('INSERT OR IGNORE INTO resume_files (sha256, path, size, created_at) '
+                                     'VALUES (?, ?, ?, ?)', (sha256, path, os.path.getsize(path), time.time()))
+                cached = self.storage.query_one('SELECT content, pages FROM resume_files '
+                                                'WHERE sha256 = ? AND content IS NOT NULL', (sha256,))
+                if cached is None:
+                    running = self.storage.query_one("SELECT id FROM resume_jobs WHERE sha256 = ? "
+                                                     "AND status IN ('pending', 'running') ORDER BY created_at LIMIT 1",
+                                                     (sha256,))
+                    if running is not None:
+                        return self.get(running['id'])
+            now = time.time()
+            if cached is not None:
+                # 内容已解析过：直接登记为完成，不进解析队列
+                self.storage.execute('INSERT INTO resume_jobs (id, filename, path, status, parsed, pages, chars, sha256, '
+                                     'cached, created_at, finished_at) VALUES (?, ?, ?, ?, 1, ?, ?, ?, 1, ?, ?)',
+                                     (job_id, filename, path, 'done', cached['pages'], len(cached['content']),
+                                      sha256, now, now))
+            else:
+                self.storage.execute('INSERT INTO resume_jobs (id, filename, path, status, sha256, created_at) '
+                                     'VALUES (?, ?, ?, ?, ?, ?)', (job_id, filename, path, 'pending', sha256, now))
+
+        if cached is not None:
+            # 只写配置、确认知识库文档仍在（毫秒级），在请求线程里完成
+            self._finish(path, filename, cached['content'], sha256)
+        else:
+            self._dispatcher.submit(self._run, job_id, path, filename, sha256)
+        self._notify()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        row = self.storage.query_one('SELECT * FROM resume_jobs WHERE id = ?', (job_id,))
+        if row is None:
+            return None
+        job = dict(row)
+        job["parsed"] = bool(job["parsed"])
+        job["cached"] = bool(job["cached"])
+        return job
+
+    def _update(self, job_id: str, **fields):
+        cols = ', '.join(f'{k} = ?' for k in fields)
+        self.storage.execute(f'UPDATE resume_jobs SET {cols} WHERE id = ?', (*fields.values(), job_id))
+        self._notify()
+
+    def _notify(self):
+        with self._changed:
+            self._generation += 1
+            self._changed.notify_all()
+
+    def _run(self, job_id: str, path: str, filename: str, sha256: str = ''):
+        self._update(job_id, status='running')
+        for attempt in range(2):
+            pool = self._acquire_pool()
+            try:
+                result = extract_resume(path, filename, executor=pool)
+            except BrokenProcessPool:
+                # 池被其他任务或系统弄坏（子进程崩溃），不是这份文件的问题：换新池重试一次
+                self._release_pool(pool, retire=True)
+                if attempt:
+                    self._update(job_id, status='failed', error='解析进程异常退出', finished_at=time.time())
+                    return
+                continue
+            except Exception as e:
+                self._release_pool(pool)
+                self._update(job_id, status='failed', error=f'解析错误: {e}', finished_at=time.time())
+                return
+            self._release_pool(pool, retire=result["timed_out"])
+            break
+
+        parsed = result["content"] != UNPARSED
+        if result["timed_out"] and not parsed:
+            # 整份文件超时、一个字都没拿到：不能把占位文本写进配置和知识库
+            self._update(job_id, status='failed', error='解析超时', pages=result["pages"],
+                         missing_pages=result["missing_pages"], finished_at=time.time())
+            return
+        # 只缓存完整解析的结果；超时缺页或解析不出文字的下次上传时重新解析
+        if sha256 and parsed and not result["missing_pages"]:
+            self.storage.execute('UPDATE resume_files SET content = ?, pages = ?, parsed_at = ? WHERE sha256 = ?',
+                                 (result["content"], result["pages"], time.time(), sha256))
+        try:
+            self._finish(path, filename, result["content"], sha256)
+        except Exception as e:
+            self._update(job_id, status='failed', error=f'保存失败: {e}', finished_at=time.time())
+            return
+        self._update(job_id, status='done',
+                     parsed=int(parsed),
+                     pages=result["pages"],
+                     missing_pages=result["missing_pages"],
+                     chars=len(result["content"]),
+                     error='部分页面解析超时' if result["timed_out"] else '',
+                     finished_at=time.time())
+
+    def _finish(self, path: str, filename: str, content: str, sha256: str = ''):
+        """解析结果写入配置；知识库里还没有这份内容的文档时才新建"""
+        # spawn 启动的子进程会重新导入本模块，知识库在这里才导入，避免子进程加载索引
+        from knowledge_base import knowledge_base
+
+        self.storage.update_config({
+            'resume_path': path,
+            'resume_name': filename,
+            'resume_content': content[:3000]
+        })
+
+        claim = ''
+        if sha256:
+            row = self.storage.query_one('SELECT doc_id FROM resume_files WHERE sha256 = ?', (sha256,))
+            current = row['doc_id'] if row else ''
+            if current.startswith(DOC_CLAIM_PREFIX):
+                # 另一个请求正在为同一内容建文档；认领超时（进程中途退出）的可以接手
+                if time.time() - float(current[len(DOC_CLAIM_PREFIX):].split(':')[0]) < DOC_CLAIM_TIMEOUT:
+                    return
+            elif current and knowledge_base.get_document(current):
+                return
+            # 文档不存在（首次解析，或被用户删掉后重新上传）：先用条件更新认领，认领成功的一方才建文档
+            claim = f'{DOC_CLAIM_PREFIX}{time.time()}:{uuid.uuid4().hex[:8]}'
+            cursor = self.storage.execute('UPDATE resume_files SET doc_id = ? WHERE sha256 = ? AND doc_id = ?',
+                                          (claim, sha256, current))
+            if cursor.rowcount == 0:
+                return
+        try:
+            doc = knowledge_base.add_document(
+                title=f"简历 - {filename}",
+                content=content,
+                doc_type="resume",
+                tags=["简历", "个人资料"],
+                metadata={"sha256": sha256} if sha256 else None
+            )
+        except Exception:
+            if claim:
+                self.storage.execute("UPDATE resume_files SET doc_id = '' WHERE sha256 = ? AND doc_id = ?",
+                                     (sha256, claim))
+            raise
+        if claim:
+            self.storage.execute('UPDATE resume_files SET doc_id = ? WHERE sha256 = ? AND doc_id = ?',
+                                 (doc["id"], sha256, claim))
+
+    def watch(self, job_id: str) -> Iterator[Tuple[str, Optional[Dict]]]:
+        """产出 ('status', 任务) 直到任务结束；长时间无变化时产出 ('ping', None)"""
+        last = None
+        while True:
+            with self._changed:
+                generation = self._generation
+            job = self.get(job_id)
+            if job is None:
+                return
+            if job != last:
+                yield 'status', job
+                last = job
+            if job["status"] in FINISHED:
+                return
+            with self._changed:
+                changed = self._changed.wait_for(lambda: self._generation != generation, timeout=PING_INTERVAL)
+            if not changed:
+                yield 'ping', None
+
+    def shutdown(self):
+        self._dispatcher.shutdown(wait=True)
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+            self._pool_users.clear()
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+_queue: Optional[ResumeParseQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_resume_queue() -> ResumeParseQueue:
+    """进程级单例"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = ResumeParseQueue()
+        return _queue
@@ -0,0 +1,272 @@
+"""
+知识库全文索引 - 倒排索引 + BM25 排序
+分词：中文按字二元组（bigram），英文/数字按单词（小写）
+
+持久化：<name>_docs 表保存每篇文档的词频（正排），启动时在内存中倒排；
+增删改只动对应文档的一行，并递增代数号，其他进程据此重载。
+
+检索：倒排表按 BM25 贡献（impact）降序排列，用阈值算法（TA）取 top-k，
+前 k 名的分数超过未读文档的得分上界即停止，不必遍历完整倒排表。
+"""
+import re
+import json
+import math
+import heapq
+import threading
+from bisect import insort, bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Dict, Tuple
+
+CJK_RANGES = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+TOKEN_RE = re.compile(rf'[{CJK_RANGES}]+|[a-z0-9]+[+#]*')
+CJK_RE = re.compile(rf'[{CJK_RANGES}]')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS {name}_docs (
+    doc_id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    terms TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def tokenize(text: str) -> List[str]:
+    """中文连续片段切成二元组（单字保留），其余按单词切分"""
+    tokens = []
+    for match in TOKEN_RE.finditer((text or '').lower()):
+        run = match.group()
+        if CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def document_text(doc: Dict) -> str:
+    """参与索引的文本：标题、标签、正文"""
+    return '\n'.join([doc.get('title', ''), ' '.join(doc.get('tags', [])), doc.get('content', '')])
+
+
+class InvertedIndex:
+    """BM25 倒排索引（内存倒排 + SQLite 持久化）"""
+
+    K1 = 1.2
+    B = 0.75
+    # 倒排总长度低于该值时直接全量累加，省去 TA 的随机访问开销
+    EXHAUSTIVE_POSTINGS = 2000
+    # 平均文档长度偏离排序基准超过该比例时重算 impact
+    AVGDL_DRIFT = 0.2
+
+    def __init__(self, storage, name: str = 'search'):
+        """name 区分不同索引：表 <name>_docs，代数号 <name>_generation"""
+        self.storage = storage
+        self.name = name
+        self.storage.ensure_schema(SCHEMA.format(name=name))
+        self._lock = threading.RLock()
+        self._postings: Dict[str, Dict[str, int]] = {}               # term -> {doc_id: tf}
+        self._ordered: Dict[str, List[Tuple[float, str]]] = {}       # term -> [(-impact, doc_id)] 升序
+        self._docs: Dict[str, Tuple[int, str]] = {}                  # doc_id -> (长度, 类型)
+        self._total_length = 0
+        self._avgdl = 1.0  # 计算 impact 时使用的平均文档长度
+        self._generation = None
+
+    # ========== BM25 ==========
+
+    def _impact(self, tf: int, length: int) -> float:
+        k1, b = self.K1, self.B
+        return tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / self._avgdl))
+
+    def _idf(self, df: int) -> float:
+        n = len(self._docs)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def _reorder(self):
+        """按当前平均长度重算所有 impact 排序"""
+        if self._docs:
+            self._avgdl = (self._total_length / len(self._docs)) or 1.0
+        self._ordered = {
+            term: sorted((-self._impact(tf, self._docs[doc_id][0]), doc_id) for doc_id, tf in posting.items())
+            for term, posting in self._postings.items()
+        }
+
+    def _maybe_reorder(self):
+        if not self._docs:
+            return
+        avgdl = self._total_length / len(self._docs)
+        if abs(avgdl - self._avgdl) > self.AVGDL_DRIFT * self._avgdl:
+            self._reorder()
+
+    # ========== 持久化与同步 ==========
+
+    def _current_generation(self) -> int:
+        return self.storage.kv_get('meta', f'{self.name}_generation', 0)
+
+    def _bump_generation(self):
+        gen = self._current_generation() + 1
+        self.storage.kv_set('meta', f'{self.name}_generation', gen)
+        self._generation = gen
+
+    def _ensure_loaded(self):
+        """代数号变化（其他进程写过）时整体重载"""
+        gen = self._current_generation()
+        if gen == self._generation:
+            return
+        postings: Dict[str, Dict[str, int]] = {}
+        docs: Dict[str, Tuple[int, str]] = {}
+        total = 0
+        for row in self.storage.query(f'SELECT doc_id, type, length, terms FROM {self.name}_docs'):
+            docs[row['doc_id']] = (row['length'], row['type'])
+            total += row['length']
+            for term, tf in json.loads(row['terms']).items():
+                postings.setdefault(term, {})[row['doc_id']] = tf
+        self._postings, self._docs, self._total_length = postings, docs, total
+        self._reorder()
+        self._generation = gen
+
+    @contextmanager
+    def _writing(self):
+        """写事务内修改内存倒排；失败时丢弃内存状态，下次重载"""
+        with self._lock:
+            try:
+                with self.storage.transaction():
+                    self._ensure_loaded()
+                    yield
+                    self._maybe_reorder()
+                    self._bump_generation()
+            except BaseException:
+                self._generation = None
+                raise
+
+    def sync(self, documents: List[Tuple[str, str, str]]):
+        """补建缺失文档的索引、清理已删除文档（documents: [(id, 类型, 文本)]）"""
+        with self._lock:
+            self._ensure_loaded()
+            wanted = {doc_id for doc_id, _, _ in documents}
+            missing = [d for d in documents if d[0] not in self._docs]
+            stale = [d for d in self._docs if d not in wanted]
+        if not missing and not stale:
+            return
+        with self._writing():
+            for doc_id in stale:
+                self._remove(doc_id)
+            # 批量补建时先不维护排序，最后统一排一次
+            for doc_id, doc_type, text in missing:
+                self._add(doc_id, doc_type, text, ordered=False)
+            self._reorder()
+
+    # ========== 增量更新 ==========
+
+    def _add(self, doc_id: str, doc_type: str, text: str, ordered: bool = True):
+        if doc_id in self._docs:
+            self._remove(doc_id)
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        self.storage.execute(f'INSERT OR REPLACE INTO {self.name}_docs (doc_id, type, length, terms) '
+                             'VALUES (?, ?, ?, ?)', (doc_id, doc_type, length, json.dumps(terms, ensure_ascii=False)))
+        self._docs[doc_id] = (length, doc_type)
+        self._total_length += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+            if ordered:
+                insort(self._ordered.setdefault(term, []), (-self._impact(tf, length), doc_id))
+
+    def _remove(self, doc_id: str):
+        length, _ = self._docs.get(doc_id, (0, ''))
+        row = self.storage.query_one(f'SELECT terms FROM {self.name}_docs WHERE doc_id = ?', (doc_id,))
+        self.storage.execute(f'DELETE FROM {self.name}_docs WHERE doc_id = ?', (doc_id,))
+        for term in (json.loads(row['terms']) if row else ()):
+            posting = self._postings.get(term)
+            if posting is None or doc_id not in posting:
+                continue
+            entry = (-self._impact(posting.pop(doc_id), length), doc_id)
+            ordered = self._ordered[term]
+            pos = bisect_left(ordered, entry)
+            if pos < len(ordered) and ordered[pos] == entry:
+                del ordered[pos]
+            if not posting:
+                del self._postings[term]
+                del self._ordered[term]
+        if doc_id in self._docs:
+            del self._docs[doc_id]
+            self._total_length -= length
+
+    def add_document(self, doc_id: str, doc_type: str, text: str):
+        with self._writing():
+            self._add(doc_id, doc_type, text)
+
+    def update_document(self, doc_id: str, doc_type: str, text: str):
+        self.add_document(doc_id, doc_type, text)
+
+    def remove_document(self, doc_id: str):
+        with self._writing():
+            self._remove(doc_id)
+
+    # ========== 检索 ==========
+
+    def search(self, query: str, doc_type: str = None, limit: int = 10) -> List[Tuple[str, float]]:
+        """返回按 BM25 得分降序的 [(doc_id, score)]"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or limit <= 0:
+            return []
+
+        with self._lock:
+            self._ensure_loaded()
+            lists = [(self._idf(len(self._postings[t])), self._ordered[t], self._postings[t])
+                     for t in terms if t in self._postings]
+            if not lists:
+                return []
+            if sum(len(p) for _, _, p in lists) <= self.EXHAUSTIVE_POSTINGS:
+                return self._search_exhaustive(lists, doc_type, limit)
+            return self._search_threshold(lists, doc_type, limit)
+
+    def _search_exhaustive(self, lists, doc_type, limit):
+        scores: Dict[str, float] = {}
+        for idf, _, posting in lists:
+            for doc_id, tf in posting.items():
+                length, dtype = self._docs[doc_id]
+                if doc_type and dtype != doc_type:
+                    continue
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * self._impact(tf, length)
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+    def _search_threshold(self, lists, doc_type, limit):
+        """Fagin 阈值算法：轮流按 impact 降序读各倒排表，未读文档得分上界不超过第 k 名即停"""
+        top: List[Tuple[float, str]] = []  # 小顶堆
+        seen = set()
+        depth = 0
+        while True:
+            threshold = 0.0
+            advanced = False
+            for idf, ordered, _ in lists:
+                if depth >= len(ordered):
+                    continue
+                advanced = True
+                neg_impact, doc_id = ordered[depth]
+                threshold += idf * -neg_impact
+                if doc_id in seen:
+                    continue
+                seen.add(doc_id)
+                length, dtype = self._docs[doc_id]
+                if doc_type and dtype != doc_type:
+                    continue
+                score = 0.0
+                for idf2, _, posting in lists:
+                    tf = posting.get(doc_id)
+                    if tf:
+                        score += idf2 * self._impact(tf, length)
+                if len(top) < limit:
+                    heapq.heappush(top, (score, doc_id))
+                elif score > top[0][0]:
+                    heapq.heapreplace(top, (score, doc_id))
+            if not advanced or (len(top) >= limit and top[0][0] >= threshold):
+                break
+            depth += 1
+        return [(doc_id, score) for score, doc_id in sorted(top, reverse=True)]
+
+    def __len__(self) -> int:
+        return len(self._docs)
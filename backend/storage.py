@@ -0,0 +1,443 @@
+"""
+统一持久化层 - SQLite（WAL 模式）
+会话、长期记忆、知识库、任务、用户配置共用一个数据库文件
+
+表结构：
+├─ conversations / messages  会话头与消息（按会话主键 + 序号索引）
+├─ kv                        命名空间键值（记忆、上下文、配置）
+├─ documents                 知识库文档
+└─ tasks                     任务（排队状态见 task_queue.py）
+
+WAL 模式下 API 服务和 Worker 可以同时读写：读不阻塞写，
+写操作逐行更新，不会像整文件重写那样互相覆盖。
+
+连接池：线程第一次访问时借一个连接，线程结束时归还（Flask 每个请求一个新线程，
+连接、预编译语句缓存和建表检查都跨请求复用）。
+
+读缓存：进程级 LRU（加锁），缓存解析后的对象（配置、记忆、文档列表、会话列表），
+以一个只读“观察连接”的 PRAGMA data_version 作为校验戳：本进程任一连接或其他进程提交都会改变它，
+变化即整体失效，因此写操作天然直达、缓存保持一致。事务内的读取不走缓存（可能读到未提交的数据）。
+"""
+import os
+import json
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Iterator, Callable, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BASE_DIR, 'data')
+DB_PATH = os.getenv('CAREERPILOT_DB', os.path.join(DATA_DIR, 'careerpilot.db'))
+
+# 旧版 JSON 数据文件（迁移来源）
+LEGACY_CONFIG_FILE = os.path.join(BASE_DIR, 'user_config.json')
+LEGACY_TASKS_FILE = os.path.join(BASE_DIR, 'user_tasks.json')
+LEGACY_MEMORY_DIR = os.path.join(DATA_DIR, 'memory')
+LEGACY_KNOWLEDGE_DIR = os.path.join(DATA_DIR, 'knowledge')
+LEGACY_CONVERSATIONS_DIR = os.path.join(DATA_DIR, 'conversations')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    header TEXT NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    conv_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (conv_id, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS documents (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL,
+    meta TEXT NOT NULL,
+    content TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_documents_type ON documents (type, seq);
+CREATE TABLE IF NOT EXISTS tasks (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, seq);
+"""
+
+# 任务变更序号：每次写入任务取全局递增的 version，删除留下墓碑，订阅方只查 version 之后的变化
+# （旧库的 tasks 表没有 version 列，补列后才能建索引，所以单独注册）
+TASK_CHANGES_SCHEMA = """
+CREATE INDEX IF NOT EXISTS idx_tasks_version ON tasks (version);
+CREATE TABLE IF NOT EXISTS task_removed (
+    id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_task_removed_version ON task_removed (version);
+"""
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+class _Lease:
+    """线程借用的连接；线程结束、线程局部变量被清理时连接自动归还连接池"""
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+
+class SQLiteStorage:
+    """SQLite 存储后端（连接池，每线程借用一个连接）"""
+
+    CACHE_SIZE = 256  # 进程级缓存的条目数
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schemas: List[str] = [SCHEMA]
+        self._pool_lock = threading.Lock()
+        self._idle: List[sqlite3.Connection] = []
+        self._cache_lock = threading.Lock()
+        self._cache: OrderedDict = OrderedDict()
+        self._stamp = None
+        # 首个连接负责建表
+        self.connection()
+        # 观察连接只用来读 data_version，从不写入，所以任何提交都会改变它的值
+        self._watch = self._open()
+        columns = {row['name'] for row in self.query('PRAGMA table_info(tasks)')}
+        if 'version' not in columns:
+            self.execute('ALTER TABLE tasks ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+        self.ensure_schema(TASK_CHANGES_SCHEMA)
+
+    # ========== 连接与事务 ==========
+
+    def _open(self) -> sqlite3.Connection:
+        # isolation_level=None：自动提交，显式事务由 transaction() 管理
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None,
+                               check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=10000')
+        with self._schema_lock:
+            for schema in self._schemas:
+                conn.executescript(schema)
+        return conn
+
+    def _checkin(self, conn: sqlite3.Connection):
+        """线程结束时归还连接（未结束的事务回滚）"""
+        try:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._pool_lock:
+            self._idle.append(conn)
+
+    def connection(self) -> sqlite3.Connection:
+        lease = getattr(self._local, 'lease', None)
+        if lease is None:
+            with self._pool_lock:
+                conn = self._idle.pop() if self._idle else None
+            lease = _Lease(conn or self._open())
+            weakref.finalize(lease, self._checkin, lease.conn)
+            self._local.lease = lease
+        return lease.conn
+
+    def ensure_schema(self, schema: str):
+        """注册额外的表结构（供索引、队列等模块扩展）"""
+        with self._schema_lock:
+            if schema not in self._schemas:
+                self._schemas.append(schema)
+        self.connection().executescript(schema)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务：BEGIN IMMEDIATE 提前拿写锁，避免读后写的死锁"""
+        conn = self.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        return self.connection().execute(sql, params)
+
+    def query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        return self.connection().execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        return self.connection().execute(sql, params).fetchone()
+
+    # ========== 读缓存 ==========
+
+    def cached(self, key: Any, loader: Callable[[], Any]) -> Any:
+        """读取缓存，数据库有变化（本进程任一连接或其他进程提交）时重新加载
+
+        返回的对象与缓存共享（跨线程），调用方不得原地修改，修改后须写回数据库。
+        """
+        if self.connection().in_transaction:
+            # 事务内可能读到本事务未提交的写入，不能放进共享缓存
+            return loader()
+        with self._cache_lock:
+            stamp = self._watch.execute('PRAGMA data_version').fetchone()[0]
+            if stamp != self._stamp:
+                self._cache.clear()
+                self._stamp = stamp
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        # 加载不持锁；期间若有新的提交，校验戳已变，结果不放入缓存
+        value = loader()
+        with self._cache_lock:
+            if self._stamp == stamp and self._watch.execute('PRAGMA data_version').fetchone()[0] == stamp:
+                self._cache[key] = value
+                if len(self._cache) > self.CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        return value
+
+    # ========== 键值 ==========
+
+    def _kv_namespace(self, namespace: str) -> Dict[str, Any]:
+        def load():
+            rows = self.query('SELECT key, value FROM kv WHERE namespace = ?', (namespace,))
+            return {r['key']: json.loads(r['value']) for r in rows}
+        return self.cached(('kv', namespace), load)
+
+    def kv_get(self, namespace: str, key: str, default: Any = None) -> Any:
+        return self._kv_namespace(namespace).get(key, default)
+
+    def kv_set(self, namespace: str, key: str, value: Any):
+        self.execute('INSERT INTO kv (namespace, key, value) VALUES (?, ?, ?) '
+                     'ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value',
+                     (namespace, key, _dumps(value)))
+
+    def kv_delete(self, namespace: str, key: str) -> bool:
+        cur = self.execute('DELETE FROM kv WHERE namespace = ? AND key = ?', (namespace, key))
+        return cur.rowcount > 0
+
+    def kv_items(self, namespace: str) -> Dict[str, Any]:
+        return dict(self._kv_namespace(namespace))
+
+    def kv_namespaces(self, prefix: str) -> Dict[str, Dict[str, Any]]:
+        """按命名空间前缀批量读取：{namespace: {key: value}}"""
+        def load():
+            # 前缀范围查询走主键索引
+            rows = self.query('SELECT namespace, key, value FROM kv WHERE namespace >= ? AND namespace < ?',
+                              (prefix, prefix + '\uffff'))
+            result: Dict[str, Dict[str, Any]] = {}
+            for r in rows:
+                result.setdefault(r['namespace'], {})[r['key']] = json.loads(r['value'])
+            return result
+        return {ns: dict(items) for ns, items in self.cached(('kv_prefix', prefix), load).items()}
+
+    # ========== 用户配置 ==========
+
+    def load_config(self) -> Dict:
+        return self.kv_items('config')
+
+    def update_config(self, updates: Dict):
+        with self.transaction():
+            for key, value in updates.items():
+                self.kv_set('config', key, value)
+
+    def save_config(self, config: Dict):
+        """整体替换配置"""
+        with self.transaction():
+            self.execute("DELETE FROM kv WHERE namespace = 'config'")
+            for key, value in config.items():
+                self.kv_set('config', key, value)
+
+    # ========== 任务 ==========
+
+    def list_tasks(self) -> List[Dict]:
+        """最新任务在前"""
+        rows = self.query('SELECT data FROM tasks ORDER BY seq DESC')
+        return [json.loads(r['data']) for r in rows]
+
+    def _next_task_version(self) -> int:
+        """下一个任务变更序号（需在写事务内调用；两处取最大值都走索引）"""
+        row = self.query_one('SELECT MAX(v) AS v FROM (SELECT MAX(version) AS v FROM tasks '
+                             'UNION ALL SELECT MAX(version) FROM task_removed)')
+        return (row['v'] or 0) + 1
+
+    def task_version(self) -> int:
+        """当前最新的任务变更序号"""
+        return self._next_task_version() - 1
+
+    def task_changes(self, since: int) -> Tuple[List[Dict], List[str], int]:
+        """version 之后变化的任务与被删除的任务 ID，返回 (任务, 删除的 ID, 最新序号)"""
+        rows = self.query('SELECT data, version FROM tasks WHERE version > ? ORDER BY version', (since,))
+        removed = self.query('SELECT id, version FROM task_removed WHERE version > ? ORDER BY version', (since,))
+        latest = max([since] + [r['version'] for r in rows] + [r['version'] for r in removed])
+        return [json.loads(r['data']) for r in rows], [r['id'] for r in removed], latest
+
+    def get_task(self, task_id: str) -> Optional[Dict]:
+        row = self.query_one('SELECT data FROM tasks WHERE id = ?', (task_id,))
+        return json.loads(row['data']) if row else None
+
+    def insert_task(self, task: Dict) -> Dict:
+        with self.transaction():
+            self.execute('INSERT INTO tasks (id, status, data, version) VALUES (?, ?, ?, ?)',
+                         (task['id'], task.get('status', 'pending'), _dumps(task), self._next_task_version()))
+            self.execute('DELETE FROM task_removed WHERE id = ?', (task['id'],))
+        return task
+
+    def update_task(self, task_id: str, **fields) -> Optional[Dict]:
+        with self.transaction():
+            task = self.get_task(task_id)
+            if task is None:
+                return None
+            task.update(fields)
+            self.execute('UPDATE tasks SET status = ?, data = ?, version = ? WHERE id = ?',
+                         (task.get('status', 'pending'), _dumps(task), self._next_task_version(), task_id))
+        return task
+
+    def delete_task(self, task_id: str) -> bool:
+        with self.transaction():
+            # 先取序号：被删的任务可能正持有最大的 version
+            version = self._next_task_version()
+            if self.execute('DELETE FROM tasks WHERE id = ?', (task_id,)).rowcount == 0:
+                return False
+            # 墓碑：订阅方据此发出删除事件
+            self.execute('INSERT OR REPLACE INTO task_removed (id, version) VALUES (?, ?)', (task_id, version))
+        return True
+
+    # ========== 迁移 ==========
+
+    def migrate_from_json(self, force: bool = False) -> Dict[str, int]:
+        """一次性把旧 JSON 文件导入数据库，返回各类记录数"""
+        if not force and self.kv_get('meta', 'json_migrated'):
+            return {}
+        stats = {}
+        with self.transaction():
+            # API 和 Worker 同时启动时可能都通过了上面的检查；拿到写锁后直接查库再确认一次，
+            # 避免后到的进程重复导入、覆盖先到进程迁移后已保存的配置
+            if not force and self.query_one("SELECT 1 FROM kv WHERE namespace = 'meta' AND key = 'json_migrated'"):
+                return {}
+            stats['config'] = self._migrate_config()
+            stats['tasks'] = self._migrate_tasks()
+            stats['memory'] = self._migrate_memory()
+            stats['documents'] = self._migrate_knowledge()
+            stats['conversations'] = self._migrate_conversations()
+            self.kv_set('meta', 'json_migrated', True)
+        return stats
+
+    @staticmethod
+    def _read_json(path: str, default: Any) -> Any:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return default
+
+    def _migrate_config(self) -> int:
+        config = self._read_json(LEGACY_CONFIG_FILE, {})
+        for key, value in config.items():
+            self.kv_set('config', key, value)
+        return len(config)
+
+    def _migrate_tasks(self) -> int:
+        tasks = self._read_json(LEGACY_TASKS_FILE, [])
+        # 旧文件最新任务在前，按创建顺序插入
+        for task in reversed(tasks):
+            if 'id' not in task:
+                continue
+            self.execute('INSERT OR IGNORE INTO tasks (id, status, data) VALUES (?, ?, ?)',
+                         (task['id'], task.get('status', 'pending'), _dumps(task)))
+        return len(tasks)
+
+    def _migrate_memory(self) -> int:
+        count = 0
+        memory = self._read_json(os.path.join(LEGACY_MEMORY_DIR, 'long_term_memory.json'), {})
+        for category, items in memory.items():
+            for key, value in (items or {}).items():
+                self.kv_set(f'memory:{category}', key, value)
+                count += 1
+        context = self._read_json(os.path.join(LEGACY_MEMORY_DIR, 'context_memory.json'), {})
+        for key, value in context.items():
+            self.kv_set('context', key, value)
+            count += 1
+        return count
+
+    def _migrate_knowledge(self) -> int:
+        index = self._read_json(os.path.join(LEGACY_KNOWLEDGE_DIR, 'index.json'), [])
+        if isinstance(index, dict):
+            index = index.get('documents', [])
+        for entry in reversed(index):
+            doc = self._read_json(os.path.join(LEGACY_KNOWLEDGE_DIR, f"{entry['id']}.json"), entry)
+            meta = {k: v for k, v in doc.items() if k != 'content'}
+            self.execute('INSERT OR IGNORE INTO documents (id, type, meta, content) VALUES (?, ?, ?, ?)',
+                         (doc['id'], doc.get('type', 'note'), _dumps(meta), doc.get('content', '')))
+        return len(index)
+
+    def _migrate_conversations(self) -> int:
+        if os.path.exists(os.path.join(LEGACY_CONVERSATIONS_DIR, 'index.jsonl')):
+            from conversation_store import JsonlConversationStore
+            store = JsonlConversationStore(LEGACY_CONVERSATIONS_DIR)
+            conversations = [dict(h, messages=store.get_messages(h['id'])) for h in store.list_headers(0)]
+        else:
+            conversations = self._read_json(os.path.join(LEGACY_CONVERSATIONS_DIR, 'conversations.json'), [])
+
+        for conv in reversed(conversations):
+            messages = conv.get('messages', [])
+            header = {k: v for k, v in conv.items() if k not in ('messages', 'message_count')}
+            cur = self.execute('INSERT OR IGNORE INTO conversations (id, header, message_count) VALUES (?, ?, ?)',
+                               (conv['id'], _dumps(header), len(messages)))
+            if cur.rowcount == 0:
+                continue
+            self.connection().executemany(
+                'INSERT INTO messages (conv_id, seq, data) VALUES (?, ?, ?)',
+                [(conv['id'], i, _dumps(m)) for i, m in enumerate(messages)])
+        return len(conversations)
+
+
+_storage: Optional[SQLiteStorage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> SQLiteStorage:
+    """进程级共享存储（首次打开时自动迁移旧 JSON 数据）"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                storage = SQLiteStorage(DB_PATH)
+                storage.migrate_from_json()
+                _storage = storage
+    return _storage
+
+
+if __name__ == '__main__':
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        result = SQLiteStorage(DB_PATH).migrate_from_json(force='--force' in sys.argv)
+        if result:
+            print(f'✅ 迁移完成: {result}')
+        else:
+            print('ℹ️ 已迁移过，如需重新导入请加 --force')
+    else:
+        print('用法: python storage.py migrate [--force]')
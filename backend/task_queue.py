@@ -0,0 +1,329 @@
+"""
+任务队列 - 基于 SQLite 的持久化作业队列
+task_queue 表只保存未完成的队列项（排队中 / 已租出），确认后即删除，
+取任务只看队首，与历史任务总数无关。任务详情和进度仍在 tasks 表。
+
+流程：
+├─ submit / enqueue   写入任务并入队（同一事务）
+├─ claim              在一个写事务里取队首任务并加租约（lease），任务状态置为 running；
+│                     多个 Worker 进程同时领取也不会拿到同一个任务
+├─ heartbeat          续租；执行期间由 keep_alive() 在后台线程定时调用
+├─ complete / ack     写入结果并出队
+├─ release            放回队列（失败重试）
+└─ wait               阻塞等待新任务：同进程入队直接唤醒，
+                      跨进程轮询 PRAGMA data_version 感知其他连接的提交（不读盘，几乎无开销），
+                      有提交时再比较队列版本号，只有队列本身变化（入队 / 出队 / 状态变化）才唤醒；
+                      心跳、对话、缓存等其他写入不会让空闲 Worker 去抢写锁
+
+租约到期（Worker 崩溃、不再续租）的任务在下一次 claim 时自动放回队列，
+超过 MAX_ATTEMPTS 次仍未完成的标记为失败。
+
+并发上限（同一账号 / 同一城市同时执行的任务数，0 表示不限）：
+├─ CAREERPILOT_TASK_MAX_PER_ACCOUNT   默认 1（同一个 BOSS 账号同时只开一个浏览器会话）
+├─ CAREERPILOT_TASK_MAX_PER_CITY      默认 0
+└─ CAREERPILOT_TASK_LEASE             租约秒数，默认 60
+"""
+import os
+import time
+import socket
+import threading
+from contextlib import contextmanager
+from typing import Optional, Dict, Iterator
+
+from storage import get_storage, SQLiteStorage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_queue (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL DEFAULT 'queued',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    account TEXT NOT NULL DEFAULT '',
+    city TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_task_queue_state ON task_queue (state, seq);
+CREATE INDEX IF NOT EXISTS idx_task_queue_lease ON task_queue (state, lease_expires);
+CREATE TABLE IF NOT EXISTS task_queue_version (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    version INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO task_queue_version (id, version) VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS task_queue_inserted AFTER INSERT ON task_queue
+BEGIN UPDATE task_queue_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS task_queue_deleted AFTER DELETE ON task_queue
+BEGIN UPDATE task_queue_version SET version = version + 1; END;
+CREATE TRIGGER IF NOT EXISTS task_queue_state_changed AFTER UPDATE OF state ON task_queue
+BEGIN UPDATE task_queue_version SET version = version + 1; END;
+"""
+
+LEASE_SECONDS = float(os.getenv('CAREERPILOT_TASK_LEASE', 60))   # 默认租约时长
+MAX_ATTEMPTS = 3        # 租约过期重新排队的次数上限
+POLL_INTERVAL = 0.05    # wait() 检查 data_version 的间隔（秒）
+CLAIM_SCAN = 50         # 队首受并发上限阻塞时，往后最多查看的任务数
+
+# 旧版 task_queue 表缺少的列
+MIGRATIONS = {
+    'account': "ALTER TABLE task_queue ADD COLUMN account TEXT NOT NULL DEFAULT ''",
+    'city': "ALTER TABLE task_queue ADD COLUMN city TEXT NOT NULL DEFAULT ''",
+}
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseLost(Exception):
+    """任务租约已丢失（已过期或被其他 Worker 接手），当前执行必须停止"""
+
+
+class TaskQueue:
+    """持久化任务队列（支持多进程：API 入队，Worker 领取）"""
+
+    def __init__(self, storage: Optional[SQLiteStorage] = None,
+                 max_per_account: int = None, max_per_city: int = None):
+        self.storage = storage or get_storage()
+        self.storage.ensure_schema(SCHEMA)
+        self.max_per_account = int(os.getenv('CAREERPILOT_TASK_MAX_PER_ACCOUNT', 1)) \
+            if max_per_account is None else max_per_account
+        self.max_per_city = int(os.getenv('CAREERPILOT_TASK_MAX_PER_CITY', 0)) \
+            if max_per_city is None else max_per_city
+        self._cond = threading.Condition()
+        self._generation = 0             # 本进程入队 / 出队计数，唤醒同进程所有等待线程
+        self._local = threading.local()  # 每线程记录 claim 时看到的队列版本号和 generation
+        self._migrate()
+        self._adopt_pending()
+
+    def _migrate(self):
+        columns = {row['name'] for row in self.storage.query('PRAGMA table_info(task_queue)')}
+        for column, sql in MIGRATIONS.items():
+            if column not in columns:
+                self.storage.execute(sql)
+
+    def _adopt_pending(self):
+        """把队列表出现之前创建、仍为 pending 的任务补入队列"""
+        self.storage.execute("INSERT OR IGNORE INTO task_queue (task_id) "
+                             "SELECT id FROM tasks WHERE status = 'pending' ORDER BY seq")
+
+    # ========== 入队 ==========
+
+    def _notify(self):
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+
+    def enqueue(self, task_id: str, account: str = '', city: str = ''):
+        self.storage.execute('INSERT OR IGNORE INTO task_queue (task_id, account, city) VALUES (?, ?, ?)',
+                             (task_id, account or '', city or ''))
+        self._notify()
+
+    def submit(self, task: Dict) -> Dict:
+        """写入任务并入队；task 中的 account / city 用于并发上限分组"""
+        task.setdefault('status', 'pending')
+        account = task.get('account') or self._default_account()
+        with self.storage.transaction():
+            self.storage.insert_task(task)
+            self.enqueue(task['id'], account, task.get('city', ''))
+        return task
+
+    def _default_account(self) -> str:
+        """未指定账号时按配置中的 BOSS 登录账号分组"""
+        config = self.storage.load_config()
+        return str(config.get('bossPhone') or config.get('bossAccount') or '')
+
+    # ========== 领取与确认 ==========
+
+    def claim(self, worker_id: str = None, lease_seconds: float = None) -> Optional[Dict]:
+        """领取一个任务并加租约，返回任务详情；没有可执行的任务返回 None
+
+        按入队顺序领取，跳过所在账号 / 城市已达并发上限的任务。
+        """
+        worker_id = worker_id or default_worker_id()
+        lease_seconds = lease_seconds or LEASE_SECONDS
+        now = time.time()
+        # 先记下队列版本号：领取之后才提交的入队会让 wait() 立即返回，不会漏掉
+        self._local.version = self._queue_version()
+        with self._cond:
+            self._local.generation = self._generation
+        with self.storage.transaction():
+            self._requeue_expired(now)
+            running_accounts, running_cities = self._running_counts()
+            rows = self.storage.query("SELECT seq, task_id, account, city FROM task_queue WHERE state = 'queued' "
+                                      "ORDER BY seq LIMIT ?", (CLAIM_SCAN,))
+            for row in rows:
+                if self._at_limit(running_accounts, row['account'], self.max_per_account) or \
+                        self._at_limit(running_cities, row['city'], self.max_per_city):
+                    continue
+                task = self.storage.get_task(row['task_id'])
+                if task is None:
+                    # 任务已被删除
+                    self.storage.execute('DELETE FROM task_queue WHERE seq = ?', (row['seq'],))
+                    continue
+                self.storage.execute("UPDATE task_queue SET state = 'leased', lease_owner = ?, lease_expires = ?, "
+                                     "attempts = attempts + 1 WHERE seq = ?",
+                                     (worker_id, now + lease_seconds, row['seq']))
+                return self.storage.update_task(task['id'], status='running', worker=worker_id)
+        return None
+
+    @staticmethod
+    def _at_limit(counts: Dict[str, int], group: str, limit: int) -> bool:
+        return bool(group) and limit > 0 and counts.get(group, 0) >= limit
+
+    def _running_counts(self):
+        rows = self.storage.query("SELECT account, city FROM task_queue WHERE state = 'leased'")
+        accounts: Dict[str, int] = {}
+        cities: Dict[str, int] = {}
+        for row in rows:
+            accounts[row['account']] = accounts.get(row['account'], 0) + 1
+            cities[row['city']] = cities.get(row['city'], 0) + 1
+        return accounts, cities
+
+    def _requeue_expired(self, now: float) -> int:
+        """租约过期的任务放回队列（超过重试次数的标记失败），返回处理数"""
+        rows = self.storage.query("SELECT seq, task_id, lease_owner, attempts FROM task_queue "
+                                  "WHERE state = 'leased' AND lease_expires < ?", (now,))
+        for row in rows:
+            if row['attempts'] >= MAX_ATTEMPTS:
+                self.storage.execute('DELETE FROM task_queue WHERE seq = ?', (row['seq'],))
+                self.storage.update_task(row['task_id'], status='failed',
+                                         log=f"失败: 执行者 {row['lease_owner']} 租约过期，已重试 {row['attempts']} 次")
+            else:
+                self.storage.execute("UPDATE task_queue SET state = 'queued', lease_owner = NULL, "
+                                     "lease_expires = NULL WHERE seq = ?", (row['seq'],))
+                self.storage.update_task(row['task_id'], status='pending',
+                                         log=f"执行者 {row['lease_owner']} 无响应，任务已重新排队")
+        return len(rows)
+
+    def heartbeat(self, task_id: str, worker_id: str, lease_seconds: float = None) -> bool:
+        """续租；租约已不属于该 Worker（过期后被重新领取、任务被删除）时返回 False"""
+        lease_seconds = lease_seconds or LEASE_SECONDS
+        cursor = self.storage.execute("UPDATE task_queue SET lease_expires = ? WHERE task_id = ? "
+                                      "AND state = 'leased' AND lease_owner = ?",
+                                      (time.time() + lease_seconds, task_id, worker_id))
+        return cursor.rowcount > 0
+
+    @contextmanager
+    def keep_alive(self, task_id: str, worker_id: str, lease_seconds: float = None) -> Iterator[threading.Event]:
+        """执行期间在后台线程定时续租；yield 的 Event 在租约丢失时被置位，执行方应随即停止
+
+        连续续租失败、距上次成功续租已超过租约的 2/3 时也视为丢失：
+        此时租约可能在下一次续租前过期并被其他 Worker 接手，提前停止避免同一任务两处执行。
+        """
+        lease_seconds = lease_seconds or LEASE_SECONDS
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def beat():
+            renewed = time.monotonic()
+            while not stop.wait(lease_seconds / 3):
+                try:
+                    if not self.heartbeat(task_id, worker_id, lease_seconds):
+                        lost.set()
+                        return
+                    renewed = time.monotonic()
+                except Exception as e:
+                    print(f"⚠️ 续租失败: {e}")
+                    if time.monotonic() - renewed >= lease_seconds * 2 / 3:
+                        lost.set()
+                        return
+                    # 数据库暂时繁忙，下一轮再试
+
+        thread = threading.Thread(target=beat, name=f'lease-{task_id}', daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stop.set()
+            thread.join()
+
+    def ack(self, task_id: str):
+        """确认完成，出队"""
+        self.storage.execute('DELETE FROM task_queue WHERE task_id = ?', (task_id,))
+        self._notify()
+
+    def complete(self, task_id: str, worker_id: str = None, **fields) -> Optional[Dict]:
+        """写入最终状态并出队（同一事务）；指定 worker_id 时，租约已被他人接手则不写入，返回 None"""
+        with self.storage.transaction():
+            if worker_id is not None and not self._owns(task_id, worker_id):
+                return None
+            task = self.storage.update_task(task_id, **fields)
+            self.ack(task_id)
+        return task
+
+    def _owns(self, task_id: str, worker_id: str) -> bool:
+        row = self.storage.query_one('SELECT lease_owner FROM task_queue WHERE task_id = ?', (task_id,))
+        return row is not None and row['lease_owner'] == worker_id
+
+    def release(self, task_id: str):
+        """放回队列，等待重新领取"""
+        with self.storage.transaction():
+            self.storage.execute("UPDATE task_queue SET state = 'queued', lease_owner = NULL, lease_expires = NULL "
+                                 "WHERE task_id = ?", (task_id,))
+            self.storage.update_task(task_id, status='pending')
+        self._notify()
+
+    def cancel(self, task_id: str):
+        """删除任务时一并出队"""
+        with self.storage.transaction():
+            self.ack(task_id)
+            self.storage.delete_task(task_id)
+
+    # ========== 等待 ==========
+
+    def _data_version(self) -> int:
+        return self.storage.connection().execute('PRAGMA data_version').fetchone()[0]
+
+    def _queue_version(self) -> int:
+        """队列版本号：task_queue 入队、出队、状态变化时由触发器递增"""
+        return self.storage.query_one('SELECT version FROM task_queue_version WHERE id = 0')['version']
+
+    def wait(self, timeout: float = 30.0) -> bool:
+        """阻塞到可能有新任务（本进程入队 / 出队，或其他进程改动了队列）或超时；返回是否被唤醒"""
+        deadline = time.monotonic() + timeout
+        version = getattr(self._local, 'version', None)
+        if version is None:
+            version = self._queue_version()
+        elif self._queue_version() != version:
+            return True
+        generation = getattr(self._local, 'generation', None)
+        self._local.version = self._local.generation = None
+        data_version = self._data_version()
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            with self._cond:
+                if generation is None:
+                    generation = self._generation
+                if self._generation != generation or \
+                        self._cond.wait_for(lambda: self._generation != generation, min(POLL_INTERVAL, remaining)):
+                    return True
+            # data_version 只说明有提交，可能是心跳、对话等无关写入；队列版本号变化才值得去领取
+            current = self._data_version()
+            if current != data_version:
+                data_version = current
+                if self._queue_version() != version:
+                    return True
+
+    def stats(self) -> Dict:
+        rows = self.storage.query('SELECT state, COUNT(*) AS n FROM task_queue GROUP BY state')
+        stats = {r['state']: r['n'] for r in rows}
+        leases = self.storage.query("SELECT task_id, lease_owner, lease_expires, attempts FROM task_queue "
+                                    "WHERE state = 'leased' ORDER BY seq")
+        stats['leases'] = [dict(r) for r in leases]
+        stats['limits'] = {'per_account': self.max_per_account, 'per_city': self.max_per_city}
+        return stats
+
+
+_queue: Optional[TaskQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_task_queue() -> TaskQueue:
+    """进程级单例"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = TaskQueue()
+        return _queue
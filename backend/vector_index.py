@@ -0,0 +1,318 @@
+"""
+知识库向量索引 - 语义检索
+├─ 向量化：默认本地哈希向量（中文二元组 + 英文单词，离线可用），可注册其他模型
+├─ 存储：float32 矩阵放在内存映射文件 data/vectors/<模型>.f32，行号映射存 SQLite
+└─ 检索：归一化后一次矩阵-向量乘积求余弦相似度；数据量大时启用 IVF 近似索引
+
+向量在文档入库时计算，检索时只需对查询向量化一次。
+依赖 numpy；未安装时 HAS_NUMPY 为 False，知识库退回全文检索。
+"""
+import os
+import math
+import zlib
+import threading
+from collections import Counter
+from typing import Optional, List, Dict, Tuple, Callable
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:  # 可选依赖
+    np = None
+    HAS_NUMPY = False
+
+from search_index import tokenize
+
+VECTORS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'vectors')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS vector_rows (
+    model TEXT NOT NULL,
+    key TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    doc_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    PRIMARY KEY (model, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_vector_rows_doc ON vector_rows (model, doc_id);
+CREATE TABLE IF NOT EXISTS vector_free (
+    model TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    PRIMARY KEY (model, row)
+) WITHOUT ROWID;
+"""
+
+
+# ========== 向量化模型 ==========
+
+class HashingVectorizer:
+    """特征哈希向量化：无需训练，同一文本在任何进程中得到同一向量"""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+        self.name = f'hash{dim}'
+
+    def encode(self, texts: List[str]) -> 'np.ndarray':
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for token, tf in Counter(tokenize(text)).items():
+                h = zlib.crc32(token.encode('utf-8'))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                matrix[i, h % self.dim] += sign * (1.0 + math.log(tf))  # 亚线性词频
+        return _normalize(matrix)
+
+
+_VECTORIZERS: Dict[str, Callable[[], object]] = {
+    'hash': HashingVectorizer,
+}
+
+
+def register_vectorizer(name: str, factory: Callable[[], object]):
+    """注册向量化模型：factory() 返回带 name / dim / encode(texts) 的对象"""
+    _VECTORIZERS[name] = factory
+
+
+def create_vectorizer(name: Optional[str] = None):
+    name = name or os.getenv('CAREERPILOT_EMBEDDER', 'hash')
+    if name not in _VECTORIZERS:
+        raise ValueError(f'未知的向量化模型: {name}')
+    return _VECTORIZERS[name]()
+
+
+def _normalize(matrix: 'np.ndarray') -> 'np.ndarray':
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# ========== 索引 ==========
+
+class VectorIndex:
+    """内存映射向量矩阵 + 可选 IVF 近似检索"""
+
+    INITIAL_ROWS = 1024
+    # 行数超过该值时建立 IVF（倒排文件）索引，按簇探查
+    IVF_THRESHOLD = 20000
+    IVF_NPROBE = 8
+
+    def __init__(self, storage, vectorizer=None, directory: str = VECTORS_DIR):
+        if not HAS_NUMPY:
+            raise RuntimeError('向量索引需要 numpy')
+        self.storage = storage
+        self.storage.ensure_schema(SCHEMA)
+        self.vectorizer = vectorizer or create_vectorizer()
+        self.model = self.vectorizer.name
+        self.dim = self.vectorizer.dim
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'{self.model}.f32')
+
+        self._lock = threading.RLock()
+        self._matrix = None
+        self._keys: Dict[int, Tuple[str, str, str]] = {}  # row -> (key, doc_id, type)
+        self._valid = np.zeros(0, dtype=bool)             # 行是否有效（删除的行为 False）
+        self._types = np.zeros(0, dtype=np.int32)         # 行的文档类型编号
+        self._type_codes: Dict[str, int] = {}
+        self._generation = None
+        self._ivf = None        # (centroids, {簇: 行号数组}, 建索引时的行数)
+        self._ivf_pending = []  # 建 IVF 之后新增的行
+
+    # ========== 文件与映射 ==========
+
+    def _open_matrix(self, rows: int):
+        if not os.path.exists(self.path):
+            open(self.path, 'wb').close()
+        size = os.path.getsize(self.path)
+        needed = rows * self.dim * 4
+        if size < needed:
+            with open(self.path, 'r+b') as f:
+                f.truncate(needed)  # 扩容部分为 0
+            size = needed
+        self._matrix = np.memmap(self.path, dtype=np.float32, mode='r+', shape=(size // (self.dim * 4), self.dim))
+        capacity = self._matrix.shape[0]
+        if len(self._valid) < capacity:
+            grow = capacity - len(self._valid)
+            self._valid = np.concatenate([self._valid, np.zeros(grow, dtype=bool)])
+            self._types = np.concatenate([self._types, np.zeros(grow, dtype=np.int32)])
+
+    def _capacity(self) -> int:
+        return 0 if self._matrix is None else self._matrix.shape[0]
+
+    def _ensure_capacity(self, row: int):
+        if row < self._capacity():
+            return
+        if self._matrix is not None:
+            self._matrix.flush()
+        self._open_matrix(max(self.INITIAL_ROWS, self._capacity() * 2, row + 1))
+
+    def _gen_key(self) -> str:
+        return f'vector_generation:{self.model}'
+
+    def _bump_generation(self):
+        gen = self.storage.kv_get('meta', self._gen_key(), 0) + 1
+        self.storage.kv_set('meta', self._gen_key(), gen)
+        self._generation = gen
+
+    def _ensure_loaded(self):
+        gen = self.storage.kv_get('meta', self._gen_key(), 0)
+        if gen == self._generation:
+            return
+        rows = self.storage.query('SELECT key, row, doc_id, type FROM vector_rows WHERE model = ?', (self.model,))
+        self._keys = {}
+        self._valid = np.zeros(0, dtype=bool)
+        self._types = np.zeros(0, dtype=np.int32)
+        self._open_matrix(max((r['row'] for r in rows), default=-1) + 1)
+        for r in rows:
+            self._set_row(r['row'], r['key'], r['doc_id'], r['type'])
+        self._ivf = None
+        self._ivf_pending = []
+        self._generation = gen
+
+    # ========== 写入 ==========
+
+    def _type_code(self, doc_type: str) -> int:
+        if doc_type not in self._type_codes:
+            self._type_codes[doc_type] = len(self._type_codes) + 1
+        return self._type_codes[doc_type]
+
+    def _set_row(self, row: int, key: str, doc_id: str, doc_type: str):
+        self._keys[row] = (key, doc_id, doc_type)
+        self._valid[row] = True
+        self._types[row] = self._type_code(doc_type)
+
+    def _allocate_rows(self, count: int) -> List[int]:
+        """优先复用已删除的行，其余接在末尾"""
+        free = [r['row'] for r in self.storage.query('SELECT row FROM vector_free WHERE model = ? ORDER BY row LIMIT ?',
+                                                     (self.model, count))]
+        self.storage.connection().executemany('DELETE FROM vector_free WHERE model = ? AND row = ?',
+                                              [(self.model, row) for row in free])
+        last = self.storage.query_one('SELECT MAX(row) AS m FROM vector_rows WHERE model = ?', (self.model,))['m']
+        start = 0 if last is None else last + 1
+        return free + list(range(start, start + count - len(free)))
+
+    def add(self, items: List[Tuple[str, str, str, str]]):
+        """批量写入 [(key, doc_id, 类型, 文本)]；key 已存在则覆盖"""
+        if not items:
+            return
+        vectors = self.vectorizer.encode([text for _, _, _, text in items])
+        with self._lock, self.storage.transaction():
+            self._ensure_loaded()
+            existing = {}
+            for key, _, _, _ in items:
+                row = self.storage.query_one('SELECT row FROM vector_rows WHERE model = ? AND key = ?',
+                                             (self.model, key))
+                if row:
+                    existing[key] = row['row']
+            fresh = iter(self._allocate_rows(len(items) - len(existing)))
+            records = []
+            for (key, doc_id, doc_type, _), vector in zip(items, vectors):
+                row = existing[key] if key in existing else next(fresh)
+                self._ensure_capacity(row)
+                self._matrix[row] = vector
+                self._set_row(row, key, doc_id, doc_type)
+                self._ivf_pending.append(row)
+                records.append((self.model, key, row, doc_id, doc_type))
+            self.storage.connection().executemany(
+                'INSERT OR REPLACE INTO vector_rows (model, key, row, doc_id, type) VALUES (?, ?, ?, ?, ?)', records)
+            self._matrix.flush()
+            self._bump_generation()
+
+    def remove_doc(self, doc_id: str):
+        """删除某文档的所有向量"""
+        with self._lock, self.storage.transaction():
+            self._ensure_loaded()
+            rows = self.storage.query('SELECT row FROM vector_rows WHERE model = ? AND doc_id = ?',
+                                      (self.model, doc_id))
+            if not rows:
+                return
+            for r in rows:
+                self._matrix[r['row']] = 0
+                self._keys.pop(r['row'], None)
+                self._valid[r['row']] = False
+                self.storage.execute('INSERT OR IGNORE INTO vector_free (model, row) VALUES (?, ?)',
+                                     (self.model, r['row']))
+            self.storage.execute('DELETE FROM vector_rows WHERE model = ? AND doc_id = ?', (self.model, doc_id))
+            self._matrix.flush()
+            self._bump_generation()
+
+    def indexed_doc_ids(self, passages_only: bool = False) -> set:
+        """已建向量的文档；passages_only 时只算按段落（key 形如 doc_id#seq）建的"""
+        sql = 'SELECT DISTINCT doc_id FROM vector_rows WHERE model = ?'
+        if passages_only:
+            sql += " AND key LIKE '%#%'"
+        rows = self.storage.query(sql, (self.model,))
+        return {r['doc_id'] for r in rows}
+
+    # ========== IVF ==========
+
+    def _build_ivf(self, rows: 'np.ndarray'):
+        """球面 k-means 粗聚类，簇数取 sqrt(n)"""
+        data = np.asarray(self._matrix[rows])
+        n_lists = max(1, int(math.sqrt(len(rows))))
+        rng = np.random.default_rng(0)
+        centroids = data[rng.choice(len(rows), n_lists, replace=False)]
+        for _ in range(8):
+            assign = np.argmax(data @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = data[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids = _normalize(centroids)
+        assign = np.argmax(data @ centroids.T, axis=1)
+        lists = {c: rows[assign == c] for c in range(n_lists)}
+        self._ivf = (centroids, lists, len(rows))
+        self._ivf_pending = []
+
+    def _probe_rows(self, query: 'np.ndarray', n_valid: int) -> Optional['np.ndarray']:
+        """IVF 候选行；数据量小时返回 None 表示全量扫描"""
+        if n_valid < self.IVF_THRESHOLD:
+            return None
+        # 行数翻倍后重建
+        if self._ivf is None or n_valid > 2 * self._ivf[2]:
+            self._build_ivf(np.flatnonzero(self._valid))
+        centroids, lists, _ = self._ivf
+        probe = np.argsort(-(centroids @ query))[:self.IVF_NPROBE]
+        parts = [lists[c] for c in probe] + [np.asarray(self._ivf_pending, dtype=np.int64)]
+        candidates = np.unique(np.concatenate(parts))
+        # 去掉已删除的行
+        return candidates[self._valid[candidates]]
+
+    # ========== 检索 ==========
+
+    def search(self, query: str, limit: int = 5, doc_type: str = None,
+               min_score: float = 0.0) -> List[Tuple[str, str, float]]:
+        """余弦相似度 top-k，返回 [(key, doc_id, score)]"""
+        q = self.vectorizer.encode([query])[0]
+        if not q.any() or limit <= 0:
+            return []
+        with self._lock:
+            self._ensure_loaded()
+            if not self._keys:
+                return []
+            mask = self._valid
+            if doc_type:
+                mask = mask & (self._types == self._type_codes.get(doc_type, -1))
+
+            rows = None if doc_type else self._probe_rows(q, len(self._keys))
+            if rows is None:
+                # 一次矩阵-向量乘积，无效行置为 -inf
+                scores = np.asarray(self._matrix @ q)
+                scores[~mask] = -np.inf
+                rows = np.arange(len(scores))
+            else:
+                scores = np.asarray(self._matrix[rows] @ q)
+
+            if not len(scores):
+                return []
+            k = min(limit, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for i in top:
+                if not scores[i] > min_score:
+                    break
+                key, doc_id, _ = self._keys[int(rows[i])]
+                results.append((key, doc_id, float(scores[i])))
+            return results
+
+    def __len__(self) -> int:
+        return len(self._keys)
@@ -1,36 +1,125 @@
 """
 任务执行器 Worker
 监控任务队列，使用 Agent 执行任务
+
+可以同时运行多个 Worker 进程，或用 --concurrency 在一个进程内开多个执行线程；
+任务通过带租约的领取分配，不会重复执行，崩溃的 Worker 的任务在租约过期后自动重新排队。
 """
-import time
-import json
 import os
+import time
+import argparse
+import threading
 
-TASKS_FILE = os.path.join(os.path.dirname(__file__), 'user_tasks.json')
-CONFIG_FILE = os.path.join(os.path.dirname(__file__), 'user_config.json')
+from storage import get_storage
+from task_queue import get_task_queue, default_worker_id, LeaseLost
+from progress import ProgressReporter
 
-def load_json(filepath, default):
-    if os.path.exists(filepath):
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return default
-    return default
+storage = get_storage()
+task_queue = get_task_queue()
 
-def save_json(filepath, data):
-    with open(filepath, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def run_task(pending, worker_id, agent, browser_pool):
+    """执行一个已领取的任务，执行期间后台续租"""
+    run_agent, execute_apply_task, parse_user_intent = agent
+    task_id = pending['id']
+    title = pending.get('title', '')
+    desc = pending.get('description', '')
+    
+    print()
+    print("═" * 60)
+    print(f"🚀 发现新任务! [{worker_id}]")
+    print(f"   标题: {title}")
+    print(f"   描述: {desc}")
+    print("═" * 60)
+    
+    # 进度在内存中合并，限频写库；阶段切换立即写
+    reporter = ProgressReporter(task_id)
+    reporter.transition(10, '正在解析任务...')
+    
+    # 组合标题和描述作为用户输入
+    user_input = f"{title} {desc}"
+    
+    with task_queue.keep_alive(task_id, worker_id) as lease_lost:
+        try:
+            # 使用 Agent 执行
+            print(f"\n💭 DeepSeek 解析用户意图...")
+            intent = parse_user_intent(user_input)
+            print(f"   → 关键词: {intent.get('keyword')}")
+            print(f"   → 城市: {intent.get('city')}")
+            print(f"   → 数量: {intent.get('count')}")
+            
+            reporter.transition(20, f"准备投递: {intent.get('keyword')} @ {intent.get('city')}")
+            
+            # 执行投递；租约丢失后任务可能已由其他 Worker 接手，立即停止，不能两处同时投递
+            def progress_callback(percent, msg):
+                if lease_lost.is_set():
+                    raise LeaseLost(task_id)
+                real_percent = 20 + int(percent * 0.7)  # 20-90%
+                reporter.update(real_percent, msg)
+            
+            result = execute_apply_task(
+                intent.get('keyword', ''),
+                intent.get('city', '北京'),
+                intent.get('count', 5),
+                progress_callback=progress_callback,
+                pool=browser_pool,
+                # 任务指定的浏览器配置优先，其次用户配置，最后环境变量默认值
+                profile=pending.get('profile') or storage.load_config().get('browserProfile'),
+                should_stop=lease_lost.is_set
+            )
+            if lease_lost.is_set():
+                raise LeaseLost(task_id)
+            
+            # 先写出未落库的进度，再写最终状态
+            reporter.close()
+            done = task_queue.complete(task_id, worker_id,
+                                       status='completed',
+                                       progress=100,
+                                       log=f'✅ 完成！成功投递 {result} 个职位')
+            
+            print()
+            print("═" * 60)
+            print(f"✅ 任务完成! 成功投递 {result} 个职位")
+            print("═" * 60)
+            
+        except LeaseLost:
+            # 结果不写入：任务已回到队列或由其他 Worker 执行（已投递的职位在台账里，接手方会跳过）
+            reporter.close(flush=False)
+            done = None
+            print(f"\n⛔ 租约已丢失，停止执行任务 {task_id}")
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            print(f"\n❌ 任务执行失败: {e}")
+            reporter.close()
+            done = task_queue.complete(task_id, worker_id, status='failed', log=f'失败: {str(e)}')
+    
+    print(f"📝 进度更新 {reporter.updates} 次，写库 {reporter.writes} 次")
+    if done is None:
+        reason = '租约已丢失' if lease_lost.is_set() else '任务已被删除或由其他 Worker 接手'
+        print(f"⚠️ 任务 {task_id} 的结果未写入：{reason}")
 
-def update_task(task_id, **kwargs):
-    tasks = load_json(TASKS_FILE, [])
-    for t in tasks:
-        if t['id'] == task_id:
-            t.update(kwargs)
-            break
-    save_json(TASKS_FILE, tasks)
+def worker_loop(worker_id, agent, browser_pool):
+    print(f"👀 [{worker_id}] 正在监视任务队列...")
+    
+    while True:
+        try:
+            # 领取一个任务（带租约）；没有可执行的任务时阻塞等待入队 / 出队通知
+            pending = task_queue.claim(worker_id)
+            if not pending:
+                task_queue.wait(timeout=30)
+                continue
+            run_task(pending, worker_id, agent, browser_pool)
+        except Exception as e:
+            print(f"⚠️ [{worker_id}] 监控出错: {e}")
+            time.sleep(5)
 
 def main():
+    parser = argparse.ArgumentParser(description='BOSS直聘数字员工 - Worker 执行器')
+    parser.add_argument('--concurrency', type=int,
+                        default=int(os.getenv('CAREERPILOT_WORKER_CONCURRENCY', 1)),
+                        help='本进程同时执行的任务数')
+    args = parser.parse_args()
+    
     print()
     print("╔══════════════════════════════════════════════════════════╗")
     print("║           BOSS直聘数字员工 - Worker 执行器                ║")
@@ -48,75 +137,24 @@ def main():
         print(f"❌ Agent 加载失败: {e}")
         return
     
-    print("👀 正在监视任务队列...\n")
+    agent = (run_agent, execute_apply_task, parse_user_intent)
+    # 浏览器会话在任务之间复用（每个执行线程一个）
+    from browser_pool import BrowserPool
+    browser_pool = BrowserPool()
+    limits = task_queue.stats()['limits']
+    print(f"⚙️ 并发: {args.concurrency} 线程，每账号上限 {limits['per_account'] or '不限'}，"
+          f"每城市上限 {limits['per_city'] or '不限'}\n")
     
-    while True:
-        try:
-            tasks = load_json(TASKS_FILE, [])
-            pending = next((t for t in tasks if t['status'] == 'pending'), None)
-            
-            if pending:
-                task_id = pending['id']
-                title = pending.get('title', '')
-                desc = pending.get('description', '')
-                
-                print()
-                print("═" * 60)
-                print(f"🚀 发现新任务!")
-                print(f"   标题: {title}")
-                print(f"   描述: {desc}")
-                print("═" * 60)
-                
-                update_task(task_id, status='running', progress=10, log='正在解析任务...')
-                
-                # 组合标题和描述作为用户输入
-                user_input = f"{title} {desc}"
-                
-                try:
-                    # 使用 Agent 执行
-                    print(f"\n💭 DeepSeek 解析用户意图...")
-                    intent = parse_user_intent(user_input)
-                    print(f"   → 关键词: {intent.get('keyword')}")
-                    print(f"   → 城市: {intent.get('city')}")
-                    print(f"   → 数量: {intent.get('count')}")
-                    
-                    update_task(task_id, progress=20, log=f"准备投递: {intent.get('keyword')} @ {intent.get('city')}")
-                    
-                    # 执行投递
-                    def progress_callback(percent, msg):
-                        real_percent = 20 + int(percent * 0.7)  # 20-90%
-                        update_task(task_id, progress=real_percent, log=msg)
-                    
-                    result = execute_apply_task(
-                        intent.get('keyword', ''),
-                        intent.get('city', '北京'),
-                        intent.get('count', 5)
-                    )
-                    
-                    update_task(task_id, 
-                              status='completed', 
-                              progress=100, 
-                              log=f'✅ 完成！成功投递 {result} 个职位')
-                    
-                    print()
-                    print("═" * 60)
-                    print(f"✅ 任务完成! 成功投递 {result} 个职位")
-                    print("═" * 60)
-                    
-                except Exception as e:
-                    import traceback
-                    traceback.print_exc()
-                    print(f"\n❌ 任务执行失败: {e}")
-                    update_task(task_id, status='failed', log=f'失败: {str(e)}')
-            
-            time.sleep(2)  # 每2秒检查一次
-            
-        except KeyboardInterrupt:
-            print("\n👋 Worker 已停止")
-            break
-        except Exception as e:
-            print(f"⚠️ 监控出错: {e}")
-            time.sleep(5)
+    base_id = default_worker_id()
+    for i in range(max(1, args.concurrency)):
+        worker_id = base_id if args.concurrency <= 1 else f"{base_id}#{i + 1}"
+        threading.Thread(target=worker_loop, args=(worker_id, agent, browser_pool), name=worker_id, daemon=True).start()
+    
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("\n👋 Worker 已停止")
 
 if __name__ == '__main__':
     main()
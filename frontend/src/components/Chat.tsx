@@ -102,8 +102,21 @@ export default function Chat({ conversationId, onConversationChange, onNavigate
     setSuggestions(null)
     setLoading(true)
 
+    const assistantId = (Date.now() + 1).toString()
+    let started = false
+    // 收到第一段内容时才插入助手消息，此前显示加载动画
+    const appendToAssistant = (text: string) => {
+      if (!started) {
+        started = true
+        setMessages(prev => [...prev, { id: assistantId, role: 'assistant', content: text }])
+      } else {
+        setMessages(prev => prev.map(m => m.id === assistantId ? { ...m, content: m.content + text } : m))
+      }
+    }
+
     try {
-      const res = await fetch('http://localhost:5000/api/chat', {
+      // 流式接口：回复逐段推送（Server-Sent Events）
+      const res = await fetch('http://localhost:5000/api/chat/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ 
@@ -111,21 +124,48 @@ export default function Chat({ conversationId, onConversationChange, onNavigate
           conversation_id: conversationId
         })
       })
-      const data = await res.json()
-      
-      if (data.conversation_id && data.conversation_id !== conversationId) {
-        onConversationChange(data.conversation_id)
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`)
+
+      const reader = res.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      let newConversationId: string | undefined
+      let taskNote = ''
+
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+
+        // 事件以空行分隔
+        let sep
+        while ((sep = buffer.indexOf('\n\n')) >= 0) {
+          const block = buffer.slice(0, sep)
+          buffer = buffer.slice(sep + 2)
+          const event = block.match(/^event: (.*)$/m)?.[1]
+          const dataLine = block.match(/^data: (.*)$/m)?.[1]
+          if (!event || dataLine === undefined) continue
+          const data = JSON.parse(dataLine)
+
+          if (event === 'conversation') {
+            newConversationId = data.conversation_id
+          } else if (event === 'token') {
+            appendToAssistant(data.text)
+          } else if (event === 'task') {
+            taskNote = data.message || ''
+          } else if (event === 'suggestions') {
+            setSuggestions(data)
+          } else if (event === 'done') {
+            if (taskNote) appendToAssistant(taskNote)
+          } else if (event === 'error') {
+            appendToAssistant(data.message || '处理出错')
+          }
+        }
       }
-      
-      setMessages(prev => [...prev, {
-        id: (Date.now() + 1).toString(),
-        role: 'assistant',
-        content: data.reply || '无回复'
-      }])
 
-      // 处理智能推荐
-      if (data.suggestions) {
-        setSuggestions(data.suggestions)
+      // 回复写入会话后再切换会话，避免重新加载时覆盖正在显示的消息
+      if (newConversationId && newConversationId !== conversationId) {
+        onConversationChange(newConversationId)
       }
 
     } catch {
@@ -235,7 +275,7 @@ export default function Chat({ conversationId, onConversationChange, onNavigate
           </div>
         ))}
 
-        {loading && (
+        {loading && messages[messages.length - 1]?.role !== 'assistant' && (
           <div className="flex justify-start animate-fade-in pl-12">
             <div className="bg-[#F9FAFB] px-5 py-4 rounded-[20px] rounded-tl-sm border border-[#F2F2F7] shadow-sm">
               <div className="flex gap-1.5">
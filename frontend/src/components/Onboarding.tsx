@@ -53,6 +53,22 @@ export default function Onboarding({ onComplete }: OnboardingProps) {
     }
   }
 
+  // 上传后等待后台解析完成（SSE 推送解析任务状态）
+  const waitForParse = (jobId: string) => new Promise<boolean>((resolve) => {
+    const source = new EventSource(`http://localhost:5000/api/resume/jobs/${jobId}/stream`)
+    source.addEventListener('status', (e) => {
+      const job = JSON.parse((e as MessageEvent).data)
+      if (job.status === 'done' || job.status === 'failed') {
+        source.close()
+        resolve(job.status === 'done')
+      }
+    })
+    source.onerror = () => {
+      source.close()
+      resolve(false)
+    }
+  })
+
   const handleFileUpload = async (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0]
     if (!file) return
@@ -67,7 +83,13 @@ export default function Onboarding({ onComplete }: OnboardingProps) {
         body: formData
       })
       if (res.ok) {
-        setTimeout(() => handleNext(), 500)
+        // 同一份简历已解析过时直接返回完成状态，不用再等
+        const { job_id, job } = await res.json()
+        if (job.status === 'done' || await waitForParse(job_id)) {
+          setTimeout(() => handleNext(), 500)
+        } else {
+          alert('简历解析失败')
+        }
       } else {
         alert('上传失败')
       }
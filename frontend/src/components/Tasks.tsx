@@ -7,6 +7,7 @@ interface Task {
   description: string
   status: 'pending' | 'running' | 'completed' | 'failed'
   progress?: number
+  log?: string
   created_at: string
   result?: any
 }
@@ -24,22 +25,29 @@ export default function Tasks() {
   const [loading, setLoading] = useState(true)
 
   useEffect(() => {
-    fetchTasks()
-    const interval = setInterval(fetchTasks, 5000)
-    return () => clearInterval(interval)
-  }, [])
+    // 订阅任务推送：先收到全量列表，之后只推送有变化的任务（断线后浏览器自动重连）
+    const source = new EventSource('http://localhost:5000/api/tasks/stream')
 
-  const fetchTasks = async () => {
-    try {
-      const res = await fetch('http://localhost:5000/api/tasks')
-      const data = await res.json()
-      setTasks(data)
-      setLoading(false)
-    } catch (e) {
-      console.error(e)
+    source.addEventListener('tasks', (e) => {
+      setTasks(JSON.parse((e as MessageEvent).data))
       setLoading(false)
-    }
-  }
+    })
+    source.addEventListener('task', (e) => {
+      const task: Task = JSON.parse((e as MessageEvent).data)
+      setTasks(prev => prev.some(t => t.id === task.id)
+        ? prev.map(t => (t.id === task.id ? task : t))
+        : [task, ...prev])
+      setSelectedTask(prev => (prev && prev.id === task.id ? task : prev))
+    })
+    source.addEventListener('removed', (e) => {
+      const { id } = JSON.parse((e as MessageEvent).data)
+      setTasks(prev => prev.filter(t => t.id !== id))
+      setSelectedTask(prev => (prev && prev.id === id ? null : prev))
+    })
+    source.onerror = () => setLoading(false)
+
+    return () => source.close()
+  }, [])
 
   const deleteTask = async (taskId: string) => {
     try {
@@ -195,6 +203,9 @@ export default function Tasks() {
                         ></div>
                       </div>
                       <p className="text-[14px] font-semibold text-[#007AFF] mt-2">{selectedTask.progress}% 完成</p>
+                      {selectedTask.log && (
+                        <p className="text-[13px] text-[#86868B] mt-1">{selectedTask.log}</p>
+                      )}
                     </div>
                   )}
 